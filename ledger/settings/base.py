@@ -21,11 +21,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'transactions.metrics.MetricsMiddleware',
+    'transactions.instrumentation.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'transactions.roles.LedgerRoleMiddleware',
+    'transactions.audit.AuditBufferMiddleware',
+    'transactions.routers.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -49,7 +54,7 @@ ASGI_APPLICATION = 'ledger.asgi.application'
 DATABASES = {}
 DATABASE_URL = os.getenv('DATABASE_URL')
 if DATABASE_URL:
-    DATABASES['default'] = dj_database_url.parse(DATABASE_URL, conn_max_age=600, ssl_require=False)
+    DATABASES['default'] = dj_database_url.parse(DATABASE_URL, ssl_require=False)
 else:
     DATABASES['default'] = {
         'ENGINE':'django.db.backends.postgresql',
@@ -60,12 +65,63 @@ else:
         'PORT':os.getenv('DB_PORT','5432'),
     }
 
+# Okuma replikaları: DATABASE_REPLICA_URLS=url1,url2 -> 'replica1', 'replica2'. Testlerde birincilin
+# aynası (MIRROR). Yerel deneme: DATABASE_URL=sqlite:///a.sqlite3, DATABASE_REPLICA_URLS=sqlite:///b.sqlite3
+# (b, a'nın kopyası: cp a.sqlite3 b.sqlite3) ya da aynı sunucuda iki Postgres veritabanı
+LEDGER_DATABASE_REPLICAS = []
+for _i, _url in enumerate(u.strip() for u in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if u.strip()):
+    DATABASES[f'replica{_i + 1}'] = {**dj_database_url.parse(_url, ssl_require=False),
+                                     'TEST':{'MIRROR':'default'}}
+    LEDGER_DATABASE_REPLICAS.append(f'replica{_i + 1}')
+DATABASE_ROUTERS = ['transactions.routers.ReplicaRouter']
+# Yazımdan sonra kullanıcının okumaları bu kadar saniye birincilde kalır (read-your-writes)
+LEDGER_REPLICA_STICKY_SECONDS = int(os.getenv('LEDGER_REPLICA_STICKY_SECONDS', '15'))
+LEDGER_REPLICA_PIN_CACHE_ALIAS = 'shared'
+
+# Bağlantılar (her iki yapılandırma yolu ve replikalar için aynı):
+# LEDGER_DB_POOL=1 -> PostgreSQL'de psycopg3 havuzu (psycopg[pool]; CONN_MAX_AGE=0 olmalı),
+# aksi halde kalıcı bağlantı (DB_CONN_MAX_AGE saniye). Yeniden kullanımdan önce sağlık kontrolü yapılır.
+# Havuz süreç başınadır: toplam bağlantı = worker sayısı x LEDGER_DB_POOL_MAX_SIZE (max_connections'a göre seçin)
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '600'))
+LEDGER_DB_POOL = os.getenv('LEDGER_DB_POOL', '0') == '1'
+LEDGER_DB_POOL_MIN_SIZE = int(os.getenv('LEDGER_DB_POOL_MIN_SIZE', '2'))
+LEDGER_DB_POOL_MAX_SIZE = int(os.getenv('LEDGER_DB_POOL_MAX_SIZE', '10'))
+LEDGER_DB_POOL_TIMEOUT = float(os.getenv('LEDGER_DB_POOL_TIMEOUT', '10'))
+for _db in DATABASES.values():
+    _db['CONN_HEALTH_CHECKS'] = True
+    if LEDGER_DB_POOL and _db['ENGINE'] == 'django.db.backends.postgresql':
+        _db['CONN_MAX_AGE'] = 0
+        _db.setdefault('OPTIONS', {})['pool'] = {
+            'min_size':LEDGER_DB_POOL_MIN_SIZE, 'max_size':LEDGER_DB_POOL_MAX_SIZE, 'timeout':LEDGER_DB_POOL_TIMEOUT,
+        }
+    else:
+        _db['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+
 # E-posta ile giriş backend'i — ileride dosyasını ekleyeceğiz
 AUTHENTICATION_BACKENDS = [
     'transactions.authentication.EmailBackend',
     'django.contrib.auth.backends.ModelBackend',
 ]
 
+# Rol/izin önbelleği: 0 -> yalnız istek bazında, >0 -> istekler arası (saniye)
+LEDGER_ROLE_CACHE_TIMEOUT = int(os.getenv('LEDGER_ROLE_CACHE_TIMEOUT', '0'))
+# Rol önbelleği ve sürüm sayacı worker'lar arası cache'te: bootstrap_roles/admin değişikliği tüm süreçlere yansır
+LEDGER_ROLE_CACHE_ALIAS = 'shared'
+
+# Fiş thumbnail'ları: 1 -> commit sonrası kuyruğa alınır (manage.py receipt_worker), 0 -> istek içinde
+LEDGER_ASYNC_THUMBNAILS = os.getenv('LEDGER_ASYNC_THUMBNAILS', '1') == '1'
+
+# Denetim kaydı yazımı: direct -> her kayıt anında INSERT; batched -> değişiklikle aynı transaction'da,
+# commit öncesi tek bulk_create
+LEDGER_AUDIT_MODE = os.getenv('LEDGER_AUDIT_MODE', 'batched')
+# Denetim kaydı saklama süresi (gün) ve arşiv dizini (manage.py archive_auditlog)
+LEDGER_AUDIT_RETENTION_DAYS = int(os.getenv('LEDGER_AUDIT_RETENTION_DAYS', '365'))
+LEDGER_AUDIT_ARCHIVE_DIR = os.getenv('LEDGER_AUDIT_ARCHIVE_DIR', str(BASE_DIR / 'archive' / 'auditlog'))
+# Transaction tablosunu transaction_date ile bölümle (yalnız PostgreSQL; migration 0012 dönüştürür).
+# Aralık: 'month' ya da 'year'; yeni bölümleri ensure_partitions önceden açar
+LEDGER_PARTITION_TRANSACTIONS = os.getenv('LEDGER_PARTITION_TRANSACTIONS', '0') == '1'
+LEDGER_TRANSACTION_PARTITION_INTERVAL = os.getenv('LEDGER_TRANSACTION_PARTITION_INTERVAL', 'month')
+
 LANGUAGE_CODE = 'tr-tr'
 TIME_ZONE = 'Europe/Istanbul'
 USE_I18N = True
@@ -74,6 +130,68 @@ USE_TZ = True
 # Oturum: 30 dk. Her istekte oturum yenileniyor
 SESSION_COOKIE_AGE = 1800
 SESSION_SAVE_EVERY_REQUEST = True
+# Az yazan oturum (transactions/sessions.py): kayan süre cache'te, django_session satırı yalnız veri
+# değişince ya da kalan ömrü eşiğin (saniye) altına inince yazılır. 0 -> Django'nun DB oturumu
+LEDGER_SESSION_LOW_WRITE = os.getenv('LEDGER_SESSION_LOW_WRITE', '1') == '1'
+LEDGER_SESSION_REFRESH_THRESHOLD = int(os.getenv('LEDGER_SESSION_REFRESH_THRESHOLD', '1500'))
+SESSION_ENGINE = 'transactions.sessions' if LEDGER_SESSION_LOW_WRITE else 'django.contrib.sessions.backends.db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Cache: varsayılan süreç içi bellek; oturumlar LEDGER_SESSION_CACHE ile file | locmem | redis://...
+# 'shared' aynı türde ama ayrı bir depodur (ayrı dizin/LOCATION): oturum trafiğinin tetiklediği rastgele
+# silme (cull) sürüm sayaçlarını, rol/token önbelleğini ve replika sabitlemelerini düşürmesin.
+# Sınır konmaz (MAX_ENTRIES pratikte sınırsız); girdiler az ve çoğu süreli. Redis'te aynı sunucu
+# KEY_PREFIX ile ayrılır; maxmemory-policy volatile-lru olmalı (süresiz sayaçlar atılmaz).
+LEDGER_SESSION_CACHE = os.getenv('LEDGER_SESSION_CACHE', 'file')
+_NO_CULL = {'MAX_ENTRIES':10 ** 9}
+if LEDGER_SESSION_CACHE.startswith(('redis://', 'rediss://', 'unix://')):
+    _session_cache = {'BACKEND':'django.core.cache.backends.redis.RedisCache', 'LOCATION':LEDGER_SESSION_CACHE}
+    _shared_cache = {**_session_cache, 'KEY_PREFIX':'ledger'}
+elif LEDGER_SESSION_CACHE == 'locmem':
+    _session_cache = {'BACKEND':'django.core.cache.backends.locmem.LocMemCache', 'LOCATION':'ledger-sessions',
+                      'OPTIONS':{'MAX_ENTRIES':100000}}
+    _shared_cache = {'BACKEND':'django.core.cache.backends.locmem.LocMemCache', 'LOCATION':'ledger-shared',
+                     'OPTIONS':_NO_CULL}
+else:
+    _session_cache = {'BACKEND':'django.core.cache.backends.filebased.FileBasedCache',
+                      'LOCATION':os.getenv('LEDGER_SESSION_CACHE_DIR', str(BASE_DIR / 'cache' / 'sessions')),
+                      'OPTIONS':{'MAX_ENTRIES':100000}}
+    _shared_cache = {'BACKEND':'django.core.cache.backends.filebased.FileBasedCache',
+                     'LOCATION':os.getenv('LEDGER_SHARED_CACHE_DIR', str(BASE_DIR / 'cache' / 'shared')),
+                     'OPTIONS':_NO_CULL}
+CACHES = {
+    'default': {'BACKEND':'django.core.cache.backends.locmem.LocMemCache'},
+    # Yalnız oturumlar
+    'sessions': _session_cache,
+    # Worker'lar arası paylaşılan cache: sürüm sayaçları, rol/token önbelleği, replika sabitlemeleri
+    'shared': _shared_cache,
+}
+
+# Referans verisi (ödeme yöntemleri/alt kategoriler): sürüm sayaçlı yanıt önbelleği + ETag;
+# LEDGER_INLINE_REFDATA=1 -> liste/oluşturma sayfalarına gömülür (iki API isteği yapılmaz)
+LEDGER_REFDATA_CACHE_ALIAS = 'shared'
+LEDGER_REFDATA_CACHE_TIMEOUT = int(os.getenv('LEDGER_REFDATA_CACHE_TIMEOUT', '3600'))
+LEDGER_INLINE_REFDATA = os.getenv('LEDGER_INLINE_REFDATA', '1') == '1'
+
+# API bearer token: geçerlilik süresi ve kullanıcı önbelleği (saniye, paylaşılan cache'te).
+# Rol önbelleği LEDGER_ROLE_CACHE_TIMEOUT'a uyar
+LEDGER_API_TOKEN_MAX_AGE = int(os.getenv('LEDGER_API_TOKEN_MAX_AGE', str(8 * 3600)))
+LEDGER_API_TOKEN_CACHE_TIMEOUT = int(os.getenv('LEDGER_API_TOKEN_CACHE_TIMEOUT', '60'))
+LEDGER_API_TOKEN_CACHE_ALIAS = 'shared'
+
+# İstek ölçümü (transactions/instrumentation.py): 1 -> Server-Timing başlığı (db, auth, perm, ser,
+# receipt, thumbnail, total); süre ya da sorgu sayısı eşiği aşılırsa 'ledger.slow_requests' loguna JSON
+LEDGER_REQUEST_TIMING = os.getenv('LEDGER_REQUEST_TIMING', '0') == '1'
+LEDGER_SLOW_REQUEST_MS = int(os.getenv('LEDGER_SLOW_REQUEST_MS', '500'))
+LEDGER_SLOW_REQUEST_QUERIES = int(os.getenv('LEDGER_SLOW_REQUEST_QUERIES', '50'))
+
+# Metrikler (transactions/metrics.py, GET /metrics, Prometheus metin biçimi). Çok worker'lı kurulumda
+# LEDGER_METRICS_DIR ortak yerel dizin olmalı (her süreç kendi dosyasını yazar, /metrics toplar)
+LEDGER_METRICS = os.getenv('LEDGER_METRICS', '1') == '1'
+LEDGER_METRICS_DIR = os.getenv('LEDGER_METRICS_DIR', '')
+LEDGER_METRICS_FLUSH_INTERVAL = float(os.getenv('LEDGER_METRICS_FLUSH_INTERVAL', '5'))
+# Boşsa yalnız staff oturumu erişir; doluysa 'Authorization: Bearer <token>' (Prometheus scrape)
+LEDGER_METRICS_TOKEN = os.getenv('LEDGER_METRICS_TOKEN', '')
 
 LOGIN_URL = '/auth/login/'
 LOGIN_REDIRECT_URL = '/transactions/'
@@ -84,11 +202,21 @@ STATICFILES_DIRS = [BASE_DIR / 'transactions' / 'static']
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Fiş/thumbnail indirme: '' -> Django akıtır; 'accel' -> X-Accel-Redirect (nginx internal location);
+# 'sendfile' -> X-Sendfile (Apache/lighttpd). İzin kontrolü her durumda Django'da yapılır
+LEDGER_FILE_OFFLOAD = os.getenv('LEDGER_FILE_OFFLOAD', '')
+LEDGER_FILE_ACCEL_PREFIX = os.getenv('LEDGER_FILE_ACCEL_PREFIX', '/protected-media/')
+# Fiş rendition'ları (/transactions/<id>/rendition/): disk önbelleği (boş -> MEDIA_ROOT/renditions) ve üst sınırı
+LEDGER_RENDITION_CACHE_DIR = os.getenv('LEDGER_RENDITION_CACHE_DIR', '')
+LEDGER_RENDITION_CACHE_MAX_BYTES = int(os.getenv('LEDGER_RENDITION_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
 
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
 
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework.authentication.SessionAuthentication'],
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'transactions.authentication.BearerTokenAuthentication',
+    ],
     'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -19,7 +19,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from transactions.views import login_view, transactions_page, home_redirect, transaction_create_page
+from transactions.views import login_view, transactions_page, home_redirect, transaction_create_page, metrics_view, db_pool_view
 
 urlpatterns = [
     path('', home_redirect, name='home'),
@@ -28,6 +28,8 @@ urlpatterns = [
     path('transactions/', transactions_page, name='transactions_page'),
     path('transactions/new/', transaction_create_page, name='transaction_create_page'),  # yeni
     path('api/v1/', include('transactions.urls')),  
+    path('metrics', metrics_view, name='metrics'),  # Prometheus
+    path('metrics/db-pool', db_pool_view, name='db-pool'),  # bağlantı havuzu istatistikleri
 ]
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,6 +1,13 @@
+import json
+
 from django.contrib import admin
 from django.contrib.admin import SimpleListFilter
-from .models import PaymentMethod, Subcategory, Transaction, AuditLog
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from .models import PaymentMethod, Subcategory, Transaction, AuditLog, ReceiptBlob, ReceiptJob, DailyRollup
+from .roles import get_role
+from . import audit
 
 @admin.register(PaymentMethod)
 class PaymentMethodAdmin(admin.ModelAdmin):
@@ -35,24 +42,88 @@ class TransactionAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return Transaction.all_objects.all()
 
+    # API'deki bulk-* aksiyonlarıyla aynı yol: tek UPDATE/DELETE + bulk_create denetim kaydı
     def restore_selected(self, request, queryset):
-        for obj in queryset:
-            obj.restore(by=request.user)
+        with audit.unit_of_work():
+            ids = queryset.restore(by=request.user)
+            AuditLog.record_bulk(request.user, AuditLog.Actions.RESTORE, ids, metadata={'bulk': True, 'admin': True})
+        self.message_user(request, f"{len(ids)} transaction(s) restored.")
     restore_selected.short_description = "Restore selected transactions"
 
     def hard_delete_selected(self, request, queryset):
-        if not (request.user.is_superuser or request.user.groups.filter(name='Admin').exists()):
+        if not get_role(request).is_admin:
             self.message_user(request, "Only Admin can hard delete.", level='error')
             return
-        for obj in queryset:
-            obj.delete(by=request.user, hard=True)
+        with audit.unit_of_work():
+            ids = queryset.hard_delete()
+            AuditLog.record_bulk(request.user, AuditLog.Actions.HARD_DELETE, ids, metadata={'bulk': True, 'admin': True})
+        self.message_user(request, f"{len(ids)} transaction(s) permanently deleted.")
     hard_delete_selected.short_description = "Hard delete selected transactions"
 
+class EstimatedCountPaginator(Paginator):
+    """
+    PostgreSQL'de büyük tablolarda COUNT(*) yerine planlayıcı tahmini kullanılır: filtresiz
+    listede pg_class.reltuples, filtreli listede EXPLAIN satır tahmini. Tahmin eşiğin altındaysa
+    (ya da başka DB'de) kesin sayım yapılır.
+    """
+    estimate_threshold = 100000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        conn = connections[qs.db]
+        if conn.vendor != 'postgresql':
+            return super().count
+        with conn.cursor() as cur:
+            if not qs.query.where:
+                cur.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [qs.model._meta.db_table])
+                row = cur.fetchone()
+                estimate = row[0] if row else 0
+            else:
+                sql, params = qs.order_by().values('pk').query.sql_with_params()
+                cur.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cur.fetchone()[0]
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                estimate = int(plan[0]['Plan']['Plan Rows'])
+        return estimate if estimate > self.estimate_threshold else super().count
+
 @admin.register(AuditLog)
 class AuditLogAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'actor', 'action', 'object_type', 'object_id')
     list_filter = ('action', ('timestamp', admin.DateFieldListFilter))
-    search_fields = ('object_type', 'object_id', 'metadata')
+    list_select_related = ('actor',)
+    # JSON (metadata) araması indekslenemez; yalnız "metadata:<metin>" ile açıkça istenirse yapılır
+    search_fields = ('object_type', 'object_id')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_term.startswith('metadata:'):
+            value = search_term[len('metadata:'):].strip()
+            return (queryset.filter(metadata__icontains=value) if value else queryset), False
+        return super().get_search_results(request, queryset, search_term)
+
+@admin.register(ReceiptJob)
+class ReceiptJobAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'kind', 'status', 'attempts', 'content_hash', 'run_after')
+    list_filter = ('kind', 'status')
+    search_fields = ('content_hash',)
+
+@admin.register(ReceiptBlob)
+class ReceiptBlobAdmin(admin.ModelAdmin):
+    list_display = ('content_hash', 'file_name', 'size', 'ref_count', 'created_at')
+    search_fields = ('content_hash',)
+    readonly_fields = ('content_hash', 'file_name', 'thumbnail_name', 'size', 'ref_count')
 
+@admin.register(DailyRollup)
+class DailyRollupAdmin(admin.ModelAdmin):
+    # Salt okunur: satırlar rollups.py tarafından yazılır (rebuild_rollups ile yeniden hesaplanır)
+    list_display = ('day', 'owner', 'type', 'payment_method', 'subcategory', 'total', 'count')
+    list_filter = ('type', ('day', admin.DateFieldListFilter))
+    list_select_related = ('owner', 'payment_method', 'subcategory')
 
+    def has_add_permission(self, request):
+        return False
 
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,121 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection, transaction as db_transaction
+
+from . import metrics
+from .models import AuditLog
+
+# Her iki mod da kaydı değişiklikle aynı transaction'da yazar: commit edilen değişikliğin kaydı kaybolmaz.
+# Bilinmeyen değerler (kaldırılan 'background' dahil) batched'e düşer.
+MODES = ('direct', 'batched')
+WRITE_BATCH_SIZE = 500
+
+# Etkin tampon: (liste, sahibi, atomic derinliği) — sahibi 'unit' (unit_of_work) ya da 'request' (AuditBufferMiddleware)
+_buffer = ContextVar('ledger_audit_buffer', default=None)
+# Etkin etiketler: tagged() bloğunda oluşturulan kayıtların metadata'sına eklenir
+_tags = ContextVar('ledger_audit_tags', default=None)
+
+
+def audit_mode():
+    mode = getattr(settings, 'LEDGER_AUDIT_MODE', 'batched')
+    return mode if mode in MODES else 'batched'
+
+
+def entry(actor, action, object_type, object_id, metadata=None):
+    """Kaydedilmemiş AuditLog nesnesi (record_many ile yazılır)."""
+    tags = _tags.get()
+    return AuditLog(actor=actor, action=action, object_type=object_type,
+                    object_id=str(object_id), metadata={**(metadata or {}), **tags} if tags else metadata or {})
+
+
+@contextmanager
+def tagged(**tags):
+    """Blok içinde oluşturulan kayıtlar metadata'larında tags taşır (ör. bench_ledger kendi kayıtlarını ayırır)."""
+    token = _tags.set({**(_tags.get() or {}), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+def _write(entries):
+    if not entries:
+        return
+    mode = audit_mode()
+    with metrics.timer('ledger_audit_write_duration_seconds', mode=mode):
+        if len(entries) == 1:
+            entries[0].save()
+        else:
+            AuditLog.objects.bulk_create(entries, batch_size=WRITE_BATCH_SIZE)
+    metrics.inc('ledger_audit_entries_written_total', len(entries), mode=mode)
+
+
+def record(actor, action, object_type, object_id='*', metadata=None):
+    record_many([entry(actor, action, object_type, object_id, metadata)])
+
+
+def record_many(entries):
+    """
+    - direct: hemen INSERT (çağıranın transaction'ı içinde).
+    - batched: unit_of_work içindeyse tampona alınır ve commit'ten hemen önce tek
+      bulk_create ile yazılır; istek tamponu varsa istek sonunda yazılır. Bizim yönetmediğimiz
+      bir atomic blok içindeysek kayıt hemen yazılır (commit/rollback ile birlikte gitsin diye).
+    """
+    entries = list(entries)
+    if not entries:
+        return
+    mode = audit_mode()
+    current = _buffer.get()
+    if mode == 'direct' or current is None:
+        _write(entries)
+        return
+    items, owner, depth = current
+    if owner == 'request' and len(connection.atomic_blocks) > depth:
+        _write(entries)
+        return
+    items.extend(entries)
+
+
+@contextmanager
+def unit_of_work(using=None):
+    """
+    Veri değişikliği ve denetim kayıtları için tek transaction. Blok içinde kaydedilen girdiler
+    blok sonunda, commit'ten önce tek bulk_create ile yazılır: değişiklik commit edilirse denetim
+    kaydı da edilir, rollback olursa ikisi birlikte geri alınır.
+    """
+    with db_transaction.atomic(using=using):
+        items = []
+        token = _buffer.set((items, 'unit', None))
+        try:
+            yield
+        finally:
+            _buffer.reset(token)
+        _write(items)
+
+
+class AuditBufferMiddleware:
+    """
+    batched modda, unit_of_work dışında (ör. giriş sinyali, ExportLogView) kaydedilen
+    girdileri istek boyunca biriktirir ve yanıt döndükten sonra tek seferde yazar.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if audit_mode() == 'direct':
+            return self.get_response(request)
+        items = []
+        token = _buffer.set((items, 'request', len(connection.atomic_blocks)))
+        try:
+            return self.get_response(request)
+        finally:
+            _buffer.reset(token)
+            _write(items)
+
+
+# Kullanım: veri değiştiren kod `with audit.unit_of_work(): ...; audit.record(...)` biçimindedir.
+# Mod seçimi: LEDGER_AUDIT_MODE=direct|batched (settings/base.py).
+# Karşılaştırma: python manage.py bench_audit
@@ -1,25 +1,38 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.backends import BaseBackend
+from django.core import signing
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Q
+from django.db.models.functions import Lower
+from rest_framework import exceptions
+from rest_framework.authentication import BaseAuthentication, get_authorization_header
+
+from .roles import resolve_role
 
 User = get_user_model()
 
+TOKEN_SALT = 'ledger.api-token'
+USER_CACHE_PREFIX = 'ledger:token-user'
+# Önbellekte tutulan kullanıcı alanları; şifre hash'i ve kişisel veriler (e-posta vb.) paylaşılan depoya yazılmaz
+USER_CACHE_FIELDS = ('username', 'is_active', 'is_staff', 'is_superuser')
+
 class EmailBackend(BaseBackend):
-    
+
     def authenticate(self, request, email=None, username=None, password=None, **kwargs):
-        identifier = email or username  
+        identifier = email or username
         if not identifier or not password:
             return None
-        user = None
-        # Önce email ile deneyelim
-        try:
-            user = User.objects.get(email__iexact=identifier)
-        except User.DoesNotExist:
-            # email alanı boş olabilir; username ile deneyelim
-            try:
-                user = User.objects.get(username__iexact=identifier)
-            except User.DoesNotExist:
-                return None
-        if not user.is_active:
+        # Tek sorgu: LOWER(email) (0003) ve LOWER(username) (0011) indeksleri kullanılır.
+        # Aynı metin hem bir e-posta hem başka birinin kullanıcı adıysa e-posta eşleşmesi önceliklidir.
+        identifier = identifier.lower()
+        candidates = list(User.objects.alias(email_ci=Lower('email'), username_ci=Lower('username'))
+                          .filter(Q(email_ci=identifier) | Q(username_ci=identifier))[:2])
+        user = next((u for u in candidates if (u.email or '').lower() == identifier), None)
+        if user is None:
+            user = candidates[0] if candidates else None
+        if user is None or not user.is_active:
             return None
         return user if user.check_password(password) else None
 
@@ -28,3 +41,90 @@ class EmailBackend(BaseBackend):
             return User.objects.get(pk=user_id)
         except User.DoesNotExist:
             return None
+
+
+# --- API: imzalı, süreli bearer token ---
+
+def token_max_age():
+    return getattr(settings, 'LEDGER_API_TOKEN_MAX_AGE', 8 * 3600)
+
+
+def _cache_timeout():
+    return getattr(settings, 'LEDGER_API_TOKEN_CACHE_TIMEOUT', 60)
+
+
+def _cache():
+    # Worker'lar arası paylaşılan depo: şifre değişikliği/pasifleştirme tüm worker'lara hemen yansır
+    return caches[getattr(settings, 'LEDGER_API_TOKEN_CACHE_ALIAS', 'default')]
+
+
+def _password_fingerprint(user):
+    # Şifre değişince eski token'lar geçersiz olur (oturumdaki auth hash ile aynı mantık)
+    return user.get_session_auth_hash()[:16]
+
+
+def issue_token(user):
+    """`Authorization: Bearer <token>` için imzalı token (DB'de saklanmaz)."""
+    return signing.dumps({'u': user.pk, 'h': _password_fingerprint(user)}, salt=TOKEN_SALT)
+
+
+def _user_cache_key(user_id):
+    return f'{USER_CACHE_PREFIX}:{user_id}'
+
+
+def cached_user(user_id):
+    """
+    Token doğrulamasında (kullanıcı, şifre parmak izi); LEDGER_API_TOKEN_CACHE_TIMEOUT saniye önbellekte
+    tutulur. Önbellekte yalnız USER_CACHE_FIELDS ve parmak izi bulunur; dönen User bu alanlardan kurulur
+    (şifresiz, kaydedilmemelidir). Kullanıcı yoksa (None, None).
+    """
+    key = _user_cache_key(user_id)
+    data = _cache().get(key)
+    if data is None:
+        user = User.objects.filter(pk=user_id).only(*USER_CACHE_FIELDS, 'password').first()
+        if user is None:
+            return None, None
+        data = {'pk': user.pk, 'h': _password_fingerprint(user), **{f: getattr(user, f) for f in USER_CACHE_FIELDS}}
+        _cache().set(key, data, _cache_timeout())
+    user = User(pk=data['pk'], **{f: data[f] for f in USER_CACHE_FIELDS})
+    user._state.adding, user._state.db = False, DEFAULT_DB_ALIAS
+    return user, data['h']
+
+
+def invalidate_token_user(user_id):
+    _cache().delete(_user_cache_key(user_id))
+
+
+class BearerTokenAuthentication(BaseAuthentication):
+    """
+    `Authorization: Bearer <token>`. İmza ve süre DB'ye gitmeden doğrulanır; kullanıcı kısa süreli
+    paylaşılan önbellekten okunur, rol LEDGER_ROLE_CACHE_TIMEOUT'a göre (0: her istekte yüklenir).
+    Oturum ve CSRF kullanılmaz (betikler/entegrasyonlar için).
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        try:
+            payload = signing.loads(auth[1].decode(), salt=TOKEN_SALT, max_age=token_max_age())
+        except (signing.BadSignature, UnicodeDecodeError):
+            raise exceptions.AuthenticationFailed('Invalid or expired token.')
+        user, fingerprint = cached_user(payload.get('u'))
+        if user is None or not user.is_active or payload.get('h') != fingerprint:
+            raise exceptions.AuthenticationFailed('Invalid or expired token.')
+        # get_role istek üzerindeki bu nesneyi kullanır
+        request._request._ledger_role = resolve_role(user)
+        return user, payload
+
+    def authenticate_header(self, request):
+        return self.keyword
+
+# Bu dosyada:
+# - EmailBackend: e-posta ya da kullanıcı adı (büyük/küçük harf duyarsız) + şifre ile giriş.
+# - BearerTokenAuthentication: /api/v1/auth/token/ ile alınan token'ı doğrular.
+#   Token iptali: şifre değişikliği veya kullanıcının pasifleştirilmesi; User post_save sinyali önbelleği
+#   hemen düşürür (signals.py). Sinyal üretmeyen QuerySet.update() ile yapılırsa önbellek süresi kadar gecikir.
@@ -0,0 +1,257 @@
+import json
+import random
+import statistics
+import subprocess
+import time
+import tracemalloc
+import uuid
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import audit
+from .models import AuditLog, PaymentMethod, ReceiptJob, Subcategory, Transaction
+from .seeding import make_receipt_image
+
+PATHS = ('list', 'filter', 'search', 'create_receipt', 'receipt_download', 'bulk')
+API = '/api/v1/transactions/'
+BULK_SIZE = 100
+# Karşılaştırmada bu oranı aşan gecikme artışı gerileme sayılır
+REGRESSION_THRESHOLD = 0.10
+# Ölçümün yazdığı denetim kayıtlarının metadata anahtarı (değer: çalıştırma kimliği)
+AUDIT_TAG = 'benchmark_run'
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def percentile(values, pct):
+    """Sıralı listede en yakın sıra (nearest-rank) yüzdeliği."""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+def summarize(timings, queries, peaks):
+    timings = sorted(timings)
+    result = {
+        'n': len(timings),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'max_ms': round(timings[-1], 3),
+        'queries_mean': round(statistics.mean(queries), 2),
+        'queries_max': max(queries),
+    }
+    if peaks:
+        result['mem_peak_kb'] = round(max(peaks) / 1024, 1)
+        result['mem_peak_mean_kb'] = round(statistics.mean(peaks) / 1024, 1)
+    return result
+
+
+class LedgerBenchmark:
+    """
+    API yollarını Django test istemcisiyle (tam middleware/DRF yığını, ağ yok) ölçer.
+    Her yol: ısınma turları, zamanlı turlar (gecikme + sorgu sayısı) ve tracemalloc ile
+    ayrı bir bellek turu (izleme gecikmeyi bozmasın diye zamanlı turlardan ayrı).
+    Oluşturulan kayıtlar iş sonunda kalıcı silinir; bulk turlarının sildikleri geri yüklenir.
+    Ölçümün yazdığı denetim kayıtları metadata'daki AUDIT_TAG (çalıştırma kimliği) ile silinir;
+    aynı anda gerçek kullanıcı işlemleriyle yazılan kayıtlara dokunulmaz.
+    """
+
+    def __init__(self, owner, iterations=100, warmup=5, memory_iterations=10, seed=42):
+        self.owner = owner
+        self.iterations = iterations
+        self.warmup = warmup
+        self.memory_iterations = memory_iterations
+        self.rng = random.Random(seed)
+        self.created_ids = []
+        self.bulk_ids = set()
+        self.run_id = uuid.uuid4().hex
+        self.client = Client()
+        with self.tagged():
+            self.client.force_login(owner)
+
+    def tagged(self):
+        return audit.tagged(**{AUDIT_TAG: self.run_id})
+
+    # --- yollar: her biri (tur numarası) -> yanıt döndüren fonksiyon üretir ---
+
+    def path_list(self):
+        return lambda i: self.client.get(API, {'page': 1 + i % 5})
+
+    def path_filter(self):
+        sc = (Transaction.objects.filter(owner=self.owner).values_list('subcategory_id', flat=True).first()
+              or Subcategory.objects.values_list('pk', flat=True).first())
+        since = (timezone.now() - timedelta(days=90)).isoformat()
+        return lambda i: self.client.get(API, {'type': 'EXPENSE', 'subcategory': sc, 'date_from': since,
+                                               'min_amount': 10, 'ordering': '-amount'})
+
+    def path_search(self):
+        terms = ('market', 'fatura', 'kahve', 'online', 'taksit')
+        return lambda i: self.client.get(API, {'search': terms[i % len(terms)]})
+
+    def path_create_receipt(self):
+        pm = PaymentMethod.objects.filter(is_active=True).first()
+        sc = Subcategory.objects.filter(is_active=True).first()
+        if pm is None or sc is None:
+            raise BenchmarkError('No active payment method/subcategory; run seed_ledger first.')
+        when = (timezone.now() - timedelta(days=1)).isoformat()
+
+        def call(i):
+            # Her tur farklı içerik: tekilleştirme (aynı hash) ölçümü kısaltmasın
+            upload = SimpleUploadedFile(f'bench-{i}.png', make_receipt_image(self.rng, size=(400, 560)),
+                                        content_type='image/png')
+            response = self.client.post(API, {'amount': '12.50', 'type': 'EXPENSE', 'payment_method': pm.pk,
+                                              'subcategory': sc.pk, 'transaction_date': when,
+                                              'description': 'benchmark', 'receipt_file': upload})
+            if response.status_code == 201:
+                self.created_ids.append(response.json()['id'])
+            return response
+        return call
+
+    def path_receipt_download(self):
+        tx = Transaction.objects.filter(owner=self.owner).exclude(receipt_blob=None).order_by('-id').first()
+        if tx is None:
+            response = self.path_create_receipt()(0)
+            if response.status_code != 201:
+                raise BenchmarkError(f'Could not create a receipt: {response.status_code}')
+            tx = Transaction.objects.get(pk=response.json()['id'])
+        url = f'{API}{tx.pk}/receipt/'
+
+        def call(i):
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)  # gövde okunmadan dosya aktarımı ölçülmez
+            return response
+        return call
+
+    def path_bulk(self):
+        ids = list(Transaction.objects.filter(owner=self.owner).order_by('-transaction_date')
+                   .values_list('id', flat=True)[:BULK_SIZE])
+        if not ids:
+            raise BenchmarkError('Owner has no transactions; run seed_ledger first.')
+        self.bulk_ids.update(ids)
+
+        def call(i):
+            return self.client.post(f'{API}bulk-delete/', {'ids': ids}, content_type='application/json')
+
+        def after(i):
+            # Zamanlanmayan geri yükleme: her tur aynı satırlar üzerinde çalışır
+            Transaction.all_objects.filter(id__in=ids).restore()
+        call.after = after
+        return call
+
+    # --- ölçüm ---
+
+    def run(self, paths):
+        results = {}
+        with self.tagged():
+            try:
+                for name in paths:
+                    results[name] = self.measure(getattr(self, f'path_{name}')())
+            finally:
+                self.cleanup()
+        return results
+
+    def measure(self, call):
+        after = getattr(call, 'after', None)
+        for i in range(self.warmup):
+            self._check(call(i))
+            if after:
+                after(i)
+        timings, queries = [], []
+        for i in range(self.iterations):
+            # Replika/ikincil alias'lardaki sorgular da sayılır
+            with ExitStack() as stack:
+                contexts = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in connections]
+                started = time.perf_counter()
+                response = call(i)
+                elapsed = (time.perf_counter() - started) * 1000
+            self._check(response)
+            timings.append(elapsed)
+            queries.append(sum(len(ctx.captured_queries) for ctx in contexts))
+            if after:
+                after(i)
+        peaks = []
+        for i in range(self.memory_iterations):
+            tracemalloc.start()
+            try:
+                self._check(call(i))
+                peaks.append(tracemalloc.get_traced_memory()[1])
+            finally:
+                tracemalloc.stop()
+            if after:
+                after(i)
+        return summarize(timings, queries, peaks)
+
+    def _check(self, response):
+        if response.status_code >= 400:
+            raise BenchmarkError(f'{response.request["PATH_INFO"]} returned {response.status_code}')
+
+    def cleanup(self):
+        if self.created_ids:
+            qs = Transaction.all_objects.filter(id__in=self.created_ids)
+            hashes = list(qs.exclude(receipt_blob=None).values_list('receipt_blob__content_hash', flat=True))
+            qs.hard_delete()
+            ReceiptJob.objects.filter(content_hash__in=hashes).delete()
+            self.created_ids = []
+        if self.bulk_ids:
+            # Ölçüm bir turun ortasında kesildiyse bulk'un sildikleri silinmiş kalmasın
+            Transaction.all_objects.filter(id__in=self.bulk_ids, is_active=False).restore()
+            self.bulk_ids = set()
+        AuditLog.objects.filter(**{f'metadata__{AUDIT_TAG}': self.run_id}).delete()
+
+
+def run_metadata():
+    """Sonuç dosyasının 'meta' bölümü: çalıştırmalar arası karşılaştırma için bağlam."""
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=settings.BASE_DIR, capture_output=True, text=True,
+                                  timeout=5).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ''
+    return {
+        'timestamp': timezone.now().isoformat(),
+        'commit': git('rev-parse', 'HEAD'),
+        'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'vendor': connection.vendor,
+        'transactions': Transaction.all_objects.count(),
+        'audit_mode': getattr(settings, 'LEDGER_AUDIT_MODE', ''),
+    }
+
+
+def compare(current, previous, threshold=REGRESSION_THRESHOLD):
+    """
+    İki sonucun yol bazında farkı: [(yol, metrik, önceki, şimdiki, oran, gerileme_mi)].
+    Gecikme metriklerinde threshold'u, sorgu sayısında herhangi bir artışı gerileme sayar.
+    """
+    rows = []
+    for path, now in current.get('results', {}).items():
+        before = previous.get('results', {}).get(path)
+        if not before:
+            continue
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_max', 'mem_peak_kb'):
+            if metric not in now or metric not in before:
+                continue
+            old, new = before[metric], now[metric]
+            ratio = (new - old) / old if old else 0.0
+            regressed = new > old if metric == 'queries_max' else ratio > threshold
+            rows.append((path, metric, old, new, ratio, regressed))
+    return rows
+
+
+def load(path):
+    with open(path, encoding='utf-8') as fh:
+        return json.load(fh)
+
+# Kullanım: python manage.py bench_ledger (bkz. management/commands/bench_ledger.py)
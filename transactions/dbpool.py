@@ -0,0 +1,39 @@
+from django.db import connections
+
+
+def _pools():
+    """(bağlantı, havuz) çiftleri; havuz henüz açılmamışsa None (istatistik için havuz açılmaz)."""
+    for conn in connections.all(initialized_only=False):
+        pools = getattr(type(conn), '_connection_pools', None) or {}
+        yield conn, pools.get(conn.alias)
+
+
+def pool_stats():
+    """Alias başına bağlantı ayarları ve (PostgreSQL psycopg3 havuzu açıksa) havuz istatistikleri."""
+    result = {}
+    for conn, pool in _pools():
+        settings_dict = conn.settings_dict
+        info = {
+            'vendor': conn.vendor,
+            'pooled': bool(settings_dict.get('OPTIONS', {}).get('pool')),
+            'conn_max_age': settings_dict.get('CONN_MAX_AGE'),
+            'health_checks': settings_dict.get('CONN_HEALTH_CHECKS'),
+            # Bu isteği işleyen thread'in bağlantısı açık mı (kalıcı bağlantı yeniden kullanılıyor mu)
+            'thread_connected': conn.connection is not None,
+        }
+        if pool is not None:
+            info.update(min_size=pool.min_size, max_size=pool.max_size, stats=pool.get_stats())
+        result[conn.alias] = info
+    return result
+
+
+def close_pools():
+    """Açık havuzları kapatır (ör. fork öncesi: alt süreç ebeveynin soketlerini ve thread'siz havuzunu devralmasın)."""
+    connections.close_all()
+    for conn, pool in _pools():
+        if pool is not None:
+            conn.close_pool()
+
+# Havuz ayarları: settings/base.py (LEDGER_DB_POOL, LEDGER_DB_POOL_MIN_SIZE/_MAX_SIZE/_TIMEOUT).
+# İstatistikler: GET /metrics/db-pool (staff ya da LEDGER_METRICS_TOKEN). psycopg_pool get_stats()
+# alanları: pool_min, pool_max, pool_size, pool_available, requests_waiting, requests_num, ...
@@ -0,0 +1,153 @@
+import mimetypes
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.encoding import escape_uri_path
+from django.utils.http import content_disposition_header, http_date, parse_etags
+
+# <sha256> (fiş/thumbnail) ya da <sha256>-w<genişlik> (rendition)
+HASH_NAME = re.compile(r'^[0-9a-f]{64}(-w\d+)?$')
+RANGE_HEADER = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK_SIZE = 64 * 1024
+# İçerik adresli dosyalar değişmez; yanıt kullanıcıya özel olduğundan yalnız tarayıcı önbelleği
+IMMUTABLE_CACHE_CONTROL = 'private, max-age=31536000, immutable'
+PRIVATE_CACHE_CONTROL = 'private, no-cache'
+
+
+def file_etag(name):
+    """
+    İçerik adresli adlar (receipts/<h2>/<sha256>.<ext>) için hash'ten güçlü ETag; uzantı dahil
+    edilir, böylece fiş ve thumbnail'i (aynı hash, .webp) ayrı ETag alır. Eski adlandırmadaki
+    dosyalar için None (ETag/Range yine çalışır ama zayıf ETag ile, bkz. serve_file).
+    """
+    path = Path(name)
+    if HASH_NAME.match(path.stem):
+        return f'"{path.stem}{path.suffix.lower()}"'
+    return None
+
+
+def _offload_mode():
+    return getattr(settings, 'LEDGER_FILE_OFFLOAD', '')
+
+
+def _content_disposition(filename, as_attachment):
+    # Ad yüklemedeki dosya adından gelir: tırnak/ters bölü kaçışı ve RFC 5987 (filename*) Django'ya bırakılır
+    return content_disposition_header(as_attachment, filename) or 'inline'
+
+
+def parse_range(header, size):
+    """
+    Tek aralıklı `Range: bytes=a-b` başlığı -> (başlangıç, bitiş dahil). Başlık yok/çoklu
+    aralık/biçimsiz ise None (tam yanıt), karşılanamıyorsa ValueError (416).
+    """
+    match = RANGE_HEADER.match((header or '').strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    first, last = match.groups()
+    if size == 0:
+        # Boş dosyada hiçbir aralık karşılanamaz (bytes=-N dahil)
+        raise ValueError('unsatisfiable range')
+    if first == '':
+        # bytes=-N: son N byte
+        length = int(last)
+        if length == 0:
+            raise ValueError('unsatisfiable range')
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError('unsatisfiable range')
+    return start, end
+
+
+def _iter_range(fh, start, length):
+    try:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        fh.close()
+
+
+def serve_file(request, field_file, filename=None, as_attachment=False):
+    """
+    İzin kontrolünden sonra storage dosyasını döndürür:
+    - ETag (içerik hash'i) + Last-Modified; If-None-Match/If-Modified-Since eşleşirse 304.
+    - Range (tek aralık) -> 206, If-Range ETag'i tutmuyorsa tam yanıt.
+    - LEDGER_FILE_OFFLOAD='accel' -> X-Accel-Redirect (nginx), 'sendfile' -> X-Sendfile;
+      byte aktarımını (Range dahil) ön sunucu yapar, worker hemen serbest kalır.
+    """
+    http_request = getattr(request, '_request', request)
+    storage, name = field_file.storage, field_file.name
+    etag = file_etag(name)
+    cache_control = IMMUTABLE_CACHE_CONTROL if etag else PRIVATE_CACHE_CONTROL
+    try:
+        modified = storage.get_modified_time(name)
+    except (NotImplementedError, OSError):
+        modified = None
+    last_modified = int(modified.timestamp()) if modified else None
+    if etag is None and last_modified is not None:
+        etag = f'W/"{last_modified:x}-{field_file.size:x}"'
+
+    not_modified = get_conditional_response(http_request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        not_modified['Cache-Control'] = cache_control
+        return not_modified
+
+    content_type = mimetypes.guess_type(filename or name)[0] or 'application/octet-stream'
+    mode = _offload_mode()
+    if mode in ('accel', 'sendfile'):
+        response = HttpResponse(content_type=content_type)
+        if mode == 'accel':
+            prefix = getattr(settings, 'LEDGER_FILE_ACCEL_PREFIX', '/protected-media/')
+            response['X-Accel-Redirect'] = escape_uri_path(prefix.rstrip('/') + '/' + name)
+        else:
+            response['X-Sendfile'] = storage.path(name)
+    else:
+        response = _stream(http_request, field_file, etag, content_type)
+
+    if etag:
+        response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    response['Cache-Control'] = cache_control
+    response['Content-Disposition'] = _content_disposition(filename, as_attachment)
+    return response
+
+
+def _stream(http_request, field_file, etag, content_type):
+    size = field_file.size
+    header = http_request.META.get('HTTP_RANGE')
+    if_range = http_request.META.get('HTTP_IF_RANGE')
+    # If-Range yalnız güçlü ETag ile karşılaştırılır; tutmuyorsa tüm dosya gönderilir
+    if header and if_range and not (etag and not etag.startswith('W/') and etag in parse_etags(if_range)):
+        header = None
+    try:
+        byte_range = parse_range(header, size)
+    except ValueError:
+        response = HttpResponse(status=416, content_type=content_type)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    fh = field_file.storage.open(field_file.name, 'rb')
+    if byte_range is None:
+        response = FileResponse(fh, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(_iter_range(fh, start, end - start + 1),
+                                         status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+# nginx örneği (LEDGER_FILE_OFFLOAD=accel, LEDGER_FILE_ACCEL_PREFIX=/protected-media/):
+#   location /protected-media/ { internal; alias /srv/ledger/media/; }
+# Apache/lighttpd için LEDGER_FILE_OFFLOAD=sendfile (X-Sendfile, FileSystemStorage gerekir).
@@ -1,6 +1,6 @@
 import django_filters
-from django.db.models import Q
 from .models import Transaction
+from .search import search_transactions
 
 class TransactionFilter(django_filters.FilterSet):
     date_from = django_filters.IsoDateTimeFilter(field_name='transaction_date', lookup_expr='gte')
@@ -17,11 +17,8 @@ class TransactionFilter(django_filters.FilterSet):
         fields = []
 
     def filter_search(self, queryset, name, value):
-        if not value:
-            return queryset
-        return queryset.filter(
-            Q(description__icontains=value) | Q(subcategory__name__icontains=value)
-        )
+        # İndeksli arama (PostgreSQL'de pg_trgm); SearchFilter da aynı fonksiyonu kullanır
+        return search_transactions(queryset, value)
 
 # Bu filtre seti, Transaction modeline çeşitli filtreleme seçenekleri ekler.
 # Kullanıcılar, tarih aralığı, tür, ödeme yöntemi, alt kategori,
@@ -0,0 +1,234 @@
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import audit, rollups
+from .models import AuditLog, PaymentMethod, Subcategory, Transaction
+from .refdata import bump_version
+from .utils import normalize_subcategory_name
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+DESCRIPTION_MAX_LENGTH = Transaction._meta.get_field('description').max_length
+AMOUNT_LIMIT = Decimal('9999999999.99')  # max_digits=12, decimal_places=2
+TYPE_ALIASES = {
+    'income': Transaction.Types.INCOME, 'gelir': Transaction.Types.INCOME,
+    'expense': Transaction.Types.EXPENSE, 'gider': Transaction.Types.EXPENSE,
+}
+
+
+@dataclass
+class ImportResult:
+    total: int = 0
+    created: int = 0
+    batches: int = 0
+    errors: list = field(default_factory=list)
+    error_count: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self):
+        return round(self.total / self.elapsed, 1) if self.elapsed else None
+
+    def add_error(self, row_no, errors):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_no, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'total': self.total, 'created': self.created, 'failed': self.error_count,
+            'batches': self.batches, 'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': self.rows_per_second, 'errors': self.errors,
+        }
+
+
+def iter_rows(stream, fmt):
+    """
+    (satır_no, dict) üretir. fmt: 'csv' (başlık satırlı) veya 'jsonl' (satır başına bir JSON nesnesi).
+    stream byte ya da metin akışı olabilir; içerik belleğe toplu alınmaz.
+    """
+    if isinstance(stream.read(0), bytes):
+        stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if fmt == 'csv':
+        for row_no, row in enumerate(csv.DictReader(stream), start=2):
+            yield row_no, {k.strip(): (v or '').strip() for k, v in row.items() if k}
+        return
+    for row_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            yield row_no, None
+            continue
+        yield row_no, obj if isinstance(obj, dict) else None
+
+
+class TransactionImporter:
+    """
+    Toplu içe aktarma: satırlar parça parça doğrulanır, alt kategori adları bellekteki
+    normalized_name haritasından çözülür (eksikler tek bulk_create ile eklenir), işlemler
+    bulk_create ile yazılır, DailyRollup farkı toplu uygulanır ve her parti için tek bir özet
+    AuditLog kaydı oluşturulur.
+    Her parti kendi atomic bloğundadır; hatalı satırlar atlanır ve raporlanır.
+    """
+
+    def __init__(self, owner, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, source='api'):
+        self.owner = owner
+        self.chunk_size = max(1, int(chunk_size))
+        self.dry_run = dry_run
+        self.source = source
+        self.now = timezone.now()
+        self.subcategories = dict(Subcategory.objects.values_list('normalized_name', 'id'))
+        self.subcategory_ids = set(self.subcategories.values())
+        methods = list(PaymentMethod.objects.filter(is_active=True).values_list('id', 'name'))
+        self.payment_methods = {name.casefold(): pk for pk, name in methods}
+        self.payment_method_ids = {pk for pk, _ in methods}
+
+    # --- doğrulama ---------------------------------------------------------
+    def _amount(self, raw, errors):
+        try:
+            value = Decimal(str(raw).replace(',', '.')).quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+            errors['amount'] = 'A valid number is required.'
+            return None
+        if not value.is_finite():
+            errors['amount'] = 'A valid number is required.'
+        elif value <= 0:
+            errors['amount'] = 'Amount must be positive.'
+        elif value > AMOUNT_LIMIT:
+            errors['amount'] = 'Amount is too large.'
+        return value
+
+    def _date(self, raw, errors):
+        value = parse_datetime(str(raw)) if raw else None
+        if value is None and raw:
+            day = parse_date(str(raw))
+            if day is not None:
+                value = datetime(day.year, day.month, day.day)
+        if value is None:
+            errors['transaction_date'] = 'A valid date/time is required.'
+            return None
+        if timezone.is_naive(value):
+            value = timezone.make_aware(value)
+        if value > self.now:
+            errors['transaction_date'] = 'Future dates are not allowed.'
+        return value
+
+    def _payment_method(self, raw, errors):
+        raw = str(raw or '').strip()
+        if raw.isdigit() and int(raw) in self.payment_method_ids:
+            return int(raw)
+        pk = self.payment_methods.get(raw.casefold())
+        if pk is None:
+            errors['payment_method'] = f'Unknown payment method: {raw!r}.'
+        return pk
+
+    def validate_row(self, data):
+        """(alanlar, subcategory normalized_name / adı, hatalar) döndürür."""
+        if not isinstance(data, dict):
+            return None, None, {'row': 'Invalid row.'}
+        errors = {}
+        type_raw = str(data.get('type') or '').strip()
+        type_ = TYPE_ALIASES.get(type_raw.casefold(), type_raw.upper())
+        if type_ not in Transaction.Types.values:
+            errors['type'] = 'Must be INCOME or EXPENSE.'
+        description = str(data.get('description') or '')
+        if len(description) > DESCRIPTION_MAX_LENGTH:
+            errors['description'] = f'Ensure this field has no more than {DESCRIPTION_MAX_LENGTH} characters.'
+
+        fields = {
+            'amount': self._amount(data.get('amount'), errors),
+            'type': type_,
+            'payment_method_id': self._payment_method(data.get('payment_method'), errors),
+            'description': description,
+            'transaction_date': self._date(data.get('transaction_date'), errors),
+        }
+
+        subcategory = None
+        sc_raw = str(data.get('subcategory') or '').strip()
+        sc_name = str(data.get('subcategory_name') or '').strip()
+        if sc_raw.isdigit() and not sc_name:
+            if int(sc_raw) in self.subcategory_ids:
+                fields['subcategory_id'] = int(sc_raw)
+            else:
+                errors['subcategory'] = f'Unknown subcategory id: {sc_raw}.'
+        else:
+            sc_name = sc_name or sc_raw
+            norm = normalize_subcategory_name(sc_name)
+            if not norm:
+                errors['subcategory_name'] = 'Subcategory is required.'
+            elif len(sc_name) > 60 or len(norm) > 80:
+                errors['subcategory_name'] = 'Ensure this field has no more than 60 characters.'
+            else:
+                subcategory = (norm, sc_name)
+        return fields, subcategory, errors
+
+    # --- yazma --------------------------------------------------------------
+    def _resolve_missing_subcategories(self, pending):
+        missing = {norm: name for norm, name in pending if norm not in self.subcategories}
+        if not missing or self.dry_run:
+            return
+        Subcategory.objects.bulk_create(
+            [Subcategory(name=name, normalized_name=norm) for norm, name in missing.items()],
+            ignore_conflicts=True,
+        )
+        created = Subcategory.objects.filter(normalized_name__in=list(missing)).values_list('normalized_name', 'id')
+        self.subcategories.update(created)
+        bump_version('subcategories')  # bulk_create sinyal üretmez
+
+    def _flush(self, batch, result):
+        if not batch:
+            return
+        self._resolve_missing_subcategories([sc for _, _, sc in batch if sc])
+        result.batches += 1
+        if self.dry_run:
+            result.created += len(batch)
+            return
+        objs = []
+        for _, fields, sc in batch:
+            if sc:
+                fields['subcategory_id'] = self.subcategories[sc[0]]
+            objs.append(Transaction(owner=self.owner, created_by=self.owner, updated_by=self.owner, **fields))
+        with audit.unit_of_work():
+            created = Transaction.objects.bulk_create(objs, batch_size=self.chunk_size)
+            rollups.apply_objects(created)
+            ids = [o.pk for o in created if o.pk is not None]
+            audit.record(
+                self.owner, AuditLog.Actions.CREATE, 'Transaction', '*',
+                {'import': True, 'source': self.source, 'batch': result.batches, 'rows': len(objs),
+                 'first_row': batch[0][0], 'last_row': batch[-1][0],
+                 'id_min': min(ids) if ids else None, 'id_max': max(ids) if ids else None},
+            )
+        result.created += len(objs)
+
+    def run(self, rows):
+        """rows: (satır_no, dict) yineleyicisi. ImportResult döndürür."""
+        result = ImportResult()
+        started = time.perf_counter()
+        batch = []
+        for row_no, data in rows:
+            result.total += 1
+            fields, sc, errors = self.validate_row(data)
+            if errors:
+                result.add_error(row_no, errors)
+                continue
+            batch.append((row_no, fields, sc))
+            if len(batch) >= self.chunk_size:
+                self._flush(batch, result)
+                batch = []
+        self._flush(batch, result)
+        result.elapsed = time.perf_counter() - started
+        return result
+
+# Beklenen alanlar: amount, type (INCOME/EXPENSE ya da Gelir/Gider), payment_method (ad ya da id),
+# subcategory_name (ad; yoksa oluşturulur) ya da subcategory (id), description, transaction_date (ISO).
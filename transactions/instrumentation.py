@@ -0,0 +1,176 @@
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager, nullcontext
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from rest_framework import serializers
+
+logger = logging.getLogger('ledger.slow_requests')
+
+# Aktif isteğin ölçümü; LEDGER_REQUEST_TIMING kapalıyken hep None (span'ler no-op)
+_profile = ContextVar('ledger_request_profile', default=None)
+_NULL = nullcontext()
+
+# SQL parmak izi: parametreler zaten %s; IN listeleri ve kalan sabitler tek simgeye indirilir
+_IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r'\s+')
+TOP_FINGERPRINTS = 5
+
+
+def fingerprint(sql):
+    return _SPACES.sub(' ', _LITERAL.sub('?', _IN_LIST.sub('(...)', sql))).strip()
+
+
+class RequestProfile:
+    """Tek isteğin ölçümleri: SQL (sayı, süre, parmak izleri) ve adlandırılmış span süreleri (ms)."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.total_ms = 0.0
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.spans = {}
+        self.fingerprints = Counter()
+        self.fingerprint_ms = Counter()
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            key = fingerprint(sql)
+            self.queries += 1
+            self.sql_ms += elapsed
+            self.fingerprints[key] += 1
+            self.fingerprint_ms[key] += elapsed
+
+    def add(self, name, elapsed_ms):
+        self.spans[name] = self.spans.get(name, 0.0) + elapsed_ms
+
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.started) * 1000
+
+    def repeated(self, limit=TOP_FINGERPRINTS):
+        """Birden çok kez çalışan sorgular (N+1 adayları), en sık olan önce."""
+        return [{'sql': sql, 'count': n, 'ms': round(self.fingerprint_ms[sql], 2)}
+                for sql, n in self.fingerprints.most_common(limit) if n > 1]
+
+    def server_timing(self):
+        parts = [f'db;dur={self.sql_ms:.1f};desc="{self.queries} queries"']
+        parts += [f'{name};dur={ms:.1f}' for name, ms in self.spans.items()]
+        parts.append(f'total;dur={self.total_ms:.1f}')
+        return ', '.join(parts)
+
+
+def span(name):
+    """Süreyi aktif isteğin ölçümüne ekleyen bağlam; ölçüm yoksa paylaşılan no-op döner."""
+    profile = _profile.get()
+    if profile is None:
+        return _NULL
+    return _timed(profile, name)
+
+
+@contextmanager
+def _timed(profile, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(name, (time.perf_counter() - started) * 1000)
+
+
+def current_profile():
+    return _profile.get()
+
+
+class ServerTimingMiddleware:
+    """
+    LEDGER_REQUEST_TIMING açıksa istek boyunca SQL'i (connection.execute_wrapper) ve span'leri ölçer,
+    sonucu Server-Timing başlığıyla döner; eşik aşılırsa 'ledger.slow_requests' loguna JSON yazar.
+    Kapalıyken yalnız bir ayar okuması yapılır.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'LEDGER_REQUEST_TIMING', False):
+            return self.get_response(request)
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all(initialized_only=False):
+                    stack.enter_context(conn.execute_wrapper(profile.execute_wrapper))
+                response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+            profile.finish()
+        response['Server-Timing'] = profile.server_timing()
+        if self._is_slow(profile):
+            logger.warning(json.dumps(self._log_record(request, response, profile), ensure_ascii=False))
+        return response
+
+    def _is_slow(self, profile):
+        return (profile.total_ms >= getattr(settings, 'LEDGER_SLOW_REQUEST_MS', 500)
+                or profile.queries >= getattr(settings, 'LEDGER_SLOW_REQUEST_QUERIES', 50))
+
+    def _log_record(self, request, response, profile):
+        user = getattr(request, 'user', None)
+        return {
+            'event': 'slow_request',
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(getattr(request, 'resolver_match', None), 'view_name', None),
+            'status': response.status_code,
+            'user_id': user.pk if user is not None and user.is_authenticated else None,
+            'total_ms': round(profile.total_ms, 2),
+            'queries': profile.queries,
+            'sql_ms': round(profile.sql_ms, 2),
+            'spans': {name: round(ms, 2) for name, ms in profile.spans.items()},
+            'repeated_sql': profile.repeated(),
+        }
+
+
+class TimedViewMixin:
+    """DRF view'ları için: kimlik doğrulama ve izin kontrol sürelerini 'auth' ve 'perm' span'lerine yazar."""
+
+    def perform_authentication(self, request):
+        with span('auth'):
+            super().perform_authentication(request)
+
+    def check_permissions(self, request):
+        with span('perm'):
+            super().check_permissions(request)
+
+    def check_object_permissions(self, request, obj):
+        with span('perm'):
+            super().check_object_permissions(request, obj)
+
+
+class TimedSerializerMixin:
+    """Doğrulama ve çıktı üretimini 'ser' span'ine yazar (liste için Meta.list_serializer_class kullanın)."""
+
+    def is_valid(self, *args, **kwargs):
+        with span('ser'):
+            return super().is_valid(*args, **kwargs)
+
+    @property
+    def data(self):
+        with span('ser'):
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+# Span adları Server-Timing'de: db, auth, perm, ser, receipt (Transaction.save içindeki fiş işleme),
+# thumbnail (make_thumbnail), total. Span'ler iç içe olabilir (ör. receipt, ser içinde doğrulanır);
+# toplamları total'i aşabilir. Ayarlar: LEDGER_REQUEST_TIMING, LEDGER_SLOW_REQUEST_MS/_QUERIES.
@@ -0,0 +1,191 @@
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.files.base import ContentFile
+from django.db import connection, transaction as db_transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import metrics
+from .models import ReceiptBlob, ReceiptJob, Transaction
+from .utils import render_thumbnail, thumbnail_rel_name, THUMBNAIL_WIDTH
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_PREFIX = 'receipts/thumbnails/'
+RETRY_BASE_SECONDS = 10
+STALE_LOCK_AFTER = timedelta(minutes=10)
+
+
+def content_hash_for(receipt_name):
+    """Fiş adları receipts/<h2>/<sha256>.<ext> (eski: receipts/YYYY/MM/...) biçimindedir; hash dosya adının gövdesidir."""
+    return Path(receipt_name or '').stem[:64]
+
+
+def enqueue_thumbnail(receipt_name):
+    """
+    Thumbnail işini mevcut DB transaction'ı commit edildikten sonra kuyruğa ekler.
+    Aynı içerik için iş zaten varsa yeniden PENDING'e alınır; worker dosya mevcutsa yeniden üretmez.
+    """
+    content_hash = content_hash_for(receipt_name)
+    if not content_hash:
+        return
+
+    def _enqueue():
+        job, created = ReceiptJob.objects.get_or_create(
+            kind=ReceiptJob.Kinds.THUMBNAIL, content_hash=content_hash,
+            defaults={'source_name': receipt_name},
+        )
+        if not created and job.status in (ReceiptJob.Statuses.DONE, ReceiptJob.Statuses.FAILED):
+            ReceiptJob.objects.filter(pk=job.pk).update(
+                status=ReceiptJob.Statuses.PENDING, attempts=0, source_name=receipt_name,
+                run_after=timezone.now(), last_error='')
+
+    db_transaction.on_commit(_enqueue)
+
+
+def enqueue_missing_thumbnails():
+    """Commit ile on_commit arasında kaybolmuş işleri telafi eder: thumbnail'i olmayan fişler için iş açar."""
+    names = (Transaction.all_objects
+             .exclude(Q(receipt_file='') | Q(receipt_file__isnull=True))
+             .filter(Q(receipt_thumbnail='') | Q(receipt_thumbnail__isnull=True))
+             .values_list('receipt_file', flat=True).distinct())
+    count = 0
+    for name in names.iterator(chunk_size=1000):
+        content_hash = content_hash_for(name)
+        _, created = ReceiptJob.objects.get_or_create(
+            kind=ReceiptJob.Kinds.THUMBNAIL, content_hash=content_hash, defaults={'source_name': name})
+        count += int(created)
+    return count
+
+
+def claim_jobs(limit):
+    """
+    Vadesi gelen işleri RUNNING olarak işaretleyip döndürür. PostgreSQL'de
+    SKIP LOCKED ile birden fazla worker aynı işi almaz; diğer DB'lerde durum
+    koşullu UPDATE ile korunur. Kilidi bayatlamış (çökmüş worker) işler geri alınır.
+    """
+    now = timezone.now()
+    ReceiptJob.objects.filter(status=ReceiptJob.Statuses.RUNNING,
+                              locked_at__lt=now - STALE_LOCK_AFTER).update(status=ReceiptJob.Statuses.PENDING)
+    with db_transaction.atomic():
+        qs = (ReceiptJob.objects.filter(status=ReceiptJob.Statuses.PENDING, run_after__lte=now)
+              .order_by('run_after', 'id'))
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        ids = list(qs.values_list('id', flat=True)[:limit])
+        ReceiptJob.objects.filter(id__in=ids, status=ReceiptJob.Statuses.PENDING).update(
+            status=ReceiptJob.Statuses.RUNNING, locked_at=now, attempts=F('attempts') + 1)
+    return list(ReceiptJob.objects.filter(id__in=ids, status=ReceiptJob.Statuses.RUNNING, locked_at=now))
+
+
+def _thumbnail_storage():
+    return Transaction._meta.get_field('receipt_thumbnail').storage
+
+
+def _receipt_storage():
+    return Transaction._meta.get_field('receipt_file').storage
+
+
+def _prepare(job):
+    """Worker sürecine gönderilecek girdi: thumbnail zaten varsa None (idempotent)."""
+    thumb_name = THUMBNAIL_PREFIX + thumbnail_rel_name(job.source_name)
+    if _thumbnail_storage().exists(thumb_name):
+        return thumb_name, None
+    with _receipt_storage().open(job.source_name, 'rb') as fh:
+        return thumb_name, fh.read()
+
+
+def _finish(job, thumb_name, data):
+    storage = _thumbnail_storage()
+    saved = None
+    if data is not None and not storage.exists(thumb_name):
+        thumb_name = saved = storage.save(thumb_name, ContentFile(data))
+    with db_transaction.atomic():
+        # Blob kilitlenir: eşzamanlı release ya bu adı görüp dosyayı siler ya da biz bırakılmış blob'u görürüz
+        blob = ReceiptBlob.objects.select_for_update().filter(content_hash=job.content_hash).first()
+        # Blob'u olmayan eski kayıtlar (dedupe_receipts öncesi) dosya adından eşleşir
+        legacy = Transaction.all_objects.filter(receipt_blob__isnull=True, receipt_file__contains=job.content_hash)
+        referenced = (blob is not None and blob.ref_count > 0) or legacy.exists()
+        if referenced:
+            # Blob'a ve aynı içeriğe sahip tüm işlemlere bağla; save() yerine UPDATE (yan etkisiz)
+            if blob is not None:
+                ReceiptBlob.objects.filter(pk=blob.pk).update(thumbnail_name=thumb_name)
+            Transaction.all_objects.filter(
+                Q(receipt_blob__content_hash=job.content_hash)
+                | Q(receipt_blob__isnull=True, receipt_file__contains=job.content_hash)
+            ).filter(
+                Q(receipt_thumbnail='') | Q(receipt_thumbnail__isnull=True)
+            ).update(receipt_thumbnail=thumb_name)
+        elif saved:
+            # Fiş iş sürerken bırakıldı: üretilen dosya hiçbir kayda bağlanmaz
+            db_transaction.on_commit(lambda: storage.delete(saved))
+        ReceiptJob.objects.filter(pk=job.pk).update(status=ReceiptJob.Statuses.DONE, locked_at=None, last_error='')
+
+
+def _fail(job, exc):
+    attempts = job.attempts
+    if attempts >= job.max_attempts:
+        status, run_after = ReceiptJob.Statuses.FAILED, timezone.now()
+    else:
+        status = ReceiptJob.Statuses.PENDING
+        run_after = timezone.now() + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    ReceiptJob.objects.filter(pk=job.pk).update(status=status, run_after=run_after,
+                                                locked_at=None, last_error=repr(exc)[:2000])
+    logger.warning('Receipt job %s failed (attempt %s/%s): %r', job.pk, attempts, job.max_attempts, exc)
+
+
+def process_jobs(jobs, pool=None, width=THUMBNAIL_WIDTH):
+    """
+    İşleri çalıştırır. Görüntü decode/encode (CPU) işi varsa process pool'da,
+    storage ve DB erişimi ana süreçte yapılır. İşlenen iş sayısını döndürür.
+    """
+    pending = []
+    for job in jobs:
+        started = time.perf_counter()
+        try:
+            thumb_name, data = _prepare(job)
+        except Exception as exc:
+            _fail(job, exc)
+            _observe_job(job, started, 'failed')
+            continue
+        if data is None:
+            _finish(job, thumb_name, None)
+            _observe_job(job, started, 'skipped')
+        elif pool is None:
+            pending.append((job, started, thumb_name, None, data))
+        else:
+            pending.append((job, started, thumb_name, pool.submit(_render_timed, data, width), None))
+
+    for job, started, thumb_name, future, data in pending:
+        try:
+            result, seconds = future.result() if future else _render_timed(data, width)
+            metrics.observe('ledger_thumbnail_duration_seconds', seconds, source='worker')
+            _finish(job, thumb_name, result)
+        except Exception as exc:
+            _fail(job, exc)
+            _observe_job(job, started, 'failed')
+        else:
+            _observe_job(job, started, 'done')
+    return len(jobs)
+
+
+def _render_timed(data, width):
+    # Pool sürecinde çalışır; süre ana süreçte metriğe yazılır (alt süreç kendi metriklerini yayınlamaz)
+    started = time.perf_counter()
+    result = render_thumbnail(data, width)
+    return result, time.perf_counter() - started
+
+
+def _observe_job(job, started, result):
+    metrics.observe('ledger_job_duration_seconds', time.perf_counter() - started, kind=job.kind, result=result)
+
+
+def make_pool(workers):
+    return ProcessPoolExecutor(max_workers=workers) if workers > 0 else None
+
+# İş kuyruğu: ReceiptJob tablosu. Üretici taraf Transaction.save (enqueue_thumbnail),
+# tüketici taraf `manage.py receipt_worker` komutudur.
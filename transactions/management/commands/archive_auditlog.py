@@ -0,0 +1,91 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from transactions.models import AuditLog
+from transactions.partitions import drop_partitions_before, is_partitioned, partitions_before
+
+FIELDS = ('id', 'timestamp', 'actor_id', 'action', 'object_type', 'object_id', 'metadata')
+
+
+def archive_name(month):
+    return f'auditlog-{month}.jsonl.gz'
+
+
+class Command(BaseCommand):
+    help = ("Saklama süresinden eski denetim kayıtlarını aylık sıkıştırılmış JSONL dosyalarına "
+            "(auditlog-YYYY-MM.jsonl.gz) taşır ve tablodan siler. Partiler halinde çalışır.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=getattr(settings, 'LEDGER_AUDIT_RETENTION_DAYS', 365),
+                            help='Bu kadar günden eski kayıtlar arşivlenir')
+        parser.add_argument('--output-dir', default=getattr(settings, 'LEDGER_AUDIT_ARCHIVE_DIR', None))
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help='Yalnız sayıları göster; dosya yazma/silme yok')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--days and --batch-size must be positive.')
+        if not options['output_dir']:
+            raise CommandError('--output-dir is required (or set LEDGER_AUDIT_ARCHIVE_DIR).')
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        expired = AuditLog.objects.filter(timestamp__lt=cutoff)
+        if options['dry_run']:
+            self.stdout.write(f'{expired.count()} audit log row(s) older than {cutoff:%Y-%m-%d %H:%M} would be archived.')
+            return
+
+        out_dir = Path(options['output_dir'])
+        out_dir.mkdir(parents=True, exist_ok=True)
+        table = AuditLog._meta.db_table
+        partitioned = is_partitioned(table)
+        # Bölümlenmiş tabloda cutoff ayından önceki bölümler toptan DROP edilir; bu bölümlerdeki satırlar
+        # tek tek silinmez. Diğer her satır (DEFAULT bölüm dahil) silinir, yoksa her çalıştırmada yeniden arşivlenir
+        month_start = datetime(cutoff.year, cutoff.month, 1, tzinfo=dt_timezone.utc)
+        droppable = partitions_before(table, month_start.date()) if partitioned else []
+
+        def dropped_with_partition(timestamp):
+            day = timestamp.astimezone(dt_timezone.utc).date()
+            return any(lower <= day < upper for _, lower, upper in droppable)
+
+        archived = deleted = 0
+        last_id = 0
+        while True:
+            batch = list(expired.filter(id__gt=last_id).order_by('id').values(*FIELDS)[:options['batch_size']])
+            if not batch:
+                break
+            last_id = batch[-1]['id']
+            self._write_batch(out_dir, batch)
+            ids = [row['id'] for row in batch if not dropped_with_partition(row['timestamp'])]
+            if ids:
+                deleted += AuditLog.objects.filter(id__in=ids).delete()[0]
+            archived += len(batch)
+            self.stdout.write(f'  ... {archived} archived')
+
+        dropped = drop_partitions_before(table, month_start.date()) if droppable else []
+        self.stdout.write(self.style.SUCCESS(
+            f'{archived} row(s) archived to {out_dir}, {deleted} deleted, {len(dropped)} partition(s) dropped.'))
+
+    def _write_batch(self, out_dir, batch):
+        """Satırları ay dosyalarına ekler (her çağrı yeni bir gzip üyesi) ve diske yazılana kadar bekler."""
+        by_month = {}
+        for row in batch:
+            by_month.setdefault(row['timestamp'].astimezone(dt_timezone.utc).strftime('%Y-%m'), []).append(row)
+        for month, rows in by_month.items():
+            with open(out_dir / archive_name(month), 'ab') as raw:
+                with gzip.GzipFile(fileobj=raw, mode='ab') as gz:
+                    for row in rows:
+                        gz.write(json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False).encode() + b'\n')
+                raw.flush()
+                os.fsync(raw.fileno())
+
+# Sıra: parti önce dosyaya yazılır (fsync), sonra silinir. Silmeden önce kesilirse aynı satırlar
+# bir sonraki çalıştırmada tekrar yazılır (en az bir kez); geri yüklerken id ile tekilleştirin.
+# Arşiv okuma: zcat auditlog-2024-01.jsonl.gz  (birden çok gzip üyesi tek akış olarak açılır)
+# Örnek: python manage.py archive_auditlog --days 180 --batch-size 10000   (cron: günde bir)
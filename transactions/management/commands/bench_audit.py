@@ -0,0 +1,73 @@
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from transactions import audit
+from transactions.audit import MODES
+from transactions.models import AuditLog, PaymentMethod, Subcategory, Transaction
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ("Denetim kaydı modlarının (direct/batched) yazma gecikmesini karşılaştırır: "
+            "her tur bir işlem oluşturur + CREATE denetim kaydı yazar (perform_create ile aynı yol).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner', required=True, help='Deneme işlemlerinin sahibi (kullanıcı adı)')
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--entries', type=int, default=1, help='Tur başına denetim kaydı sayısı')
+        parser.add_argument('--modes', default=','.join(MODES))
+        parser.add_argument('--keep', action='store_true', help='Oluşturulan kayıtları silme')
+
+    def handle(self, *args, **options):
+        owner = User.objects.filter(username=options['owner']).first()
+        if owner is None:
+            raise CommandError(f"User not found: {options['owner']}")
+        pm = PaymentMethod.objects.filter(is_active=True).first()
+        sc, _ = Subcategory.objects.get_or_create(normalized_name='benchmark', defaults={'name': 'Benchmark'})
+        if pm is None:
+            raise CommandError('No active payment method.')
+
+        modes = [m for m in options['modes'].split(',') if m]
+        for mode in modes:
+            if mode not in MODES:
+                raise CommandError(f'Unknown mode: {mode}')
+
+        created_ids = []
+        try:
+            for mode in modes:
+                with override_settings(LEDGER_AUDIT_MODE=mode):
+                    timings = self._run(owner, pm, sc, options['iterations'], options['entries'], created_ids)
+                timings.sort()
+                p95 = timings[max(0, int(len(timings) * 0.95) - 1)]
+                self.stdout.write(
+                    f'{mode:<10} n={len(timings)} mean={statistics.mean(timings):.2f}ms '
+                    f'p50={statistics.median(timings):.2f}ms p95={p95:.2f}ms')
+        finally:
+            if not options['keep']:
+                Transaction.all_objects.filter(id__in=created_ids).hard_delete()
+                AuditLog.objects.filter(metadata__benchmark=True).delete()
+
+    def _run(self, owner, pm, sc, iterations, entries, created_ids):
+        when = timezone.now() - timedelta(days=1)
+        timings = []
+        for i in range(iterations):
+            started = time.perf_counter()
+            with audit.unit_of_work():
+                tx = Transaction.objects.create(owner=owner, amount=Decimal('1.00'), type='EXPENSE',
+                                                payment_method=pm, subcategory=sc, transaction_date=when)
+                for _ in range(entries):
+                    audit.record(owner, AuditLog.Actions.CREATE, 'Transaction', tx.id, {'benchmark': True})
+            timings.append((time.perf_counter() - started) * 1000)
+            created_ids.append(tx.id)
+        return timings
+
+# Örnek: python manage.py bench_audit --owner admin --iterations 500
+#        python manage.py bench_audit --owner admin --entries 20 --modes direct,batched
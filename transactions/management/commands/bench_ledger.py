@@ -0,0 +1,74 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+
+from transactions.benchmarks import PATHS, BenchmarkError, LedgerBenchmark, compare, load, run_metadata
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ("API yollarını (liste, filtre, arama, fişli oluşturma, fiş indirme, toplu işlem) ölçer: "
+            "p50/p95/p99 gecikme, sorgu sayısı ve bellek tepe değeri. Sonuç JSON olarak kaydedilir; "
+            "--compare ile önceki bir çalıştırmayla karşılaştırılır.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner', required=True, help='İstekleri yapan kullanıcı (ör. seed_ledger kullanıcısı)')
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--memory-iterations', type=int, default=10, help='tracemalloc turu sayısı (0: kapalı)')
+        parser.add_argument('--paths', default=','.join(PATHS))
+        parser.add_argument('--output', help='Sonuç dosyası (JSON)')
+        parser.add_argument('--compare', help='Karşılaştırılacak önceki sonuç dosyası')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='--compare ile gerileme varsa hata kodu döner')
+
+    def handle(self, *args, **options):
+        owner = User.objects.filter(username=options['owner']).first()
+        if owner is None:
+            raise CommandError(f"User not found: {options['owner']}")
+        paths = [p for p in options['paths'].split(',') if p]
+        for name in paths:
+            if name not in PATHS:
+                raise CommandError(f'Unknown path: {name} (choices: {", ".join(PATHS)})')
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be positive.')
+        previous = load(options['compare']) if options['compare'] else None
+
+        bench = LedgerBenchmark(owner, iterations=options['iterations'], warmup=max(0, options['warmup']),
+                                memory_iterations=max(0, options['memory_iterations']))
+        # Test istemcisi 'testserver' host'uyla istek yapar
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            try:
+                results = bench.run(paths)
+            except BenchmarkError as e:
+                raise CommandError(str(e))
+
+        report = {'meta': {**run_metadata(), 'owner': owner.username, 'iterations': options['iterations']},
+                  'results': results}
+        for name, r in results.items():
+            mem = f" mem={r['mem_peak_kb']:.0f}KB" if 'mem_peak_kb' in r else ''
+            self.stdout.write(f"{name:<17} p50={r['p50_ms']:.2f}ms p95={r['p95_ms']:.2f}ms p99={r['p99_ms']:.2f}ms "
+                              f"queries={r['queries_mean']:g}/{r['queries_max']}{mem}")
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding='utf-8')
+            self.stdout.write(f"Results written to {options['output']}.")
+
+        if previous is not None:
+            rows = compare(report, previous)
+            self.stdout.write(f"Compared with {previous.get('meta', {}).get('commit', '')[:12] or options['compare']}:")
+            for path, metric, old, new, ratio, regressed in rows:
+                flag = self.style.ERROR(' REGRESSION') if regressed else ''
+                self.stdout.write(f'  {path:<17} {metric:<12} {old:>10} -> {new:<10} ({ratio:+.1%}){flag}')
+            regressions = [r for r in rows if r[5]]
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{len(regressions)} metric(s) regressed.')
+
+# Örnek: python manage.py seed_ledger --users 50 --transactions 1000000 --receipts 0.05
+#        python manage.py bench_ledger --owner seed-00000 --output bench-$(git rev-parse --short HEAD).json
+#        python manage.py bench_ledger --owner seed-00000 --compare bench-abc1234.json --fail-on-regression
+# Sonuçlar aynı makine ve aynı veri (aynı --seed) ile karşılaştırılmalıdır; DEBUG kapalı çalıştırın.
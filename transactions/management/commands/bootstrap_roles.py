@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth.models import Group, Permission
 from django.contrib.contenttypes.models import ContentType
 from transactions.models import Transaction
+from transactions.roles import invalidate_roles
 
 class Command(BaseCommand):
     help = "(Admin, Manager, User) oluştur ve yetki ata."
@@ -39,6 +40,9 @@ class Command(BaseCommand):
         # User: CRUD + view
         user_g.permissions.set([add, change, delete, view])
 
+        # İstekler arası rol önbelleği eski izinleri tutmasın
+        invalidate_roles()
+
         self.stdout.write(self.style.SUCCESS('Roles and permissions bootstrapped:'))
         self.stdout.write(f'  Admin  -> {len(admin_perms)} perms')
         self.stdout.write(f'  Manager-> {len(manager_g.permissions.all())} perms (CRUD + export)')
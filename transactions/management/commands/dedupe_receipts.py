@@ -0,0 +1,139 @@
+import hashlib
+from collections import defaultdict
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from django.db.models import Count, Q
+
+from transactions.models import ReceiptBlob, Transaction
+from transactions.utils import thumbnail_rel_name
+
+THUMBNAIL_PREFIX = 'receipts/thumbnails/'
+
+
+class Command(BaseCommand):
+    help = ("Mevcut fişleri içerik adresli ReceiptBlob'lara taşır: aynı içerik tek dosyada toplanır, "
+            "referans sayıları yeniden hesaplanır ve artık kullanılmayan kopyalar silinir.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Değişiklik yapmadan raporla')
+        parser.add_argument('--prune-orphans', action='store_true',
+                            help='receipts/ altında hiçbir kayda bağlı olmayan dosyaları da sil')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.storage = Transaction._meta.get_field('receipt_file').storage
+        self.obsolete = set()
+        stats = defaultdict(int)
+
+        legacy = (Transaction.all_objects.filter(receipt_blob__isnull=True)
+                  .exclude(Q(receipt_file='') | Q(receipt_file__isnull=True))
+                  .only('id', 'receipt_file', 'receipt_thumbnail'))
+        hashes = {}  # eski dosya adı -> hash (aynı dosyayı iki kez okumamak için)
+        for tx in legacy.iterator(chunk_size=500):
+            name = tx.receipt_file.name.replace('\\', '/')
+            if not self.storage.exists(name):
+                stats['missing'] += 1
+                self.stderr.write(f'Missing file for transaction #{tx.pk}: {name}')
+                continue
+            if name not in hashes:
+                hashes[name] = self._hash(name)
+            self._link(tx, name, hashes[name], stats)
+
+        if not self.dry_run:
+            stats['recounted'] = self._recount()
+        self._delete_obsolete(stats)
+        if options['prune_orphans']:
+            self._prune_orphans(stats)
+
+        prefix = '[dry-run] ' if self.dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}linked={stats['linked']} blobs_created={stats['created']} "
+            f"files_deleted={stats['deleted']} orphans_deleted={stats['orphans']} missing={stats['missing']}"))
+
+    def _hash(self, name):
+        digest = hashlib.sha256()
+        with self.storage.open(name, 'rb') as fh:
+            for chunk in fh.chunks():
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _link(self, tx, name, content_hash, stats):
+        stats['linked'] += 1
+        if self.dry_run:
+            return
+        with db_transaction.atomic():
+            blob = ReceiptBlob.objects.select_for_update().filter(content_hash=content_hash).first()
+            if blob is None:
+                target = ReceiptBlob.content_path(content_hash, Path(name).suffix.lower() or '.bin')
+                if not self.storage.exists(target):
+                    with self.storage.open(name, 'rb') as fh:
+                        self.storage.save(target, fh)
+                blob = ReceiptBlob.objects.create(content_hash=content_hash, file_name=target,
+                                                  size=self.storage.size(target))
+                stats['created'] += 1
+
+            thumb = tx.receipt_thumbnail.name.replace('\\', '/') if tx.receipt_thumbnail else ''
+            if not blob.thumbnail_name and thumb and self.storage.exists(thumb):
+                target = THUMBNAIL_PREFIX + thumbnail_rel_name(blob.file_name)
+                if not self.storage.exists(target):
+                    with self.storage.open(thumb, 'rb') as fh:
+                        self.storage.save(target, fh)
+                blob.thumbnail_name = target
+                blob.save(update_fields=['thumbnail_name', 'updated_at'])
+
+            if name != blob.file_name:
+                self.obsolete.add(name)
+            if thumb and thumb != blob.thumbnail_name:
+                self.obsolete.add(thumb)
+            # save() yerine UPDATE: ingest/thumbnail yan etkileri tetiklenmez
+            Transaction.all_objects.filter(pk=tx.pk).update(
+                receipt_blob=blob, receipt_file=blob.file_name,
+                receipt_thumbnail=blob.thumbnail_name or None)
+
+    def _recount(self):
+        """ref_count'u gerçek referans sayısıyla eşitler (işlemi olmayan blob'lar 0 olur)."""
+        changed = 0
+        counts = dict(ReceiptBlob.objects.annotate(n=Count('transactions')).values_list('id', 'n'))
+        for blob in ReceiptBlob.objects.only('id', 'ref_count'):
+            n = counts.get(blob.pk, 0)
+            if blob.ref_count != n:
+                ReceiptBlob.objects.filter(pk=blob.pk).update(ref_count=n)
+                changed += 1
+        return changed
+
+    def _referenced_names(self):
+        names = set()
+        for a, b in ReceiptBlob.objects.values_list('file_name', 'thumbnail_name'):
+            names.update(n for n in (a, b) if n)
+        for a, b in Transaction.all_objects.values_list('receipt_file', 'receipt_thumbnail'):
+            names.update(n.replace('\\', '/') for n in (a, b) if n)
+        return names
+
+    def _delete_obsolete(self, stats):
+        referenced = self._referenced_names() if not self.dry_run else set()
+        for name in sorted(self.obsolete - referenced):
+            stats['deleted'] += 1
+            if not self.dry_run and self.storage.exists(name):
+                self.storage.delete(name)
+
+    def _walk(self, top):
+        dirs, files = self.storage.listdir(top)
+        for f in files:
+            yield f'{top}/{f}'
+        for d in dirs:
+            yield from self._walk(f'{top}/{d}')
+
+    def _prune_orphans(self, stats):
+        if not self.storage.exists('receipts'):
+            return
+        referenced = self._referenced_names()
+        for name in self._walk('receipts'):
+            if name not in referenced:
+                stats['orphans'] += 1
+                if not self.dry_run:
+                    self.storage.delete(name)
+
+# Örnek: python manage.py dedupe_receipts --dry-run
+#        python manage.py dedupe_receipts --prune-orphans
@@ -0,0 +1,74 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils.dateparse import parse_date
+
+from transactions.partitions import (
+    INTERVALS, PARTITIONED_MODELS, PartitioningNotSupported, add_months, convert_to_partitioned,
+    drop_partitions_before, ensure_monthly_partitions, interval_months, is_partitioned,
+)
+
+
+class Command(BaseCommand):
+    help = ("PostgreSQL aylık/yıllık bölümleme: --convert ile tabloyu bölümlenmiş yapıya dönüştürür, "
+            "aksi halde önümüzdeki aylar için eksik bölümleri açar (cron ile ayda bir çalıştırın). "
+            "--drop-before/--detach-before eski bölümleri kaldırır.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('tables', nargs='*',
+                            help=f"Varsayılan: {', '.join(sorted(PARTITIONED_MODELS))}")
+        parser.add_argument('--months-ahead', type=int, default=3)
+        parser.add_argument('--convert', action='store_true',
+                            help='Bölümlenmemiş tabloyu dönüştür (tablo kilitlenir; bakım penceresinde çalıştırın)')
+        parser.add_argument('--keep-legacy', action='store_true', help='Dönüştürmede eski tabloyu <tablo>_legacy olarak bırak')
+        parser.add_argument('--interval', choices=sorted(INTERVALS), default='month',
+                            help='Dönüştürmede bölüm aralığı; sonradan mevcut bölümlerden okunur')
+        removal = parser.add_mutually_exclusive_group()
+        removal.add_argument('--drop-before', metavar='YYYY-MM-DD',
+                             help='Tamamen bu tarihten önceki bölümleri DROP et')
+        removal.add_argument('--detach-before', metavar='YYYY-MM-DD',
+                             help='Tamamen bu tarihten önceki bölümleri DETACH et (arşiv için ayrı tablo kalır)')
+
+    def handle(self, *args, **options):
+        tables = options['tables'] or sorted(PARTITIONED_MODELS)
+        unknown = set(tables) - set(PARTITIONED_MODELS)
+        if unknown:
+            raise CommandError(f"Unknown table(s): {', '.join(sorted(unknown))}")
+        cutoff_value = options['drop_before'] or options['detach_before']
+        try:
+            cutoff = parse_date(cutoff_value) if cutoff_value else None
+        except ValueError:
+            cutoff = None
+        if cutoff_value and cutoff is None:
+            raise CommandError(f'Invalid date: {cutoff_value} (expected YYYY-MM-DD).')
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning is only available on PostgreSQL.')
+        try:
+            for key in tables:
+                model, column = PARTITIONED_MODELS[key]
+                table = model._meta.db_table
+                if options['convert'] and convert_to_partitioned(model, column, options['months_ahead'],
+                                                                 keep_legacy=options['keep_legacy'],
+                                                                 months=INTERVALS[options['interval']]):
+                    self.stdout.write(self.style.SUCCESS(f"{table}: converted to {options['interval']}ly partitions."))
+                if not is_partitioned(table):
+                    self.stdout.write(f'{table}: not partitioned (use --convert).')
+                    continue
+                today = date.today()
+                created = ensure_monthly_partitions(table, today, add_months(today, options['months_ahead'] + 1),
+                                                    months=interval_months(table))
+                self.stdout.write(f"{table}: {len(created)} partition(s) created {', '.join(created)}".rstrip())
+                if cutoff:
+                    detach = bool(options['detach_before'])
+                    removed = drop_partitions_before(table, cutoff, detach=detach)
+                    verb = 'detached' if detach else 'dropped'
+                    self.stdout.write(f"{table}: {len(removed)} partition(s) {verb} {', '.join(removed)}".rstrip())
+        except PartitioningNotSupported as exc:
+            raise CommandError(str(exc))
+
+# Örnek: python manage.py ensure_partitions auditlog --convert
+#        python manage.py ensure_partitions transaction --convert --interval year
+#        python manage.py ensure_partitions --months-ahead 6      (cron: ayda bir)
+#        python manage.py ensure_partitions transaction --detach-before 2020-01-01
+# Transaction bölümü kaldırılırken rollup katkıları düşülür; DROP'ta fiş blob referansları da bırakılır.
@@ -0,0 +1,44 @@
+import sys
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from transactions.importers import DEFAULT_CHUNK_SIZE, TransactionImporter, iter_rows
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "CSV ya da JSON lines dosyasından işlemleri toplu içe aktarır (banka ekstresi taşıma)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Dosya yolu ('-' = stdin)")
+        parser.add_argument('--owner', required=True, help='İşlemlerin sahibi (kullanıcı adı ya da e-posta)')
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help='Varsayılan: uzantıdan (.jsonl/.ndjson -> jsonl)')
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Yalnız doğrula, yazma')
+
+    def handle(self, *args, **options):
+        owner = User.objects.filter(Q(username__iexact=options['owner']) | Q(email__iexact=options['owner'])).first()
+        if owner is None:
+            raise CommandError(f"User not found: {options['owner']}")
+
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv')
+        importer = TransactionImporter(owner, chunk_size=options['chunk_size'],
+                                       dry_run=options['dry_run'], source='command')
+        if path == '-':
+            result = importer.run(iter_rows(sys.stdin, fmt))
+        else:
+            with open(path, 'rb') as fh:
+                result = importer.run(iter_rows(fh, fmt))
+
+        for err in result.errors:
+            self.stderr.write(f"row {err['row']}: {err['errors']}")
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{result.created}/{result.total} rows imported in {result.batches} batch(es), "
+            f"{result.error_count} failed, {result.elapsed:.2f}s ({result.rows_per_second or 0} rows/s)"))
+
+# Örnek: python manage.py import_transactions ekstre.csv --owner ali@example.com --chunk-size 2000
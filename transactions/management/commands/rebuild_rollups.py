@@ -0,0 +1,86 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Q
+
+from transactions.models import DailyRollup, Transaction
+from transactions.rollups import diff_owner, rebuild_owner
+
+User = get_user_model()
+
+
+def _in_thread(func, owner_id):
+    # Her thread kendi DB bağlantısını açar; iş bitince kapatılır
+    try:
+        return owner_id, func(owner_id)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ("DailyRollup tablosunu ham işlemlerden sahip bazında (paralel) yeniden hesaplar; "
+            "--check ile yalnız tutarlılığı denetler.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner', action='append', default=[],
+                            help='Yalnız bu kullanıcı(lar) (kullanıcı adı, e-posta ya da id; tekrarlanabilir)')
+        parser.add_argument('--workers', type=int, default=4, help='Paralel thread sayısı (SQLite: 1)')
+        parser.add_argument('--check', action='store_true', help='Yazmadan karşılaştır; sapma varsa hata kodu döner')
+        parser.add_argument('--repair', action='store_true', help='Denetle ve yalnız sapan sahipleri yeniden hesapla')
+
+    def handle(self, *args, **options):
+        owner_ids = self._owner_ids(options['owner'])
+        workers = max(1, options['workers']) if connection.vendor != 'sqlite' else 1
+        started = time.perf_counter()
+
+        if options['check'] or options['repair']:
+            drifted = {}
+            for owner_id, diffs in self._run(diff_owner, owner_ids, workers):
+                if diffs:
+                    drifted[owner_id] = diffs
+                    for key, expected, stored in diffs[:20]:
+                        self.stderr.write(f'owner={owner_id} key={key[1:]} expected={expected} stored={stored}')
+            if options['repair'] and drifted:
+                list(self._run(rebuild_owner, sorted(drifted), workers))
+                self.stdout.write(self.style.SUCCESS(f'{len(drifted)} owner(s) repaired.'))
+                return
+            if drifted:
+                total = sum(len(d) for d in drifted.values())
+                raise CommandError(f'{total} rollup key(s) out of sync for {len(drifted)} owner(s).')
+            self.stdout.write(self.style.SUCCESS(f'{len(owner_ids)} owner(s) consistent.'))
+            return
+
+        rows = sum(n for _, n in self._run(rebuild_owner, owner_ids, workers))
+        self.stdout.write(self.style.SUCCESS(
+            f'{rows} rollup row(s) rebuilt for {len(owner_ids)} owner(s) in {time.perf_counter() - started:.2f}s.'))
+
+    def _owner_ids(self, owners):
+        if not owners:
+            # işlemi kalmamış sahiplerin eski rollup satırları da temizlensin
+            ids = set(Transaction.all_objects.order_by().values_list('owner_id', flat=True).distinct())
+            return sorted(ids | set(DailyRollup.objects.order_by().values_list('owner_id', flat=True).distinct()))
+        ids = []
+        for value in owners:
+            q = Q(username__iexact=value) | Q(email__iexact=value)
+            if value.isdigit():
+                q |= Q(pk=int(value))
+            user = User.objects.filter(q).first()
+            if user is None:
+                raise CommandError(f'User not found: {value}')
+            ids.append(user.pk)
+        return ids
+
+    def _run(self, func, owner_ids, workers):
+        if workers == 1:
+            for owner_id in owner_ids:
+                yield owner_id, func(owner_id)
+            return
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            yield from pool.map(lambda pk: _in_thread(func, pk), owner_ids)
+
+# Örnek: python manage.py rebuild_rollups --workers 8
+#        python manage.py rebuild_rollups --check            (cron: sapma varsa çıkış kodu 1)
+#        python manage.py rebuild_rollups --repair --owner alice
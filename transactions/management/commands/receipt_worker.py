@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from transactions.jobs import claim_jobs, enqueue_missing_thumbnails, make_pool, process_jobs
+
+
+class Command(BaseCommand):
+    help = "ReceiptJob kuyruğunu işler (thumbnail üretimi). Decode/encode işleri process pool'da çalışır."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Process pool boyutu (0: aynı süreçte çalış)')
+        parser.add_argument('--batch', type=int, default=20, help='Tek seferde alınacak iş sayısı')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Kuyruk boşken bekleme (saniye)')
+        parser.add_argument('--once', action='store_true', help='Kuyruk boşalınca çık')
+        parser.add_argument('--enqueue-missing', action='store_true',
+                            help="Başlamadan önce thumbnail'i eksik fişler için iş aç")
+
+    def handle(self, *args, **options):
+        if options['enqueue_missing']:
+            created = enqueue_missing_thumbnails()
+            self.stdout.write(f'{created} job(s) enqueued for missing thumbnails.')
+
+        pool = make_pool(options['workers'])
+        processed = 0
+        try:
+            while True:
+                jobs = claim_jobs(options['batch'])
+                if jobs:
+                    processed += process_jobs(jobs, pool=pool)
+                    continue
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if pool:
+                pool.shutdown()
+        self.stdout.write(self.style.SUCCESS(f'{processed} job(s) processed.'))
+
+# Örnek: python manage.py receipt_worker --workers 4
+# Tek seferlik (cron/test): python manage.py receipt_worker --once --workers 0
@@ -0,0 +1,162 @@
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from transactions.dbpool import close_pools
+from transactions.models import PaymentMethod, ReceiptBlob, Subcategory, Transaction
+from transactions.seeding import (
+    INCOME_NAMES, SUBCATEGORY_NAMES, SeedPlan, init_worker, insert_chunk, make_receipt_image, zipf_weights,
+)
+from transactions.utils import normalize_subcategory_name
+
+User = get_user_model()
+
+# Rol dağılımı: kullanıcıların ~%5'i Admin, ~%15'i Manager, kalanı User
+ROLE_SHARES = (('Admin', 0.05), ('Manager', 0.15))
+
+
+class Command(BaseCommand):
+    help = ("Yük testi için sentetik veri üretir: rollere dağılmış kullanıcılar, kategori/tarih dağılımı "
+            "çarpık işlemler (bulk_create, çok süreçli) ve isteğe bağlı fiş görüntüleri.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--transactions', type=int, default=100_000)
+        parser.add_argument('--workers', type=int, default=4, help='Paralel süreç sayısı (SQLite: 1)')
+        parser.add_argument('--chunk-size', type=int, default=10_000, help='Süreç başına bir iş parçasındaki satır')
+        parser.add_argument('--batch-size', type=int, default=2000, help='bulk_create parti boyutu')
+        parser.add_argument('--days', type=int, default=730, help='İşlem tarihleri bu kadar gün geriye yayılır')
+        parser.add_argument('--receipts', type=float, default=0.0, help='Fişli işlem oranı (0-1)')
+        parser.add_argument('--receipt-variants', type=int, default=20, help='Farklı fiş görüntüsü sayısı')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='seed', help='Üretilen kullanıcı adlarının öneki')
+        parser.add_argument('--password', default='seed-pass-123')
+        parser.add_argument('--clear', action='store_true', help='Önce aynı önekli kullanıcıları ve verilerini sil')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['transactions'] < 0 or options['chunk_size'] < 1 or options['days'] < 1:
+            raise CommandError('--users, --chunk-size and --days must be positive.')
+        if not 0 <= options['receipts'] <= 1:
+            raise CommandError('--receipts must be between 0 and 1.')
+        started = time.perf_counter()
+        rng = random.Random(options['seed'])
+        if options['clear']:
+            self._clear(options['prefix'])
+
+        call_command('bootstrap_roles', stdout=StringIO())
+        users = self._create_users(options['users'], options['prefix'], options['password'])
+        plan = SeedPlan(
+            owner_ids=[u.pk for u in users],
+            owner_weights=zipf_weights(len(users), s=0.8),
+            payment_method_ids=list(PaymentMethod.objects.filter(is_active=True).values_list('pk', flat=True)),
+            expense_subcategory_ids=self._subcategories(SUBCATEGORY_NAMES),
+            income_subcategory_ids=self._subcategories(INCOME_NAMES),
+            now=timezone.now(), days=options['days'], seed=options['seed'],
+            receipt_ratio=options['receipts'],
+        )
+        if not plan.payment_method_ids:
+            raise CommandError('No active payment method; run migrate first.')
+        if options['receipts'] and options['transactions']:
+            plan.receipts = self._receipt_variants(users[0], plan, options['receipt_variants'], rng)
+
+        rows = self._insert(plan, options)
+        self.stdout.write(f'{rows} transaction(s) inserted in {time.perf_counter() - started:.1f}s; rebuilding rollups...')
+        call_command('rebuild_rollups', owner=[str(pk) for pk in plan.owner_ids],
+                     workers=options['workers'], stdout=StringIO())
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {len(users)} user(s) and {rows} transaction(s) in {time.perf_counter() - started:.1f}s '
+            f'(password: {options["password"]}).'))
+
+    def _create_users(self, count, prefix, password):
+        existing = set(User.objects.filter(username__startswith=f'{prefix}-').values_list('username', flat=True))
+        hashed = make_password(password)  # tek hash: PBKDF2 kullanıcı başına hesaplanmasın
+        new = [User(username=f'{prefix}-{i:05d}', email=f'{prefix}-{i:05d}@example.com', password=hashed)
+               for i in range(count) if f'{prefix}-{i:05d}' not in existing]
+        User.objects.bulk_create(new, batch_size=1000)
+        users = list(User.objects.filter(username__in=[f'{prefix}-{i:05d}' for i in range(count)]).order_by('username'))
+
+        groups = {g.name: g for g in Group.objects.filter(name__in=['Admin', 'Manager', 'User'])}
+        through = User.groups.through
+        through.objects.filter(user__in=users).delete()
+        links, start = [], 0
+        for name, share in ROLE_SHARES + (('User', 1.0),):
+            end = len(users) if name == 'User' else start + max(1, round(len(users) * share))
+            links += [through(user_id=u.pk, group_id=groups[name].pk) for u in users[start:end]]
+            start = min(end, len(users))
+        through.objects.bulk_create(links, batch_size=1000)
+        return users
+
+    def _subcategories(self, names):
+        ids = []
+        for name in names:
+            obj, _ = Subcategory.objects.get_or_create(normalized_name=normalize_subcategory_name(name),
+                                                       defaults={'name': name})
+            ids.append(obj.pk)
+        return ids
+
+    def _receipt_variants(self, owner, plan, count, rng):
+        """Fiş görüntülerini normal kayıt yolundan (ingest + blob + thumbnail) bir kez üretir."""
+        variants = []
+        with override_settings(LEDGER_ASYNC_THUMBNAILS=False):
+            for i in range(max(1, count)):
+                tx = Transaction(owner=owner, created_by=owner, updated_by=owner, amount=Decimal('10.00'), type='EXPENSE',
+                                 payment_method_id=plan.payment_method_ids[0],
+                                 subcategory_id=plan.expense_subcategory_ids[0],
+                                 transaction_date=plan.now, description=f'seed fiş {i + 1}')
+                tx.receipt_file = ContentFile(make_receipt_image(rng), name=f'fis-{i + 1}.png')
+                tx.save()
+                variants.append((tx.receipt_blob_id, tx.receipt_file.name, tx.receipt_thumbnail.name or '',
+                                 tx.receipt_original_name))
+        return variants
+
+    def _insert(self, plan, options):
+        total, chunk = options['transactions'], options['chunk_size']
+        jobs = [(plan, i, min(chunk, total - i * chunk), options['batch_size'])
+                for i in range((total + chunk - 1) // chunk)]
+        workers = max(1, options['workers']) if connection.vendor != 'sqlite' else 1
+        rows, refs = 0, {}
+
+        def collect(result):
+            nonlocal rows
+            n, chunk_refs = result
+            rows += n
+            for blob_id, c in chunk_refs.items():
+                refs[blob_id] = refs.get(blob_id, 0) + c
+            self.stdout.write(f'  ... {rows}/{total}')
+
+        if workers == 1:
+            for job in jobs:
+                collect(insert_chunk(job))
+        else:
+            # Fork edilen süreçler üst sürecin açık bağlantısını ve havuzunu paylaşmasın
+            close_pools()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+                for result in pool.map(insert_chunk, jobs):
+                    collect(result)
+        for blob_id, c in refs.items():
+            ReceiptBlob.objects.filter(pk=blob_id).update(ref_count=F('ref_count') + c)
+        return rows
+
+    def _clear(self, prefix):
+        users = User.objects.filter(username__startswith=f'{prefix}-')
+        # Kullanıcı silinirken işlemleri pre_delete sinyaliyle hard_delete edilir (blob referansları bırakılır)
+        deleted = Transaction.all_objects.filter(owner__in=users).count()
+        users.delete()
+        self.stdout.write(f'Cleared {deleted} row(s) for prefix "{prefix}".')
+
+# Örnek: python manage.py seed_ledger --users 200 --transactions 2000000 --workers 8 --receipts 0.1
+#        python manage.py seed_ledger --clear --users 20 --transactions 50000    (yerel SQLite: tek süreç)
+# Aynı --seed ile aynı veri üretilir (parça bazında deterministik). Denetim kaydı yazılmaz.
@@ -1,21 +1,82 @@
-from django.db import models
+from collections import Counter
+from django.db import models, transaction
 from django.utils import timezone
 
 class ActiveOnlyQuerySet(models.QuerySet):
+    """
+    Toplu işlemler tek UPDATE/DELETE ile yapılır; her biri etkilenen id listesini döndürür
+    (AuditLog.record_bulk ile denetim kaydı yazmak için). DailyRollup farkı aynı
+    transaction'da, seçilen satırların değerlerinden toplu yazılır.
+    """
+
+    def _rollup_rows(self, **filters):
+        # Satırlar kilitlenir (id sırasıyla): eşzamanlı işlem aynı satırların katkısını ikinci kez uygulamasın;
+        # kilidi bekleyen sorgu koşulu (is_active) commit edilmiş değerle yeniden değerlendirir
+        from .rollups import STATE_FIELDS
+        return list(self.filter(**filters).select_for_update().order_by('id').values_list('id', *STATE_FIELDS))
+
+    def soft_delete(self, by=None):
+        from . import rollups
+        now = timezone.now()
+        with transaction.atomic(using=self.db):
+            rows = self._rollup_rows(is_active=True)
+            ids = [r[0] for r in rows]
+            if ids:
+                self.model.all_objects.using(self.db).filter(id__in=ids, is_active=True).update(
+                    is_active=False, deleted_at=now, deleted_by=by)
+                rollups.apply_rows((r[1:] for r in rows), -1, using=self.db)
+        return ids
+
+    def restore(self, by=None):
+        from . import rollups
+        with transaction.atomic(using=self.db):
+            rows = self._rollup_rows(is_active=False)
+            ids = [r[0] for r in rows]
+            if ids:
+                self.model.all_objects.using(self.db).filter(id__in=ids, is_active=False).update(
+                    is_active=True, deleted_at=None, deleted_by=None)
+                # satırlar artık aktif: katkıları eklenir
+                rollups.apply_rows(((*r[1:-1], True) for r in rows), +1, using=self.db)
+        return ids
+
+    def hard_delete(self):
+        """
+        Kayıtları kalıcı siler. İçerik adresli fişlerin blob referansları bırakılır
+        (dosya son referansta silinir); blob'u olmayan eski fiş dosyaları commit sonrası silinir.
+        """
+        from . import rollups
+        blob_model = self.model._meta.get_field('receipt_blob').related_model
+        with transaction.atomic(using=self.db):
+            rows = list(self.select_for_update().order_by('id').values_list(
+                'id', 'receipt_blob_id', 'receipt_file', 'receipt_thumbnail', *rollups.STATE_FIELDS))
+            if not rows:
+                return []
+            ids = [r[0] for r in rows]
+            models.QuerySet.delete(self.model.all_objects.using(self.db).filter(id__in=ids))
+            rollups.apply_rows((r[4:] for r in rows), -1, using=self.db)
+            for blob_id, count in Counter(r[1] for r in rows if r[1]).items():
+                blob_model.release(blob_id, count=count)
+            legacy = [name for r in rows if not r[1] for name in r[2:4] if name]
+            if legacy:
+                storage = self.model._meta.get_field('receipt_file').storage
+                transaction.on_commit(lambda: _delete_files(storage, legacy), using=self.db)
+        return ids
+
     def delete(self, by=None, hard=False):
         if hard:
-            return super().delete()
-        now = timezone.now()
-        count = 0
-        for obj in self:
-            if obj.is_active:
-                obj.is_active = False
-                obj.deleted_at = now
-                if by is not None:
-                    obj.deleted_by = by
-                obj.save(update_fields=['is_active', 'deleted_at', 'deleted_by'])
-                count += 1
-        return (count, {})
+            ids = self.hard_delete()
+        else:
+            ids = self.soft_delete(by=by)
+        return (len(ids), {})
+
+
+def _delete_files(storage, names):
+    for name in names:
+        try:
+            if storage.exists(name):
+                storage.delete(name)
+        except Exception:
+            pass
 
 class ActiveOnlyManager(models.Manager):
     def get_queryset(self):
@@ -0,0 +1,247 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+# Saniye cinsinden gecikme kovaları (Prometheus varsayılanına yakın)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Ad -> (tür, açıklama, kovalar). Kayıt dışı adla ölçüm yapılamaz (yazım hatası sessizce yeni seri açmasın)
+METRICS = {
+    'ledger_http_requests_total': ('counter', 'HTTP requests by view, action, method and status.', None),
+    'ledger_http_request_duration_seconds': ('histogram', 'HTTP request latency by view and action.',
+                                             LATENCY_BUCKETS),
+    'ledger_audit_entries_written_total': ('counter', 'AuditLog rows written, by audit mode.', None),
+    'ledger_audit_write_duration_seconds': ('histogram', 'AuditLog write (INSERT/bulk_create) latency.',
+                                            LATENCY_BUCKETS),
+    'ledger_receipts_ingested_total': ('counter', 'Receipt uploads ingested, by image format.', None),
+    'ledger_receipt_bytes_ingested_total': ('counter', 'Receipt bytes ingested.', None),
+    'ledger_thumbnail_duration_seconds': ('histogram', 'Thumbnail generation time (inline or worker).',
+                                          LATENCY_BUCKETS),
+    'ledger_job_duration_seconds': ('histogram', 'Background job run time by kind and result.', LATENCY_BUCKETS),
+}
+FILE_PREFIX = 'metrics-'
+
+
+class Registry:
+    """
+    Süreç içi sayaç/histogram deposu. LEDGER_METRICS_DIR verilmişse süreç anlık görüntüsünü en fazla
+    LEDGER_METRICS_FLUSH_INTERVAL saniyede bir <dir>/metrics-<pid>-<başlangıç>.json dosyasına (atomik)
+    yazar; /metrics tüm dosyaları toplar. Böylece her gunicorn worker'ı yalnız kendi dosyasını yazar.
+    Dosya adı ve veriler süreç kimliğine bağlıdır: fork sonrası (gunicorn --preload) ilk kullanımda
+    yeniden türetilir.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._counters = {}
+        self._histograms = {}
+        self._last_flush = 0.0
+        self._file_name = None
+
+    def _claim(self):
+        """Kilit altında çağrılır. pid değiştiyse (fork) ebeveynden devralınan sayaçlar ve dosya adı bırakılır."""
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self._counters.clear()
+            self._histograms.clear()
+            self._last_flush = 0.0
+            self._file_name = f'{FILE_PREFIX}{pid}-{int(time.time() * 1000)}.json'
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._claim()
+            self._counters[key] = self._counters.get(key, 0) + value
+        self._maybe_flush()
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._claim()
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [[0] * len(buckets), 0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+        self._maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            self._claim()
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(labels), list(s[0]), s[1], s[2]]
+                               for (name, labels), s in self._histograms.items()],
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # --- süreçler arası paylaşım ---
+
+    def path(self):
+        directory = metrics_dir()
+        if not directory:
+            return None
+        with self._lock:
+            self._claim()
+            return Path(directory) / self._file_name
+
+    def _maybe_flush(self):
+        if metrics_dir() and time.monotonic() - self._last_flush >= getattr(settings, 'LEDGER_METRICS_FLUSH_INTERVAL', 5):
+            self.flush()
+
+    def flush(self):
+        path = self.path()
+        if path is None:
+            return
+        self._last_flush = time.monotonic()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp, path)
+
+
+def metrics_dir():
+    return getattr(settings, 'LEDGER_METRICS_DIR', '')
+
+
+def enabled():
+    return getattr(settings, 'LEDGER_METRICS', True)
+
+
+registry = Registry()
+atexit.register(lambda: registry.flush() if enabled() else None)
+
+
+def inc(name, value=1, **labels):
+    if enabled():
+        registry.inc(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    if enabled():
+        registry.observe(name, value, **labels)
+
+
+@contextmanager
+def timer(name, **labels):
+    """Bloğun süresini histograma yazar (hata olsa da)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def collect():
+    """Bu sürecin canlı verisi + dizindeki diğer süreçlerin son anlık görüntüleri, toplanmış."""
+    snapshots = [registry.snapshot()]
+    directory = metrics_dir()
+    own = registry.path()
+    if directory and os.path.isdir(directory):
+        for path in Path(directory).glob(f'{FILE_PREFIX}*.json'):
+            if path == own:
+                continue
+            try:
+                snapshots.append(json.loads(path.read_text(encoding='utf-8')))
+            except (OSError, ValueError):
+                continue  # yazılırken silinmiş ya da bozuk dosya: bu turda atlanır
+    counters, histograms = {}, {}
+    for snap in snapshots:
+        for name, labels, value in snap.get('counters', []):
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, buckets, total, count in snap.get('histograms', []):
+            if name not in METRICS or len(buckets) != len(METRICS[name][2]):
+                continue  # kovaları değişmiş eski dosya
+            key = (name, tuple(map(tuple, labels)))
+            series = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+            series[0] = [a + b for a, b in zip(series[0], buckets)]
+            series[1] += total
+            series[2] += count
+    return counters, histograms
+
+
+def _labels(pairs, extra=()):
+    items = [*pairs, *extra]
+    if not items:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in items)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """Prometheus metin biçimi (text/plain; version=0.0.4)."""
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        if kind == 'counter':
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+            continue
+        for (metric, labels), (counts, total, count) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, n in zip(buckets, counts):
+                cumulative += n
+                lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{name}_sum{_labels(labels)} {_number(total)}')
+            lines.append(f'{name}_count{_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """İstek sayısı (view, action, method, status) ve gecikme histogramı (view, action, method)."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not enabled():
+            return self.get_response(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else 'unmatched'
+        # DRF router view'ları HTTP metodu -> action eşlemesini fonksiyon üzerinde taşır
+        actions = getattr(match.func, 'actions', None) if match else None
+        action = (actions or {}).get(request.method.lower(), '')
+        if view in ('metrics', 'db-pool'):
+            return response
+        registry.inc('ledger_http_requests_total', view=view, action=action, method=request.method,
+                     status=str(response.status_code))
+        registry.observe('ledger_http_request_duration_seconds', elapsed, view=view, action=action,
+                         method=request.method)
+        return response
+
+# Çok süreçli kurulum: LEDGER_METRICS_DIR tüm worker'ların yazabildiği yerel bir dizin olmalı ve
+# dağıtımda (ör. gunicorn on_starting kancasında) boşaltılmalıdır; kapanan worker'ların dosyaları
+# sayaçlar geri gitmesin diye yeniden başlatmaya kadar toplanmaya devam eder.
+# Ayarlar: LEDGER_METRICS, LEDGER_METRICS_DIR, LEDGER_METRICS_FLUSH_INTERVAL, LEDGER_METRICS_TOKEN.
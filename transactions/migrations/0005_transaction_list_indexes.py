@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0004_alter_auditlog_id_alter_paymentmethod_id_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['owner', 'is_active', '-transaction_date', '-id'], name='tx_owner_active_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['is_active', '-transaction_date', '-id'], name='tx_active_date_idx'),
+        ),
+    ]
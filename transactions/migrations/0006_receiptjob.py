@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:08
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0005_transaction_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('THUMBNAIL', 'Thumbnail')], max_length=20)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('source_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5)),
+                ('run_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'run_after'], name='receiptjob_due_idx')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'content_hash'), name='receiptjob_kind_hash_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0006_receiptjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptBlob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('content_hash', models.CharField(max_length=64, unique=True)),
+                ('file_name', models.CharField(max_length=255)),
+                ('thumbnail_name', models.CharField(blank=True, max_length=255)),
+                ('size', models.PositiveIntegerField(default=0)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='receipt_blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='transactions', to='transactions.receiptblob'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# Django'nun PostgreSQL icontains ifadesi: UPPER("col"::text) LIKE UPPER('%terim%').
+# İndeks ifadesi bununla aynı olmalı ki planlayıcı trigram GIN indeksini kullanabilsin.
+INDEXES = (
+    ('tx_description_trgm_idx', 'transactions_transaction', 'description'),
+    ('subcategory_name_trgm_idx', 'transactions_subcategory', 'name'),
+)
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, table, column in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+            f'ON {table} USING gin ((UPPER({column}::text)) gin_trgm_ops)')
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+    # CONCURRENTLY transaction içinde çalışmaz; büyük tabloda yazmaları kilitlemeden indeks kurulur
+    atomic = False
+
+    dependencies = [
+        ('transactions', '0007_receiptblob'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate(apps, schema_editor):
+    """Mevcut aktif işlemlerden ilk rollup satırları (tek GROUP BY taraması)."""
+    Transaction = apps.get_model('transactions', 'Transaction')
+    DailyRollup = apps.get_model('transactions', 'DailyRollup')
+    db = schema_editor.connection.alias
+    rows = (Transaction.objects.using(db).filter(is_active=True).order_by()
+            .annotate(day=TruncDate('transaction_date'))
+            .values_list('owner_id', 'day', 'type', 'payment_method_id', 'subcategory_id')
+            .annotate(total=Sum('amount'), count=Count('id')))
+    batch = []
+    for owner_id, day, type_, pm_id, sc_id, total, count in rows.iterator(chunk_size=2000):
+        batch.append(DailyRollup(owner_id=owner_id, day=day, type=type_, payment_method_id=pm_id,
+                                 subcategory_id=sc_id, total=total, count=count))
+        if len(batch) >= 2000:
+            DailyRollup.objects.using(db).bulk_create(batch)
+            batch = []
+    DailyRollup.objects.using(db).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0008_transaction_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('type', models.CharField(choices=[('INCOME', 'Income'), ('EXPENSE', 'Expense')], max_length=7)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('count', models.IntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to=settings.AUTH_USER_MODEL)),
+                ('payment_method', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='transactions.paymentmethod')),
+                ('subcategory', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='transactions.subcategory')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day'], name='dailyrollup_day_idx')],
+                'constraints': [models.UniqueConstraint(fields=('owner', 'day', 'type', 'payment_method', 'subcategory'), name='dailyrollup_key_uniq')],
+            },
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
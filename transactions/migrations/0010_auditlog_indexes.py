@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0009_dailyrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['timestamp'], name='auditlog_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['object_type', 'object_id'], name='auditlog_object_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['actor', 'timestamp'], name='auditlog_actor_ts_idx'),
+        ),
+    ]
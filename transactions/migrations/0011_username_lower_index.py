@@ -0,0 +1,18 @@
+from django.db import migrations
+
+# EmailBackend tek sorguda LOWER(email) = %s OR LOWER(username) = %s arar; ikisi de indeksli olmalı
+SQL = "CREATE INDEX IF NOT EXISTS auth_user_username_lower_idx ON auth_user (LOWER(username));"
+REVERSE_SQL = "DROP INDEX IF EXISTS auth_user_username_lower_idx;"
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0010_auditlog_indexes'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SQL, REVERSE_SQL),
+    ]
+
+# Kullanıcı adları büyük/küçük harf duyarlı benzersizdir; bu yüzden indeks benzersiz değildir.
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.db import migrations
+
+# İsteğe bağlı: LEDGER_PARTITION_TRANSACTIONS=1 ise PostgreSQL'de transactions_transaction,
+# transaction_date üzerinden aylık/yıllık RANGE bölümlenmiş tabloya dönüştürülür (bkz. partitions.py).
+# Tablo dönüştürme süresince kilitlidir; büyük tabloda bakım penceresinde çalıştırın.
+
+
+def partition_transactions(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql' or not getattr(settings, 'LEDGER_PARTITION_TRANSACTIONS', False):
+        return
+    from transactions.partitions import INTERVALS, convert_to_partitioned
+    months = INTERVALS[getattr(settings, 'LEDGER_TRANSACTION_PARTITION_INTERVAL', 'month')]
+    convert_to_partitioned(apps.get_model('transactions', 'Transaction'), 'transaction_date',
+                           using=schema_editor.connection.alias, months=months)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transactions', '0011_username_lower_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_transactions, migrations.RunPython.noop),
+    ]
+
+# Geri alma tabloyu bölümlenmiş bırakır (şema Django açısından aynıdır). Ayar sonradan açılırsa
+# dönüştürme `manage.py ensure_partitions transaction --convert` ile yapılır.
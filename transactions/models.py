@@ -1,12 +1,14 @@
-from django.db import models
+from django.conf import settings
+from django.db import models, router, transaction as db_transaction
+from django.db.models import F
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
 from pathlib import Path
-import hashlib
 from django.utils import timezone
 from .managers import ActiveOnlyManager, AllObjectsManager
-from .utils import normalize_subcategory_name, validate_image_file, hashed_receipt_path, make_thumbnail, compute_content_hash, get_file_bytes
+from .utils import normalize_subcategory_name, ingest_receipt, make_thumbnail, thumbnail_rel_name, THUMBNAIL_WIDTH
+from .instrumentation import span
 
 
 User = get_user_model()
@@ -50,6 +52,80 @@ def _storage_move(storage, src: str, dst: str):
         pass
     return dst
 
+class ReceiptBlob(TimeStampedModel):
+    """
+    İçerik adresli fiş dosyası: aynı içerik (SHA-256) storage'da bir kez tutulur,
+    thumbnail'i de bir kez üretilir. ref_count, dosyaya bağlı işlem sayısıdır;
+    son referans kalıcı silindiğinde dosya ve thumbnail storage'dan kaldırılır.
+    """
+    content_hash = models.CharField(max_length=64, unique=True)
+    file_name = models.CharField(max_length=255)
+    thumbnail_name = models.CharField(max_length=255, blank=True)
+    size = models.PositiveIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.content_hash[:12]} x{self.ref_count}"
+
+    @staticmethod
+    def content_path(content_hash, ext):
+        return f"receipts/{content_hash[:2]}/{content_hash}{ext}"
+
+    @staticmethod
+    def _storage():
+        return Transaction._meta.get_field('receipt_file').storage
+
+    @classmethod
+    def acquire(cls, ingest):
+        """
+        İçerik için blob'u bulur ya da oluşturur ve referansı bir artırır.
+        Dosya yalnız storage'da yoksa yazılır (tekrarlanan fişler yeniden yazılmaz).
+        """
+        storage = cls._storage()
+        with db_transaction.atomic():
+            blob, _ = cls.objects.select_for_update().get_or_create(
+                content_hash=ingest.sha256,
+                defaults={'file_name': cls.content_path(ingest.sha256, ingest.ext), 'size': ingest.size},
+            )
+            if not storage.exists(blob.file_name):
+                storage.save(blob.file_name, ingest.content)
+            cls.objects.filter(pk=blob.pk).update(ref_count=F('ref_count') + 1)
+            blob.ref_count += 1
+        return blob
+
+    @classmethod
+    def release(cls, blob_id, count=1):
+        """
+        Referansı count kadar azaltır; sıfıra inerse blob satırı silinir ve
+        dosyalar commit sonrası storage'dan kaldırılır (rollback'te dosya kaybolmaz).
+        """
+        if not blob_id or count <= 0:
+            return
+        with db_transaction.atomic():
+            blob = cls.objects.select_for_update().filter(pk=blob_id).first()
+            if blob is None:
+                return
+            blob.ref_count = max(blob.ref_count - count, 0)
+            if blob.ref_count:
+                cls.objects.filter(pk=blob.pk).update(ref_count=blob.ref_count)
+                return
+            names = [n for n in (blob.file_name, blob.thumbnail_name) if n]
+            blob.delete()
+
+        def _delete_files():
+            storage = cls._storage()
+            for name in names:
+                try:
+                    if storage.exists(name):
+                        storage.delete(name)
+                except Exception:
+                    pass
+        db_transaction.on_commit(_delete_files)
+
+# DailyRollup anahtarını/katkısını değiştiren alanlar
+ROLLUP_FIELD_NAMES = {'owner', 'transaction_date', 'type', 'payment_method', 'subcategory', 'amount', 'is_active'}
+
+
 class Transaction(TimeStampedModel):
     class Types(models.TextChoices):
         INCOME = 'INCOME', 'Income'
@@ -71,6 +147,8 @@ class Transaction(TimeStampedModel):
     receipt_file = models.FileField(upload_to='receipts/tmp/', blank=True, null=True)
     receipt_original_name = models.CharField(max_length=255, blank=True)
     receipt_thumbnail = models.ImageField(upload_to='receipts/thumbnails/', blank=True, null=True)
+    receipt_blob = models.ForeignKey(ReceiptBlob, null=True, blank=True, on_delete=models.PROTECT,
+                                     related_name='transactions')
 
     # Soft delete & audit
     is_active = models.BooleanField(default=True)
@@ -89,6 +167,12 @@ class Transaction(TimeStampedModel):
             ('can_export_transactions', 'Can export transactions'),
         )
         ordering = ['-transaction_date', '-id']
+        indexes = [
+            # Sahip bazlı liste (User rolü) ve keyset sayfalama
+            models.Index(fields=['owner', 'is_active', '-transaction_date', '-id'], name='tx_owner_active_date_idx'),
+            # Manager/Admin listesi (tüm kullanıcılar)
+            models.Index(fields=['is_active', '-transaction_date', '-id'], name='tx_active_date_idx'),
+        ]
 
     def _normalize_receipt_paths(self):
             """
@@ -135,19 +219,50 @@ class Transaction(TimeStampedModel):
             raise ValidationError({'amount': 'Amount must be positive.'})
         if self.transaction_date and self.transaction_date > timezone.now():
             raise ValidationError({'transaction_date': 'Future dates are not allowed.'})
-        if self.receipt_file:
+        # Yalnız yeni upload doğrulanır; storage'daki dosya zaten doğrulanmıştı
+        if self._has_new_upload():
             try:
-                validate_image_file(self.receipt_file)
+                ingest_receipt(self.receipt_file.file)
             except ValueError as e:
                 raise ValidationError({'receipt_file': str(e)})
 
-    
+    def _has_new_upload(self):
+        return bool(self.receipt_file and getattr(self.receipt_file, '_committed', True) is False)
+
+    def _stored_rollup_state(self, using=None):
+        """
+        Kaydın DB'deki rollup katkısı (yeni kayıt için None). Satır kilitlenerek okunur: yüklemedeki
+        değerler eşzamanlı bir yazımla eskimiş olabilir (ör. iki silme aynı katkıyı iki kez düşmesin).
+        Atomic blok içinde çağrılır.
+        """
+        if self._state.adding or self.pk is None:
+            return None
+        from .rollups import STATE_FIELDS, state_from_row
+        row = (Transaction.all_objects.using(using or self._state.db or 'default').select_for_update()
+               .filter(pk=self.pk).values_list(*STATE_FIELDS).first())
+        return state_from_row(row) if row else None
+
+    def _save_with_rollup(self, *args, **kwargs):
+        """Model.save + DailyRollup farkı aynı DB transaction'ında."""
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not ROLLUP_FIELD_NAMES & set(update_fields):
+            return super().save(*args, **kwargs)
+        from . import rollups
+        using = kwargs.get('using') or router.db_for_write(Transaction, instance=self)
+        with db_transaction.atomic(using=using):
+            old = self._stored_rollup_state(using)
+            super().save(*args, **kwargs)
+            new = rollups.state_of(self)
+            rollups.apply(rollups.Deltas().change(old, new), using=using)
+
     def save(self, *args, **kwargs):
         """
-        - Yeni upload'ta: önce validasyon, sonra dosyayı final path'e (receipts/YYYY/MM/<hash>.<ext>)
-        DOĞRUDAN storage.save ile yaz; upload_to'yu bypass et. Ardından .name ve _committed ayarla.
+        - Yeni upload'ta: ingest_receipt sonucu (hash, doğrulama, thumbnail) kullanılır; upload
+        serializer'da zaten işlendiyse tekrar okunmaz/decode edilmez. Dosya ReceiptBlob üzerinden
+        içerik adresli yola (receipts/<h2>/<hash>.<ext>) yalnız bir kez yazılır; upload_to bypass edilir.
         - Güncellemelerde: dosyaya dokunma; varsa yol normalizasyonu (_normalize_receipt_paths) yap.
-        - Thumbnail: yalnız dosya gerçekten varsa ve henüz yoksa oluştur (receipts/thumbnails/YYYY/MM/<base>.webp).
+        - Thumbnail: yalnız dosya gerçekten varsa ve henüz yoksa oluştur (receipts/thumbnails/<h2>/<hash>.webp).
+        LEDGER_ASYNC_THUMBNAILS açıksa commit sonrası ReceiptJob olarak kuyruğa alınır (receipt_worker işler).
         """
         
         has_file = bool(self.receipt_file)
@@ -157,59 +272,87 @@ class Transaction(TimeStampedModel):
             self.receipt_original_name = Path(self.receipt_file.name or "").name
 
         # Yeni upload? (henüz storage'a yazılmamış)
-        is_new_upload = bool(has_file and getattr(self.receipt_file, '_committed', True) is False)
+        is_new_upload = self._has_new_upload()
+        released_blob_id = None
 
-        # Önce validasyon (utils.get_file_bytes güvenli okur)
+        # Önce validasyon (yeni upload'ta ingest_receipt; sonuç upload nesnesinde saklanır)
         self.clean()
+        with span('receipt'):
+            ingest = ingest_receipt(self.receipt_file.file) if is_new_upload else None
 
-        # Dosya işlemleri
-        if has_file:
-            storage = self.receipt_file.storage
-            current_name = (self.receipt_file.name or '').replace('\\', '/')
-
-            if is_new_upload:
-                # İçeriği oku ve hashle
-                data = get_file_bytes(self.receipt_file)
-                ext = Path(current_name).suffix.lower() or '.bin'
-                file_hash = hashlib.sha256(data).hexdigest()
-                final_path = f"receipts/{timezone.now():%Y/%m}/{file_hash}{ext}"
-
-                # Final path'e DOĞRUDAN yaz (upload_to bypass)
-                if not storage.exists(final_path):
-                    storage.save(final_path, ContentFile(data))
-
-                # (Varsa) tmp dosyasını temizle
-                try:
-                    if current_name and 'tmp/' in current_name and storage.exists(current_name):
-                        storage.delete(current_name)
-                except Exception:
-                    pass
-
-                # Alanları güncelle — tekrar yazmayı engelle
-                self.receipt_file.name = final_path
-                self.receipt_file._committed = True
-
-            else:
-                # Yeni upload değil -> sadece yol normalizasyonu (varsa)
-                if hasattr(self, '_normalize_receipt_paths'):
-                    self._normalize_receipt_paths()
-
-        # DB'ye kaydet
-        super().save(*args, **kwargs)
+        try:
+            # Dosya işlemleri
+            if has_file:
+                storage = self.receipt_file.storage
+                current_name = (self.receipt_file.name or '').replace('\\', '/')
+
+                if is_new_upload:
+                    # İçerik adresli blob: aynı içerik bir kez yazılır, referans sayısı artar
+                    released_blob_id = self.receipt_blob_id
+                    with span('receipt'):
+                        blob = ReceiptBlob.acquire(ingest)
+                    final_path = blob.file_name
+                    self.receipt_blob = blob
+                    # Eski fişin thumbnail'i bırakılan blob'la silinir; yeni blob'unki yoksa aşağıda üretilir
+                    self.receipt_thumbnail.name = blob.thumbnail_name
+
+                    # (Varsa) tmp dosyasını temizle
+                    try:
+                        if current_name and 'tmp/' in current_name and storage.exists(current_name):
+                            storage.delete(current_name)
+                    except Exception:
+                        pass
 
-        # Thumbnail (yoksa üret)
-        if has_file and not self.receipt_thumbnail:
-            storage = self.receipt_file.storage
-            if storage.exists(self.receipt_file.name):
-                base = Path(self.receipt_file.name).stem
-                # ImageField(upload_to='receipts/thumbnails/') → sadece alt yolu ver
-                thumb_rel = f"{timezone.now():%Y/%m}/{base}.webp"
-                thumb_content = make_thumbnail(self.receipt_file, width=320)
-                self.receipt_thumbnail.save(thumb_rel, thumb_content, save=False)
-                super().save(update_fields=['receipt_thumbnail'])
+                    # Alanları güncelle — tekrar yazmayı engelle
+                    self.receipt_file.name = final_path
+                    self.receipt_file._committed = True
+
+                else:
+                    # Yeni upload değil -> sadece yol normalizasyonu (varsa)
+                    if hasattr(self, '_normalize_receipt_paths'):
+                        self._normalize_receipt_paths()
+
+            # DB'ye kaydet (rollup farkıyla birlikte)
+            self._save_with_rollup(*args, **kwargs)
+
+            # Fiş değiştiyse eski blob'un referansını bırak
+            if is_new_upload and released_blob_id and released_blob_id != self.receipt_blob_id:
+                ReceiptBlob.release(released_blob_id)
+
+            # Thumbnail (yoksa üret): async modda commit sonrası kuyruğa, aksi halde satır içi
+            if has_file and not self.receipt_thumbnail:
+                if settings.LEDGER_ASYNC_THUMBNAILS:
+                    if is_new_upload:
+                        from .jobs import enqueue_thumbnail
+                        enqueue_thumbnail(self.receipt_file.name)
+                else:
+                    storage = self.receipt_file.storage
+                    if storage.exists(self.receipt_file.name):
+                        # ImageField(upload_to='receipts/thumbnails/') → sadece alt yolu ver
+                        thumb_rel = thumbnail_rel_name(self.receipt_file.name)
+                        # Yeni upload'ta thumbnail ingest sırasında aynı decode'dan üretildi
+                        with span('receipt'):
+                            thumb_content = (ingest.thumbnail if ingest and ingest.thumbnail
+                                             else make_thumbnail(self.receipt_file, width=THUMBNAIL_WIDTH))
+                            self.receipt_thumbnail.save(thumb_rel, thumb_content, save=False)
+                        super().save(update_fields=['receipt_thumbnail'])
+                        if self.receipt_blob_id:
+                            ReceiptBlob.objects.filter(pk=self.receipt_blob_id).update(
+                                thumbnail_name=self.receipt_thumbnail.name)
+        finally:
+            # Geçici (spooled) upload kopyası hata olsa da bırakılır
+            if ingest:
+                ingest.close()
 
 
     def delete(self, using=None, keep_parents=False, by=None, hard=False):
+        if hard and self.receipt_blob_id:
+            # İçerik adresli fiş: dosyalar yalnız son referans gidince silinir
+            blob_id = self.receipt_blob_id
+            with db_transaction.atomic(using=using):
+                self._hard_delete_row(using, keep_parents)
+                ReceiptBlob.release(blob_id)
+            return
         if hard:
             # isimleri normalize al
             rf_name = self.receipt_file.name.replace('\\','/') if self.receipt_file else None
@@ -218,7 +361,8 @@ class Transaction(TimeStampedModel):
             th_storage = self.receipt_thumbnail.storage if self.receipt_thumbnail else None
 
             # önce DB kaydını kaldır
-            super().delete(using=using, keep_parents=keep_parents)
+            with db_transaction.atomic(using=using):
+                self._hard_delete_row(using, keep_parents)
 
             def _del(storage, path):
                 if storage and path:
@@ -255,6 +399,12 @@ class Transaction(TimeStampedModel):
 
 
 
+    def _hard_delete_row(self, using, keep_parents):
+        from . import rollups
+        old = self._stored_rollup_state(using)
+        super().delete(using=using, keep_parents=keep_parents)
+        rollups.apply(rollups.Deltas().change(old, None), using=using)
+
     def restore(self, by=None):
         self.is_active = True
         self.deleted_at = None
@@ -264,6 +414,73 @@ class Transaction(TimeStampedModel):
     def __str__(self):
         return f"{self.transaction_date:%Y-%m-%d %H:%M} | {self.type} | {self.amount} | {self.owner}"
 
+class DailyRollup(models.Model):
+    """
+    (owner, gün, tür, ödeme yöntemi, alt kategori) başına aktif işlemlerin toplamı ve adedi.
+    Transaction.save/delete/restore ve toplu yollar (queryset işlemleri, içe aktarma) tarafından
+    artımlı güncellenir (bkz. rollups.py); `manage.py rebuild_rollups` yeniden hesaplar/denetler.
+    Gün, TIME_ZONE'a göre yerel tarihtir.
+    """
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    type = models.CharField(max_length=7, choices=Transaction.Types.choices)
+    payment_method = models.ForeignKey(PaymentMethod, on_delete=models.CASCADE, related_name='+')
+    subcategory = models.ForeignKey(Subcategory, on_delete=models.CASCADE, related_name='+')
+    total = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'day', 'type', 'payment_method', 'subcategory'],
+                                    name='dailyrollup_key_uniq'),
+        ]
+        indexes = [
+            # Manager raporları: tüm kullanıcılar, tarih aralığı
+            models.Index(fields=['day'], name='dailyrollup_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.owner_id} {self.type} {self.total} ({self.count})"
+
+
+class ReceiptJob(models.Model):
+    """
+    Arka plan işi (ör. thumbnail üretimi). (kind, content_hash) tekildir: aynı içerik
+    için iş bir kez tutulur ve sonuç tüm ilgili işlemlere bağlanır (idempotent).
+    Kayıtlar transaction.on_commit ile eklenir; receipt_worker komutu işler.
+    """
+    class Kinds(models.TextChoices):
+        THUMBNAIL = 'THUMBNAIL', 'Thumbnail'
+
+    class Statuses(models.TextChoices):
+        PENDING = 'PENDING', 'Pending'
+        RUNNING = 'RUNNING', 'Running'
+        DONE = 'DONE', 'Done'
+        FAILED = 'FAILED', 'Failed'
+
+    kind = models.CharField(max_length=20, choices=Kinds.choices)
+    content_hash = models.CharField(max_length=64)
+    source_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=10, choices=Statuses.choices, default=Statuses.PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'content_hash'], name='receiptjob_kind_hash_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='receiptjob_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.content_hash[:12]} {self.status}"
+
 class AuditLog(models.Model):
     class Actions(models.TextChoices):
         LOGIN = 'LOGIN', 'Login'
@@ -281,14 +498,30 @@ class AuditLog(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
     metadata = models.JSONField(default=dict, blank=True)
 
+    class Meta:
+        indexes = [
+            # Admin tarih filtresi/sıralaması ve archive_auditlog'un saklama süresi taraması
+            models.Index(fields=['timestamp'], name='auditlog_ts_idx'),
+            # Bir nesnenin geçmişi
+            models.Index(fields=['object_type', 'object_id'], name='auditlog_object_idx'),
+            # Bir kullanıcının hareketleri (zaman sıralı)
+            models.Index(fields=['actor', 'timestamp'], name='auditlog_actor_ts_idx'),
+        ]
+
     def __str__(self):
         return f"{self.timestamp:%Y-%m-%d %H:%M:%S} {self.action} {self.object_type}#{self.object_id}"
 
+    @classmethod
+    def record_bulk(cls, actor, action, object_ids, object_type='Transaction', metadata=None):
+        """Toplu işlemler için nesne başına bir kayıt; audit sink üzerinden tek bulk_create ile yazılır."""
+        from . import audit
+        audit.record_many(audit.entry(actor, action, object_type, pk, metadata) for pk in object_ids)
+
 # Bu dosya için ek açıklamalar:
 # - Transaction modeli, finansal işlemleri temsil eder ve soft delete, dosya yönetimi gibi özelliklere sahiptir.
 # - ActiveOnlyManager ve AllObjectsManager, aktif ve tüm nesneleri sorgulamak için özel yöneticilerdir.
 # - AuditLog modeli, kullanıcı eylemlerini izlemek için kullanılır.
-# - validate_image_file, hashed_receipt_path ve make_thumbnail gibi yardımcı işlevler utils.py dosyasında tanımlanmıştır.
+# - ingest_receipt ve make_thumbnail gibi yardımcı işlevler utils.py dosyasında tanımlanmıştır.
 # - created_by ve updated_by alanları, işlemi oluşturan ve güncelleyen kullanıcıları izlemek için opsiyoneldir.
 # - Transaction modelindeki delete ve restore yöntemleri, yumuşak silme ve geri yükleme işlevselliğini sağlar.
 # 
\ No newline at end of file
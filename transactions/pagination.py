@@ -0,0 +1,98 @@
+import base64
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    (transaction_date, id) üzerinde keyset (cursor) sayfalama.
+    OFFSET kullanmaz; her sayfa bir önceki sayfanın son satırından devam eder,
+    bu yüzden sayfa ne kadar derin olursa olsun maliyet sabit kalır.
+    Sıralama her zaman -transaction_date, -id'dir (bileşik indeksle uyumlu).
+    Yalnız ileri yönde gezinir (sonsuz kaydırma için yeterli).
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = ('-transaction_date', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            last_date, last_id = position
+            # lte: indeks üzerinde aralık taramasını başlatır; OR kısmı eşit tarihleri id ile ayırır
+            queryset = queryset.filter(transaction_date__lte=last_date).filter(
+                Q(transaction_date__lt=last_date) | Q(transaction_date=last_date, id__lt=last_id)
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        self.next_position = (rows[-1].transaction_date, rows[-1].pk) if self.has_next else None
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(encoded.encode('ascii')).decode('ascii')
+            date_part, id_part = raw.rsplit('|', 1)
+            return datetime.fromisoformat(date_part), int(id_part)
+        except (TypeError, ValueError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, position):
+        last_date, last_id = position
+        raw = f"{last_date.isoformat()}|{last_id}"
+        return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+    def get_next_link(self):
+        if not self.next_position:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'previous': None, 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def wants_keyset(request):
+    """?pagination=cursor veya ?cursor=... ile keyset moduna geçilir."""
+    params = request.query_params
+    return params.get('pagination') == 'cursor' or KeysetPagination.cursor_query_param in params
+
+# Varsayılan sayfalama global PageNumberPagination olarak kalır (geriye dönük uyumluluk).
+# Derin sayfalarda OFFSET taraması yapmamak için istemci keyset modunu istek bazında seçebilir.
@@ -0,0 +1,303 @@
+from datetime import date
+
+from django.db import IntegrityError, connections, transaction as db_transaction
+from django.utils import timezone
+
+from .models import AuditLog, Transaction
+
+# Bölümlenebilir tablolar: ad -> (model, bölüm kolonu)
+PARTITIONED_MODELS = {
+    'auditlog': (AuditLog, 'timestamp'),
+    'transaction': (Transaction, 'transaction_date'),
+}
+# Bölüm aralığı (ay sayısı); bölümlenmiş tabloda mevcut bölümlerden okunur (bkz. interval_months)
+INTERVALS = {'month': 1, 'year': 12}
+
+
+class PartitioningNotSupported(Exception):
+    pass
+
+
+def _connection(using):
+    conn = connections[using]
+    if conn.vendor != 'postgresql':
+        raise PartitioningNotSupported('Partitioning is only available on PostgreSQL.')
+    return conn
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def period_start(day, months=1):
+    return date(day.year, 1, 1) if months == 12 else date(day.year, day.month, 1)
+
+
+def partition_name(table, month_start, months=1):
+    return f'{table}_p{month_start:%Y}' if months == 12 else f'{table}_p{month_start:%Y%m}'
+
+
+def is_partitioned(table, using='default'):
+    conn = connections[using]
+    if conn.vendor != 'postgresql':
+        return False
+    with conn.cursor() as cur:
+        cur.execute("SELECT relkind FROM pg_class WHERE relname = %s AND relkind IN ('r', 'p')", [table])
+        row = cur.fetchone()
+    return bool(row and row[0] == 'p')
+
+
+def list_partitions(table, using='default'):
+    """[(bölüm adı, alt sınır, üst sınır)] — varsayılan (DEFAULT) bölüm için sınırlar None."""
+    conn = _connection(using)
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = %s ORDER BY c.relname
+        """, [table])
+        rows = cur.fetchall()
+    result = []
+    for name, bound in rows:
+        if bound == 'DEFAULT':
+            result.append((name, None, None))
+            continue
+        # FOR VALUES FROM ('2024-01-01 00:00:00+00') TO ('2024-02-01 00:00:00+00')
+        parts = bound.split("'")
+        result.append((name, date.fromisoformat(parts[1][:10]), date.fromisoformat(parts[3][:10])))
+    return result
+
+
+def interval_months(table, using='default'):
+    """Mevcut son bölümün aralığı (1: aylık, 12: yıllık); bölüm yoksa aylık."""
+    ranges = [(lower, upper) for _, lower, upper in list_partitions(table, using) if lower is not None]
+    if not ranges:
+        return 1
+    lower, upper = max(ranges)
+    return (upper.year - lower.year) * 12 + upper.month - lower.month
+
+
+def partition_column(table):
+    for model, column in PARTITIONED_MODELS.values():
+        if model._meta.db_table == table:
+            return column
+    raise PartitioningNotSupported(f'{table} is not a partitionable table.')
+
+
+def ensure_monthly_partitions(table, start, end, using='default', months=1):
+    """
+    [start, end) aralığı için months aylık (1 ya da 12) bölümler oluşturur; adı ya da aralığı mevcut
+    bir bölümle çakışanları atlar. Oluşturulan adları döndürür.
+    DEFAULT bölümde yeni bölümün aralığına düşen ("sıkışmış") satırlar varsa PostgreSQL bölümü
+    oluşturmaz. Bu aralıklar önce kilitsiz bir SELECT ile bulunur; diğer bölümler normal açılır.
+    Sıkışmış aralıklar için tek transaction'da bir kez DEFAULT ayrılır, bölümler oluşturulur, satırlar
+    taşınır ve DEFAULT geri bağlanır. CONCURRENTLY olmadan DETACH PARTITION üst tabloda ACCESS
+    EXCLUSIVE kilit alır: commit'e kadar bölümlenmiş tablonun tamamında okuma ve yazımlar bekler.
+    Bu süre taşınan satır sayısıyla uzar.
+    """
+    conn = _connection(using)
+    q = conn.ops.quote_name
+    partitions = list_partitions(table, using)
+    existing = {name for name, _, _ in partitions}
+    ranges = [(lower, upper) for _, lower, upper in partitions if lower is not None]
+    default = next((name for name, lower, _ in partitions if lower is None), None)
+    column = q(partition_column(table)) if default else None
+
+    missing = []
+    month = period_start(start, months)
+    while month < end:
+        nxt = add_months(month, months)
+        name = partition_name(table, month, months)
+        if name not in existing and not any(lower < nxt and month < upper for lower, upper in ranges):
+            missing.append((name, month.isoformat(), nxt.isoformat()))
+        month = nxt
+
+    stranded = []
+    with conn.cursor() as cur:
+        if default:
+            for period in list(missing):
+                cur.execute(f'SELECT EXISTS (SELECT 1 FROM {q(default)} WHERE {column} >= %s AND {column} < %s)',
+                            period[1:])
+                if cur.fetchone()[0]:
+                    missing.remove(period)
+                    stranded.append(period)
+
+        def create(period):
+            cur.execute(f'CREATE TABLE IF NOT EXISTS {q(period[0])} PARTITION OF {q(table)} '
+                        f'FOR VALUES FROM (%s) TO (%s)', period[1:])
+
+        created = []
+        for period in missing:
+            try:
+                with db_transaction.atomic(using=using):
+                    create(period)
+                created.append(period[0])
+            except IntegrityError:
+                # Kontrolden sonra DEFAULT'a bu aralıkta satır yazıldı
+                stranded.append(period)
+
+        if stranded:
+            where = ' OR '.join(f'({column} >= %s AND {column} < %s)' for _ in stranded)
+            params = [bound for period in stranded for bound in period[1:]]
+            with db_transaction.atomic(using=using):
+                cur.execute(f'ALTER TABLE {q(table)} DETACH PARTITION {q(default)}')
+                for period in stranded:
+                    create(period)
+                # DEFAULT ayrıyken üst tabloya eklenen satırlar yalnız yeni bölümlere gidebilir
+                cur.execute(f'INSERT INTO {q(table)} OVERRIDING SYSTEM VALUE SELECT * FROM {q(default)} '
+                            f'WHERE {where}', params)
+                cur.execute(f'DELETE FROM {q(default)} WHERE {where}', params)
+                cur.execute(f'ALTER TABLE {q(table)} ATTACH PARTITION {q(default)} DEFAULT')
+            created += [period[0] for period in stranded]
+    return sorted(created)
+
+
+def convert_to_partitioned(model, column, months_ahead=3, using='default', keep_legacy=False, months=1):
+    """
+    Mevcut tabloyu aylık (months=12: yıllık) bölümlenmiş tabloya dönüştürür (tek transaction; tablo
+    süre boyunca kilitlidir). Eski tablo <tablo>_legacy adıyla kopyalanır ve (keep_legacy değilse)
+    silinir. Tablo boyutuna göre uzun sürebilir; önce eski satırları arşivlemek süreyi kısaltır.
+    """
+    conn = _connection(using)
+    table = model._meta.db_table
+    if is_partitioned(table, using):
+        return False
+    legacy = f'{table}_legacy'
+    q = conn.ops.quote_name
+    with db_transaction.atomic(using=using), conn.cursor() as cur:
+        cur.execute(f'LOCK TABLE {q(table)} IN ACCESS EXCLUSIVE MODE')
+        # Bölümlenmiş tabloya (id) üzerinden FK verilemez; bu tabloya başvuran FK varsa dönüştürülmez
+        cur.execute("""
+            SELECT c.conname FROM pg_constraint c JOIN pg_class t ON t.oid = c.confrelid
+            WHERE t.relname = %s AND c.contype = 'f'
+        """, [table])
+        referencing = [row[0] for row in cur.fetchall()]
+        if referencing:
+            raise PartitioningNotSupported(f"{table} is referenced by foreign keys: {', '.join(referencing)}")
+        cur.execute("""
+            SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x
+            JOIN pg_class i ON i.oid = x.indexrelid JOIN pg_class t ON t.oid = x.indrelid
+            WHERE t.relname = %s AND NOT x.indisprimary
+        """, [table])
+        indexes = cur.fetchall()
+        cur.execute("""
+            SELECT c.conname, pg_get_constraintdef(c.oid) FROM pg_constraint c JOIN pg_class t ON t.oid = c.conrelid
+            WHERE t.relname = %s AND c.contype = 'f'
+        """, [table])
+        foreign_keys = cur.fetchall()
+        cur.execute(f'SELECT MIN({q(column)}), MAX({q(column)}) FROM {q(table)}')
+        lo, hi = cur.fetchone()
+
+        cur.execute(f'ALTER TABLE {q(table)} RENAME TO {q(legacy)}')
+        for name, _ in indexes:
+            cur.execute(f'DROP INDEX {q(name)}')
+        for name, _ in foreign_keys:
+            cur.execute(f'ALTER TABLE {q(legacy)} DROP CONSTRAINT {q(name)}')
+        cur.execute(f'ALTER TABLE {q(legacy)} RENAME CONSTRAINT {q(table + "_pkey")} TO {q(legacy + "_pkey")}')
+
+        cur.execute(f'CREATE TABLE {q(table)} (LIKE {q(legacy)} INCLUDING DEFAULTS INCLUDING IDENTITY '
+                    f'INCLUDING CONSTRAINTS) '
+                    f'PARTITION BY RANGE ({q(column)})')
+        cur.execute(f'ALTER TABLE {q(table)} ADD PRIMARY KEY (id, {q(column)})')
+        cur.execute(f'CREATE TABLE {q(table + "_default")} PARTITION OF {q(table)} DEFAULT')
+        today = date.today()
+        first = lo.date() if lo else today
+        last = max(hi.date() if hi else today, today)
+        ensure_monthly_partitions(table, first, add_months(last, months_ahead + 1), using, months=months)
+
+        for name, definition in indexes:
+            # Tanımlar yeniden adlandırmadan önce okundu (ON <tablo>); PostgreSQL her bölümde oluşturur
+            cur.execute(definition)
+        for name, definition in foreign_keys:
+            cur.execute(f'ALTER TABLE {q(table)} ADD CONSTRAINT {q(name)} {definition}')
+
+        cur.execute(f'INSERT INTO {q(table)} OVERRIDING SYSTEM VALUE SELECT * FROM {q(legacy)}')
+        cur.execute(f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE((SELECT MAX(id) FROM {q(table)}), 1))",
+                    [table])
+        if not keep_legacy:
+            cur.execute(f'DROP TABLE {q(legacy)}')
+    return True
+
+
+def partitions_before(table, cutoff, using='default'):
+    """Üst sınırı cutoff'tan küçük/eşit (tamamen eski) bölümler: [(ad, alt sınır, üst sınır)]."""
+    return [(name, lower, upper) for name, lower, upper in list_partitions(table, using)
+            if upper is not None and upper <= cutoff]
+
+
+def drop_partitions_before(table, cutoff, using='default', detach=False):
+    """
+    Üst sınırı cutoff'tan küçük/eşit (tamamen eski) bölümleri DROP eder; detach=True ise DETACH edip
+    arşiv için ayrı tablo olarak bırakır. Tabloya özgü temizlik (BEFORE_REMOVE) aynı transaction'da
+    çalışır. Kaldırılan bölüm adlarını döndürür.
+    """
+    conn = _connection(using)
+    q = conn.ops.quote_name
+    removed = []
+    with db_transaction.atomic(using=using), conn.cursor() as cur:
+        for name, lower, upper in partitions_before(table, cutoff, using):
+            if table in BEFORE_REMOVE:
+                BEFORE_REMOVE[table](cur, q(name), using, detach)
+            if detach:
+                cur.execute(f'ALTER TABLE {q(table)} DETACH PARTITION {q(name)}')
+            else:
+                cur.execute(f'DROP TABLE {q(name)}')
+            removed.append(name)
+    return removed
+
+
+def _release_transactions(cur, partition, using, detach):
+    """
+    Bölümdeki işlemler defterden çıkar: DailyRollup katkıları (yerel gün bazında) düşülür. DROP'ta
+    fiş blob referansları da bırakılır; DETACH'ta arşiv tablosu fişlere başvurmaya devam ettiği için
+    blob'lar korunur. Eski (blob'suz) fiş dosyaları DROP commit'inden sonra silinir.
+    """
+    from . import rollups
+    from .managers import _delete_files
+    from .models import ReceiptBlob
+
+    cur.execute(
+        f'SELECT owner_id, (transaction_date AT TIME ZONE %s)::date, type, payment_method_id, subcategory_id, '
+        f'SUM(amount), COUNT(*) FROM {partition} WHERE is_active GROUP BY 1, 2, 3, 4, 5',
+        [timezone.get_current_timezone_name()])
+    deltas = rollups.Deltas()
+    for *key, amount, count in cur.fetchall():
+        deltas.items[tuple(key)] = [-amount, -count]
+    rollups.apply(deltas, using=using)
+    if detach:
+        return
+    cur.execute(f'SELECT receipt_blob_id, COUNT(*) FROM {partition} WHERE receipt_blob_id IS NOT NULL GROUP BY 1')
+    for blob_id, count in cur.fetchall():
+        ReceiptBlob.release(blob_id, count=count)
+    cur.execute(f"SELECT receipt_file, receipt_thumbnail FROM {partition} "
+                f"WHERE receipt_blob_id IS NULL AND (receipt_file <> '' OR receipt_thumbnail <> '')")
+    legacy = [name for row in cur.fetchall() for name in row if name]
+    if legacy:
+        storage = Transaction._meta.get_field('receipt_file').storage
+        db_transaction.on_commit(lambda: _delete_files(storage, legacy), using=using)
+
+
+# Bölüm kaldırılmadan önce çalışan, tabloya özgü tutarlılık adımları: tablo -> fn(cursor, bölüm, using, detach)
+BEFORE_REMOVE = {
+    Transaction._meta.db_table: _release_transactions,
+}
+
+# PostgreSQL aylık/yıllık RANGE bölümleme (partitioning). Opsiyoneldir ve Django migration durumunu
+# değiştirmez: tablo adı ve kolonlar aynı kalır, yalnız fiziksel tablo PARTITION BY RANGE (<kolon>) olur.
+# ORM ve yöneticiler (ActiveOnlyManager) değişmez; transaction_date aralığı içeren sorgular
+# (TransactionFilter date_from/date_to, keyset sayfalama) yalnız ilgili bölümleri tarar.
+# Bölümlenmiş tabloda birincil anahtar bölüm kolonunu içermek zorundadır: (id, <kolon>); id yine
+# identity ile benzersiz üretilir. Dönüştürme `manage.py ensure_partitions --convert` ile bakım
+# penceresinde yapılır; Transaction için LEDGER_PARTITION_TRANSACTIONS=1 ile migration 0012 da yapar.
+# Dönüştürmeden sonra eklenen migration'larda bu tablolarda CREATE INDEX CONCURRENTLY kullanılamaz.
+# - Dönüştürmeden sonra yeni aylar için bölümler `manage.py ensure_partitions` ile (cron, ayda bir)
+#   önceden açılır; eksik kalırsa satırlar DEFAULT bölüme düşer. O ayın bölümü sonradan açılırken
+#   bu satırlar yeni bölüme taşınır (bkz. ensure_monthly_partitions). Taşıma DEFAULT'u ayırdığı için
+#   commit'e kadar tablonun tamamında okuma/yazımlar bekler (ACCESS EXCLUSIVE); süre DEFAULT'taki
+#   satır sayısıyla uzar, bu yüzden cron aksatılmamalıdır.
+# - archive_auditlog bölümlenmiş tabloda tamamen saklama süresi dışındaki bölümleri arşivledikten
+#   sonra DELETE yerine DROP TABLE ile kaldırır.
+# - Transaction bölümleri `ensure_partitions transaction --drop-before/--detach-before YYYY-MM-DD` ile
+#   kaldırılır; DETACH edilen tablo pg_dump ile arşivlenip sonra elle DROP edilebilir. Geri bağlamak için:
+#   ALTER TABLE ... ATTACH PARTITION ... FOR VALUES FROM (...) TO (...); ardından rebuild_rollups.
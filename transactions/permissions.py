@@ -1,4 +1,5 @@
 from rest_framework.permissions import BasePermission
+from .roles import get_role
 
 class IsOwnerOrManager(BasePermission):
     """
@@ -6,9 +7,5 @@ class IsOwnerOrManager(BasePermission):
     Manager/Admin: tüm objeler
     """
     def has_object_permission(self, request, view, obj):
-        u = request.user
-        if u.is_superuser:
-            return True
-        if u.groups.filter(name__in=['Admin', 'Manager']).exists():
-            return True
-        return obj.owner_id == u.id
+        # Rol istek başına bir kez yüklenir; obje başına grup sorgusu yapılmaz
+        return get_role(request).can_access(obj)
@@ -0,0 +1,118 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction as db_transaction
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .routers import current_read_alias, sticky_seconds
+
+# Referans tabloları 'payment-methods' ve 'subcategories' adlarıyla sürümlenir (bkz. signals.py)
+CACHE_PREFIX = 'ledger:refdata'
+
+
+def _cache():
+    return caches[getattr(settings, 'LEDGER_REFDATA_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'LEDGER_REFDATA_CACHE_TIMEOUT', 3600)
+
+
+def _version_key(name):
+    return f'{CACHE_PREFIX}:{name}:version'
+
+
+def get_version(name):
+    # Kayıp sayaç (cull/yeniden başlatma) tekrar etmeyen bir değerle başlar; eski ETag/anahtarlar dirilmez
+    return _cache().get_or_set(_version_key(name), time.time_ns, None)
+
+
+def _bump(name):
+    cache = _cache()
+    try:
+        cache.incr(_version_key(name))
+    except ValueError:
+        cache.set(_version_key(name), time.time_ns(), None)
+
+
+def bump_version(name):
+    """
+    Yazımdan sonra çağrılır. Sürüm hemen (aynı transaction'daki okumalar eski veriyi görmesin) ve
+    commit'ten sonra bir kez daha artırılır: commit öncesi başka bir istek eski veriyi yeni
+    sürümle önbelleğe almış olabilir.
+    """
+    _bump(name)
+    db_transaction.on_commit(lambda: _bump(name))
+
+
+class VersionedCacheMixin:
+    """
+    list/retrieve yanıtlarını (sürüm, tam URL) anahtarıyla önbelleğe alır ve ETag üretir.
+    If-None-Match tutarsa 304 döner; bu durumda veri DB'den de önbellekten de okunmaz.
+    Veri kullanıcıya göre değişmemelidir (referans tabloları).
+    """
+    refdata_name = None
+
+    def _refdata_response(self, request, produce):
+        version = get_version(self.refdata_name)
+        url_hash = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()[:16]
+        etag = f'"{self.refdata_name}-v{version}-{url_hash}"'
+        if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            key = f'{CACHE_PREFIX}:{self.refdata_name}:v{version}:{url_hash}'
+            cache = _cache()
+            data = cache.get(key)
+            if data is None:
+                response = produce()
+                if response.status_code != 200:
+                    return response
+                # Replikadan okunan veri yeni sürümle eski kalmış olabilir: gecikme penceresi kadar tutulur
+                timeout = min(_timeout(), sticky_seconds()) if current_read_alias() else _timeout()
+                cache.set(key, response.data, timeout)
+            else:
+                response = Response(data)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ('Cookie', 'Authorization'))
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._refdata_response(request, lambda: super(VersionedCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._refdata_response(request, lambda: super(VersionedCacheMixin, self).retrieve(request, *args, **kwargs))
+
+
+def inline_refdata():
+    """
+    Sayfalara gömülecek referans verisi: {'payment_methods': [...], 'subcategories': [...]}.
+    API ile aynı serializer'lar; sürüm anahtarıyla önbellekten. LEDGER_INLINE_REFDATA kapalıysa None.
+    """
+    if not getattr(settings, 'LEDGER_INLINE_REFDATA', True):
+        return None
+    from .models import PaymentMethod, Subcategory
+    from .serializers import PaymentMethodSerializer, SubcategorySerializer
+
+    cache = _cache()
+    key = f"{CACHE_PREFIX}:inline:v{get_version('payment-methods')}.{get_version('subcategories')}"
+    data = cache.get(key)
+    if data is None:
+        data = {
+            'payment_methods': PaymentMethodSerializer(
+                PaymentMethod.objects.filter(is_active=True).order_by('name'), many=True).data,
+            'subcategories': SubcategorySerializer(
+                Subcategory.objects.filter(is_active=True).order_by('name'), many=True).data,
+        }
+        cache.set(key, data, _timeout())
+    return data
+
+# Sürüm sayacı paylaşılan cache'te (LEDGER_REFDATA_CACHE_ALIAS) tutulmalıdır; süreç içi
+# bellek (locmem) kullanılırsa bir worker'daki yazım diğer worker'ların sürümünü artırmaz.
+# QuerySet.update()/bulk_create sinyal üretmez; bu yollarla yazan kod bump_version çağırmalıdır
+# (ör. importers.TransactionImporter._resolve_missing_subcategories).
@@ -0,0 +1,206 @@
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import locks
+from django.core.files.storage import FileSystemStorage
+
+from .utils import render_rendition
+
+# İzin verilen genişlikler ve biçimler (rastgele boyut istekleriyle cache/CPU şişirilemesin)
+RENDITION_WIDTHS = (160, 320, 640, 1280)
+RENDITION_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+DEFAULT_WIDTH = 640
+DEFAULT_FORMAT = 'webp'
+# Sınır aşılınca en eski kullanılanlar bu orana inene kadar silinir (her yazımda tarama olmasın)
+EVICT_LOW_WATERMARK = 0.9
+LOCK_SUFFIX = '.lock'
+# Diğer worker'ların yazdıkları süreç içi sayaçta görünmez; toplam boyut bu aralıkla diskten yeniden okunur
+RESCAN_INTERVAL = 60
+EVICT_LOCK_NAME = '.evict' + LOCK_SUFFIX
+# Sunulmadan silinen rendition için görünümün deneme sayısı
+RENDITION_SERVE_ATTEMPTS = 3
+
+
+class RenditionCache:
+    """
+    Boyutu sınırlı disk önbelleği: <root>/<h2>/<hash>-w<genişlik>.<biçim>.
+    - LRU: okunan dosyanın mtime'ı güncellenir; temizlikte en eski mtime önce silinir.
+    - Anahtar başına kilit (thread kilidi + dosya kilidi): aynı rendition'a eşzamanlı istekler
+      orijinali bir kez decode eder, diğerleri üretilen dosyayı okur.
+    - Toplam boyut süreç içinde takip edilir ve RESCAN_INTERVAL'da bir diskten yeniden okunur
+      (diğer worker'ların yazdıkları dahil); sınır aşılınca dizin, süreçler arası kilit altında
+      taranıp temizlenir.
+    """
+
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._size = None
+        self._scanned_at = None
+        self._size_guard = threading.Lock()
+
+    def path_for(self, content_hash, width, fmt):
+        return self.root / content_hash[:2] / f'{content_hash}-w{width}.{fmt}'
+
+    @contextmanager
+    def _key_lock(self, path):
+        key = str(path)
+        with self._locks_guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                # Diğer süreçler için (gunicorn worker'ları) aynı anahtarda dosya kilidi
+                with open(key + LOCK_SUFFIX, 'ab') as lock_file:
+                    locks.lock(lock_file, locks.LOCK_EX)
+                    try:
+                        yield
+                    finally:
+                        locks.unlock(lock_file)
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if not entry[1]:
+                    self._locks.pop(key, None)
+
+    def get_or_create(self, content_hash, width, fmt, render):
+        """Rendition'ın yolunu döndürür; yoksa render() ile (anahtar kilidi altında) üretir."""
+        path = self.path_for(content_hash, width, fmt)
+        if self._touch(path):
+            return path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._key_lock(path):
+            if self._touch(path):  # kilidi beklerken başka istek üretti
+                return path
+            data = render()
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        self._account(len(data))
+        return path
+
+    def _touch(self, path):
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _entries(self):
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename.endswith((LOCK_SUFFIX, '.tmp')):
+                    continue
+                full = os.path.join(dirpath, filename)
+                try:
+                    st = os.stat(full)
+                except FileNotFoundError:
+                    continue
+                yield full, st.st_size, st.st_mtime
+
+    def _account(self, added):
+        with self._size_guard:
+            now = time.monotonic()
+            if self._size is None or now - self._scanned_at >= RESCAN_INTERVAL:
+                self._size, self._scanned_at = sum(size for _, size, _ in self._entries()), now
+            else:
+                self._size += added
+            if self._size <= self.max_bytes:
+                return
+            with open(self.root / EVICT_LOCK_NAME, 'ab') as lock_file:
+                locks.lock(lock_file, locks.LOCK_EX)
+                try:
+                    # Tarama kilit altında: başka worker az önce temizlediyse gerçek toplam görülür
+                    self._size, self._scanned_at = self._evict(), time.monotonic()
+                finally:
+                    locks.unlock(lock_file)
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_LOW_WATERMARK
+        for full, size, _ in entries:
+            if total <= target:
+                break
+            # Kilit dosyası silinmez: eski inode'u kilitli tutan süreç ile yeni dosyayı kilitleyen
+            # süreç aynı anahtarı birlikte üretirdi. Boş dosyalardır; boyut sınırına sayılmaz.
+            try:
+                os.remove(full)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return total
+
+    def storage_and_name(self, path):
+        """serve_file için (storage, ad); MEDIA_ROOT altındaysa X-Accel-Redirect yolu medya ile aynıdır."""
+        media_root = Path(settings.MEDIA_ROOT).resolve()
+        resolved = Path(path).resolve()
+        base = media_root if resolved.is_relative_to(media_root) else self.root.resolve()
+        return FileSystemStorage(location=base), resolved.relative_to(base).as_posix()
+
+
+_caches = {}
+_caches_guard = threading.Lock()
+
+
+def cache_root():
+    return getattr(settings, 'LEDGER_RENDITION_CACHE_DIR', '') or os.path.join(settings.MEDIA_ROOT, 'renditions')
+
+
+def get_cache():
+    root = cache_root()
+    max_bytes = getattr(settings, 'LEDGER_RENDITION_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+    with _caches_guard:
+        cache = _caches.get(root)
+        if cache is None or cache.max_bytes != max_bytes:
+            cache = _caches[root] = RenditionCache(root, max_bytes)
+        return cache
+
+
+class CachedFile:
+    """serve_file'ın beklediği FieldFile arayüzü (storage, name, size)."""
+
+    def __init__(self, storage, name):
+        self.storage, self.name = storage, name
+
+    @property
+    def size(self):
+        return self.storage.size(self.name)
+
+
+def receipt_key(name):
+    """Önbellek anahtarı: içerik adresli adlarda hash, eski adlandırmada adın hash'i."""
+    stem = Path(name).stem
+    if len(stem) == 64 and all(c in '0123456789abcdef' for c in stem):
+        return stem
+    return hashlib.sha256(name.encode()).hexdigest()
+
+
+def get_rendition(field_file, content_hash, width, fmt):
+    """
+    Fişin rendition'ını önbellekten (gerekirse üreterek) döndürür: CachedFile. Dosya başka
+    worker'ın temizliğiyle sunulmadan silinebilir; çağıran FileNotFoundError'da yeniden ister.
+    """
+    cache = get_cache()
+
+    def render():
+        with field_file.storage.open(field_file.name, 'rb') as fh:
+            return render_rendition(fh, width, RENDITION_FORMATS[fmt])
+
+    path = cache.get_or_create(content_hash, width, fmt, render)
+    return CachedFile(*cache.storage_and_name(path))
+
+# Rendition'lar orijinalden türetildiği için önbellek her an silinebilir (ilk istekte yeniden üretilir).
+# Görünüm dosya açılmadan silinirse (FileNotFoundError) RENDITION_SERVE_ATTEMPTS kez yeniden üretip sunar;
+# açılmış dosya silinse de (POSIX) akış sürer. Offload'da (accel/sendfile) bu pencere ön sunucudadır.
+# Anahtar kilit dosyaları (*.lock) temizlikte silinmez; gerekirse yalnız hiçbir worker çalışmıyorken silinebilir.
+# Ayarlar: LEDGER_RENDITION_CACHE_DIR (varsayılan MEDIA_ROOT/renditions), LEDGER_RENDITION_CACHE_MAX_BYTES.
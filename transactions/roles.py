@@ -0,0 +1,149 @@
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import caches
+from django.db.models import Q
+from django.utils.functional import SimpleLazyObject
+
+ADMIN = 'Admin'
+MANAGER = 'Manager'
+USER = 'User'
+
+CACHE_PREFIX = 'ledger:role'
+VERSION_KEY = f'{CACHE_PREFIX}:version'
+
+
+@dataclass(frozen=True)
+class LedgerRole:
+    """
+    Bir kullanıcının grup adları ve izin kodları (app_label.codename).
+    İstek başına bir kez yüklenir; tüm rol/izin kontrolleri buradan okunur.
+    """
+    user_id: int = None
+    is_authenticated: bool = False
+    is_superuser: bool = False
+    groups: frozenset = field(default_factory=frozenset)
+    perms: frozenset = field(default_factory=frozenset)
+
+    @property
+    def is_admin(self):
+        return self.is_superuser or ADMIN in self.groups
+
+    @property
+    def is_manager(self):
+        return MANAGER in self.groups
+
+    @property
+    def can_see_all(self):
+        """Admin/Manager tüm kullanıcıların işlemlerini görür."""
+        return self.is_admin or self.is_manager
+
+    @property
+    def name(self):
+        if self.is_admin:
+            return ADMIN
+        return MANAGER if self.is_manager else USER
+
+    def has_perm(self, perm):
+        return self.is_superuser or perm in self.perms
+
+    def can_access(self, obj):
+        return self.can_see_all or obj.owner_id == self.user_id
+
+
+ANONYMOUS = LedgerRole()
+
+
+def _load_role(user):
+    groups = frozenset(Group.objects.filter(user=user).values_list('name', flat=True))
+    if user.is_superuser:
+        perms = frozenset()  # superuser her izne sahip; has_perm kısa devre yapar
+    else:
+        perms = frozenset(
+            f'{app_label}.{codename}' for app_label, codename in
+            Permission.objects.filter(Q(group__user=user) | Q(user=user))
+                              .values_list('content_type__app_label', 'codename').distinct()
+        )
+    return LedgerRole(user_id=user.pk, is_authenticated=True, is_superuser=user.is_superuser,
+                      groups=groups, perms=perms)
+
+
+def _cache_timeout():
+    # 0 (varsayılan): yalnız istek bazında önbellek; >0: istekler arası önbellek (saniye)
+    return getattr(settings, 'LEDGER_ROLE_CACHE_TIMEOUT', 0)
+
+
+def _cache():
+    # Worker'lar arası paylaşılan depo: bir süreçteki geçersiz kılma tüm worker'lara yansır
+    return caches[getattr(settings, 'LEDGER_ROLE_CACHE_ALIAS', 'default')]
+
+
+def _cache_key(user_id):
+    # Kayıp sayaç (cull/yeniden başlatma) tekrar etmeyen bir değerle başlar; eski sürüm anahtarları dirilmez
+    version = _cache().get_or_set(VERSION_KEY, time.time_ns, None)
+    return f'{CACHE_PREFIX}:v{version}:{user_id}'
+
+
+def resolve_role(user):
+    """Kullanıcının rolünü döndürür; etkinse (LEDGER_ROLE_CACHE_TIMEOUT > 0) istekler arası önbelleği kullanır."""
+    if user is None or not user.is_authenticated or not user.is_active:
+        return ANONYMOUS
+    timeout = _cache_timeout()
+    if not timeout:
+        return _load_role(user)
+    key = _cache_key(user.pk)
+    role = _cache().get(key)
+    if role is None or role.is_superuser != user.is_superuser:
+        role = _load_role(user)
+        _cache().set(key, role, timeout)
+    return role
+
+
+def get_role(request):
+    """
+    İstek başına rol. DRF Request veya HttpRequest kabul eder; sonuç alttaki
+    HttpRequest üzerinde saklanır, böylece izin sınıfları, view ve template aynı nesneyi paylaşır.
+    ModelBackend'in izin önbelleği de doldurulur; user.has_perm ek sorgu yapmaz.
+    """
+    user = getattr(request, 'user', None)
+    http_request = getattr(request, '_request', request)
+    role = getattr(http_request, '_ledger_role', None)
+    user_id = getattr(user, 'pk', None)
+    if role is None or role.user_id != user_id:
+        role = resolve_role(user)
+        http_request._ledger_role = role
+    if role.is_authenticated and not role.is_superuser and not hasattr(user, '_perm_cache'):
+        user._perm_cache = set(role.perms)
+    return role
+
+
+def invalidate_roles(user_id=None):
+    """
+    İstekler arası rol önbelleğini geçersiz kılar.
+    user_id verilirse yalnız o kullanıcı, verilmezse herkes (sürüm sayacı artırılır).
+    """
+    if user_id is not None:
+        _cache().delete(_cache_key(user_id))
+        return
+    try:
+        _cache().incr(VERSION_KEY)
+    except ValueError:
+        _cache().set(VERSION_KEY, time.time_ns(), None)
+
+
+class LedgerRoleMiddleware:
+    """request.ledger_role: ilk erişimde yüklenen (lazy) rol nesnesi."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.ledger_role = SimpleLazyObject(lambda: get_role(request))
+        return self.get_response(request)
+
+# Rol çözümleme katmanı:
+# - get_role(request) istek başına tek sefer grup + izin sorgusu yapar.
+# - LEDGER_ROLE_CACHE_TIMEOUT > 0 ise sonuç LEDGER_ROLE_CACHE_ALIAS ('shared') cache'inde saklanır;
+#   grup üyeliği/izin değişikliklerinde signals.py ve bootstrap_roles invalidate_roles() çağırır.
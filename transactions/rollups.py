@@ -0,0 +1,185 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, connections, router, transaction as db_transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyRollup, Transaction
+
+# Rollup anahtarını ve katkısını belirleyen alanlar (values_list sırası)
+STATE_FIELDS = ('owner_id', 'transaction_date', 'type', 'payment_method_id', 'subcategory_id', 'amount', 'is_active')
+KEY_FIELDS = ('owner_id', 'day', 'type', 'payment_method_id', 'subcategory_id')
+# Bu sayıya kadar anahtar tek tek UPDATE ile, fazlası toplu (SELECT FOR UPDATE + upsert/bulk_create) yazılır
+BULK_THRESHOLD = 4
+
+
+def local_day(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def state_of(obj):
+    """Nesnenin rollup katkısı: (anahtar, tutar) ya da katkı yoksa (pasif) None."""
+    owner_id, tx_date, type_, pm_id, sc_id, amount, is_active = (getattr(obj, f) for f in STATE_FIELDS)
+    if not is_active or tx_date is None or amount is None:
+        return None
+    return (owner_id, local_day(tx_date), type_, pm_id, sc_id), Decimal(amount)
+
+
+def state_from_row(row):
+    """values_list(*STATE_FIELDS) satırından state_of ile aynı biçim."""
+    owner_id, tx_date, type_, pm_id, sc_id, amount, is_active = row
+    if not is_active:
+        return None
+    return (owner_id, local_day(tx_date), type_, pm_id, sc_id), Decimal(amount)
+
+
+class Deltas:
+    """Anahtar başına (tutar, adet) farklarını biriktirir."""
+
+    def __init__(self):
+        self.items = defaultdict(lambda: [Decimal('0'), 0])
+
+    def add(self, state, sign=1):
+        if state is None:
+            return
+        key, amount = state
+        item = self.items[key]
+        item[0] += sign * amount
+        item[1] += sign
+
+    def change(self, old, new):
+        self.add(old, -1)
+        self.add(new, +1)
+        return self
+
+    def pending(self):
+        return {k: v for k, v in self.items.items() if v[0] or v[1]}
+
+
+def apply(deltas, using=None):
+    """
+    Farkları DailyRollup'a yazar; çağıranın DB transaction'ı içinde çalışmalıdır.
+    Adedi sıfıra inen satırlar silinmez (raporlara etkisi yok); rebuild_rollups temizler.
+    """
+    pending = deltas.pending()
+    if not pending:
+        return
+    using = using or router.db_for_write(DailyRollup)
+    if len(pending) <= BULK_THRESHOLD:
+        for key, (amount, count) in pending.items():
+            _apply_one(key, amount, count, using)
+    else:
+        _apply_bulk(pending, using)
+
+
+def _key_filter(key):
+    return dict(zip(KEY_FIELDS, key))
+
+
+def _apply_one(key, amount, count, using):
+    rows = DailyRollup.objects.using(using).filter(**_key_filter(key))
+    if rows.update(total=F('total') + amount, count=F('count') + count):
+        return
+    try:
+        with db_transaction.atomic(using=using):
+            DailyRollup.objects.using(using).create(total=amount, count=count, **_key_filter(key))
+    except IntegrityError:
+        # Eşzamanlı ilk ekleme: satır artık var
+        rows.update(total=F('total') + amount, count=F('count') + count)
+
+
+def _apply_bulk(pending, using):
+    owners = {k[0] for k in pending}
+    days = {k[1] for k in pending}
+    existing = {}
+    for row in (DailyRollup.objects.using(using).select_for_update()
+                .filter(owner_id__in=owners, day__in=days)):
+        key = tuple(getattr(row, f) for f in KEY_FIELDS)
+        if key in pending:
+            existing[key] = row
+    for key, row in existing.items():
+        amount, count = pending[key]
+        row.total += amount
+        row.count += count
+    if existing:
+        _write_existing(list(existing.values()), using)
+    missing = [DailyRollup(total=pending[k][0], count=pending[k][1], **_key_filter(k))
+               for k in pending if k not in existing]
+    if not missing:
+        return
+    try:
+        with db_transaction.atomic(using=using):
+            DailyRollup.objects.using(using).bulk_create(missing, batch_size=500)
+    except IntegrityError:
+        for row in missing:
+            _apply_one(tuple(getattr(row, f) for f in KEY_FIELDS), row.total, row.count, using)
+
+
+def _write_existing(rows, using):
+    """
+    Kilitli satırlara yeni mutlak değerleri yazar. Destekleyen DB'lerde (PostgreSQL, SQLite)
+    INSERT ... ON CONFLICT DO UPDATE tek sorgudur; bulk_update'in CASE WHEN ifadesi satır
+    sayısıyla karesel büyüdüğünden yalnız yedek yol olarak kullanılır.
+    """
+    manager = DailyRollup.objects.using(using)
+    if connections[using].features.supports_update_conflicts_with_target:
+        manager.bulk_create(rows, batch_size=500, update_conflicts=True,
+                            unique_fields=['owner', 'day', 'type', 'payment_method', 'subcategory'],
+                            update_fields=['total', 'count'])
+    else:
+        manager.bulk_update(rows, ['total', 'count'], batch_size=500)
+
+
+def apply_rows(rows, sign, using=None):
+    """values_list(*STATE_FIELDS) satırları için toplu ekleme (sign=+1) veya çıkarma (sign=-1)."""
+    deltas = Deltas()
+    for row in rows:
+        deltas.add(state_from_row(row), sign)
+    apply(deltas, using=using)
+
+
+def apply_objects(objs, sign=1, using=None):
+    deltas = Deltas()
+    for obj in objs:
+        deltas.add(state_of(obj), sign)
+    apply(deltas, using=using)
+
+
+# --- yeniden hesaplama ve denetim -------------------------------------------
+
+def expected_rows(owner_id):
+    """Ham işlemlerden (owner_id'nin) rollup satırları: {anahtar: (toplam, adet)}."""
+    rows = (Transaction.objects.filter(owner_id=owner_id).order_by()
+            .annotate(day=TruncDate('transaction_date'))
+            .values_list('day', 'type', 'payment_method_id', 'subcategory_id')
+            .annotate(total=Sum('amount'), count=Count('id')))
+    return {(owner_id, day, type_, pm, sc): (total, count) for day, type_, pm, sc, total, count in rows}
+
+
+def stored_rows(owner_id):
+    rows = DailyRollup.objects.filter(owner_id=owner_id, count__gt=0).values_list(*KEY_FIELDS, 'total', 'count')
+    return {tuple(r[:5]): (r[5], r[6]) for r in rows}
+
+
+def diff_owner(owner_id):
+    """Rollup'ın ham verilerden saptığı anahtarlar: [(anahtar, beklenen, kayıtlı)]."""
+    expected, stored = expected_rows(owner_id), stored_rows(owner_id)
+    return [(key, expected.get(key), stored.get(key))
+            for key in sorted(expected.keys() | stored.keys(), key=str)
+            if expected.get(key) != stored.get(key)]
+
+
+def rebuild_owner(owner_id):
+    """Sahibin rollup satırlarını tek transaction'da siler ve ham verilerden yeniden yazar."""
+    with db_transaction.atomic():
+        DailyRollup.objects.filter(owner_id=owner_id).delete()
+        rows = [DailyRollup(total=total, count=count, **_key_filter(key))
+                for key, (total, count) in expected_rows(owner_id).items()]
+        DailyRollup.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+# Artımlı bakım noktaları: Transaction.save/delete (models.py), ActiveOnlyQuerySet.soft_delete/
+# restore/hard_delete (managers.py) ve TransactionImporter._flush (importers.py).
+# QuerySet.update() ile tutar/tarih/tür değiştiren yeni kod bu modülü çağırmalıdır.
@@ -0,0 +1,115 @@
+import itertools
+import threading
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+# Etkin okuma replikası; yalnız ReplicaReadMixin'li view'ların güvenli isteklerinde dolu
+_read_alias = ContextVar('ledger_read_alias', default=None)
+PIN_KEY = 'ledger:db-pin:{}'
+
+_counter = itertools.count()
+_counter_lock = threading.Lock()
+
+
+def replica_aliases():
+    return list(getattr(settings, 'LEDGER_DATABASE_REPLICAS', ()))
+
+
+def _pin_cache():
+    return caches[getattr(settings, 'LEDGER_REPLICA_PIN_CACHE_ALIAS', 'default')]
+
+
+def sticky_seconds():
+    return getattr(settings, 'LEDGER_REPLICA_STICKY_SECONDS', 15)
+
+
+def pin_to_primary(user):
+    """Kullanıcının okumalarını yazımdan sonra bir süre birincil veritabanına sabitler (read-your-writes)."""
+    if user is not None and user.is_authenticated and replica_aliases() and sticky_seconds() > 0:
+        _pin_cache().set(PIN_KEY.format(user.pk), 1, sticky_seconds())
+
+
+def is_pinned(user):
+    return bool(user is not None and user.is_authenticated and _pin_cache().get(PIN_KEY.format(user.pk)))
+
+
+def choose_replica(request):
+    """Güvenli istek için replika alias'ı; replika yoksa ya da kullanıcı sabitlenmişse None."""
+    aliases = replica_aliases()
+    if not aliases or request.method not in SAFE_METHODS or is_pinned(getattr(request, 'user', None)):
+        return None
+    with _counter_lock:
+        return aliases[next(_counter) % len(aliases)]
+
+
+def current_read_alias():
+    return _read_alias.get()
+
+
+class ReplicaRouter:
+    """
+    Okumalar yalnız etkin replika varsa (ReplicaReadMixin) oraya gider; yazımlar her zaman
+    birincile. db_for_write açıkça 'default' döner: replikadan okunan nesne kaydedilirse
+    Django varsayılanı nesnenin geldiği veritabanını seçerdi.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Birincil ve replikalar aynı veriyi taşır
+        dbs = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in dbs and obj2._state.db in dbs:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    DRF view'ları için: GET/HEAD/OPTIONS isteklerinde kimlik doğrulama ve izin kontrolünden sonraki
+    okumalar bir replikaya yönlenir. get_queryset sonucu da replikaya bağlanır; böylece akışla
+    dönen yanıtlar (export) istek bittikten sonra okunurken de aynı replikayı kullanır.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        alias = choose_replica(request)
+        if alias:
+            self._replica_token = _read_alias.set(alias)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            _read_alias.reset(token)
+            self._replica_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        alias = _read_alias.get()
+        return qs.using(alias) if alias else qs
+
+
+class ReplicaPinMiddleware:
+    """Başarılı yazım isteğinden (POST/PUT/PATCH/DELETE, durum < 400) sonra kullanıcıyı birincile sabitler."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and response.status_code < 400 and replica_aliases():
+            pin_to_primary(getattr(request, 'user', None))
+        return response
+
+# Ayarlar: DATABASE_REPLICA_URLS (virgülle ayrılmış) -> DATABASES['replica1'...], LEDGER_DATABASE_REPLICAS,
+# LEDGER_REPLICA_STICKY_SECONDS (replikasyon gecikmesinin üst sınırı kadar seçin).
+# Sabitleme kaydı paylaşılan cache'tedir (LEDGER_REPLICA_PIN_CACHE_ALIAS): tüm worker'lar görür.
+# Yerel deneme (iki SQLite dosyası): bkz. settings/base.py'deki DATABASE_REPLICA_URLS açıklaması.
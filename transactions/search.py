@@ -0,0 +1,84 @@
+from django.db import connections
+from django.db.models import Case, FloatField, Q, Value, When
+from rest_framework.filters import SearchFilter, search_smart_split
+from rest_framework.settings import api_settings
+
+from .models import Subcategory
+from .pagination import wants_keyset
+
+MAX_SEARCH_TERMS = 8
+RELEVANCE_ORDERING = 'relevance'
+
+
+def search_terms(value):
+    """DRF SearchFilter ile aynı ayrıştırma: boşlukla ayrılmış terimler, tırnak içi ifade tek terim."""
+    value = (value or '').replace('\x00', '')
+    return [t.strip('"') for t in search_smart_split(value) if t.strip('"')][:MAX_SEARCH_TERMS]
+
+
+def is_postgres(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+
+def search_transactions(queryset, value):
+    """
+    Her terim açıklamada ya da alt kategori adında geçmelidir (terimler AND ile birleşir).
+    Alt kategori eşleşmesi JOIN yerine küçük Subcategory tablosunda id alt sorgusuyla yapılır;
+    böylece PostgreSQL açıklama üzerindeki trigram GIN indeksi ile subcategory_id indeksini
+    BitmapOr ile birleştirir. SQLite'ta aynı sorgu LIKE ile çalışır (indekssiz, eski davranış).
+    """
+    for term in search_terms(value):
+        sub_ids = Subcategory.objects.filter(name__icontains=term).values('id')
+        queryset = queryset.filter(Q(description__icontains=term) | Q(subcategory_id__in=sub_ids))
+    return queryset
+
+
+def rank_transactions(queryset, value):
+    """
+    Sonuçları ilgililiğe göre sıralar (search_rank alanı). PostgreSQL'de pg_trgm kelime
+    benzerliği, diğer veritabanlarında basit eşleşme sınıfı (baştan eşleşme > içerir) kullanılır.
+    Eşit skorlar tarih sırasını korur.
+    """
+    phrase = ' '.join(search_terms(value))
+    if not phrase:
+        return queryset
+    if is_postgres(queryset):
+        from django.contrib.postgres.search import TrigramWordSimilarity  # psycopg gerektirir
+        rank = TrigramWordSimilarity(phrase, 'description') + TrigramWordSimilarity(phrase, 'subcategory__name')
+    else:
+        rank = Case(
+            When(description__istartswith=phrase, then=Value(3.0)),
+            When(description__icontains=phrase, then=Value(2.0)),
+            When(subcategory__name__icontains=phrase, then=Value(1.0)),
+            default=Value(0.0), output_field=FloatField(),
+        )
+    return queryset.annotate(search_rank=rank).order_by('-search_rank', '-transaction_date', '-id')
+
+
+def wants_relevance(request):
+    ordering = request.query_params.get(api_settings.ORDERING_PARAM, '')
+    return ordering.lstrip('-') == RELEVANCE_ORDERING
+
+
+class TransactionSearchFilter(SearchFilter):
+    """
+    ?search= parametresini search_transactions üzerinden uygular. View'in FilterSet'i aynı
+    parametreyi zaten işliyorsa (TransactionFilter.filter_search) filtre ikinci kez eklenmez.
+    ?ordering=relevance ile liste sonuçları ilgililiğe göre sıralanır (keyset modunda yok sayılır,
+    çünkü keyset sıralaması sabit -transaction_date, -id'dir).
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        value = request.query_params.get(self.search_param, '')
+        if not search_terms(value):
+            return queryset
+        filterset_class = getattr(view, 'filterset_class', None)
+        if not (filterset_class and self.search_param in filterset_class.base_filters):
+            queryset = search_transactions(queryset, value)
+        if getattr(view, 'action', None) == 'list' and wants_relevance(request) and not wants_keyset(request):
+            queryset = rank_transactions(queryset, value)
+        return queryset
+
+# İndeksler: 0008_transaction_search_indexes (yalnız PostgreSQL) UPPER(description) ve
+# UPPER(subcategory.name) üzerinde gin_trgm_ops indeksleri oluşturur; Django'nun icontains
+# sorgusu (UPPER(col::text) LIKE UPPER('%x%')) bu ifadeyle birebir eşleşir.
@@ -0,0 +1,117 @@
+import random
+from dataclasses import dataclass, field
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.db import connections
+from PIL import Image, ImageDraw
+
+from .models import Transaction
+
+# Gerçekçi dağılım için alt kategori adları (ilk sıralardakiler daha sık seçilir: Zipf)
+SUBCATEGORY_NAMES = (
+    'Market', 'Ulaşım', 'Kira', 'Fatura', 'Restoran', 'Kahve', 'Akaryakıt', 'Giyim', 'Sağlık', 'Eğitim',
+    'Eğlence', 'Abonelik', 'Telefon', 'İnternet', 'Sigorta', 'Bakım', 'Hediye', 'Spor', 'Kitap', 'Seyahat',
+    'Evcil Hayvan', 'Kırtasiye', 'Elektronik', 'Mobilya', 'Bağış', 'Vergi', 'Aidat', 'Otopark', 'Kuaför', 'Diğer',
+)
+INCOME_NAMES = ('Maaş', 'Prim', 'Kira Geliri', 'Faiz', 'Serbest Çalışma')
+DESCRIPTION_WORDS = (
+    'haftalık', 'aylık', 'nakit', 'indirim', 'taksit', 'online', 'şube', 'fatura', 'market', 'yakıt',
+    'öğle', 'akşam', 'yemeği', 'kargo', 'iade', 'kampanya', 'yıllık', 'ödeme', 'sipariş', 'bilet',
+)
+EXPENSE_RATIO = 0.85
+
+
+def zipf_weights(n, s=1.1):
+    return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def make_receipt_image(rng, size=(600, 800)):
+    """Fiş benzeri sentetik görüntü (PNG byte'ları); her çağrı farklı içerik (farklı hash) üretir."""
+    img = Image.new('RGB', size, (250, 250, 245))
+    draw = ImageDraw.Draw(img)
+    for y in range(40, size[1] - 40, 28):
+        width = rng.randint(size[0] // 3, size[0] - 80)
+        draw.rectangle([40, y, width, y + 10], fill=(rng.randint(0, 90),) * 3)
+    buf = BytesIO()
+    img.save(buf, format='PNG')
+    return buf.getvalue()
+
+
+@dataclass
+class SeedPlan:
+    """İşçi süreçlere gönderilen (pickle edilebilir) üretim planı."""
+    owner_ids: list
+    owner_weights: list
+    payment_method_ids: list
+    expense_subcategory_ids: list
+    income_subcategory_ids: list
+    now: object
+    days: int = 730
+    receipt_ratio: float = 0.0
+    # [(blob_id, file_name, thumbnail_name, original_name)]
+    receipts: list = field(default_factory=list)
+    seed: int = 42
+
+
+def generate(plan, chunk_index, count):
+    """Parça için kaydedilmemiş Transaction nesneleri; aynı (seed, parça) her zaman aynı veriyi üretir."""
+    rng = random.Random(plan.seed * 1_000_003 + chunk_index)
+    expense_weights = zipf_weights(len(plan.expense_subcategory_ids))
+    income_weights = zipf_weights(len(plan.income_subcategory_ids))
+    owners = rng.choices(plan.owner_ids, plan.owner_weights, k=count)
+    objs = []
+    for owner_id in owners:
+        is_expense = rng.random() < EXPENSE_RATIO
+        if is_expense:
+            subcategory_id = rng.choices(plan.expense_subcategory_ids, expense_weights)[0]
+            amount = min(rng.lognormvariate(4.0, 1.1), 50000)
+        else:
+            subcategory_id = rng.choices(plan.income_subcategory_ids, income_weights)[0]
+            amount = min(rng.lognormvariate(9.0, 0.6), 500000)
+        # Yakın tarihler daha yoğun (kare dağılım); gün içi saat rastgele
+        age = timedelta(days=plan.days * rng.random() ** 2, seconds=rng.randint(0, 86399))
+        obj = Transaction(
+            owner_id=owner_id, created_by_id=owner_id, updated_by_id=owner_id,
+            amount=Decimal(f'{max(amount, 0.01):.2f}'),
+            type='EXPENSE' if is_expense else 'INCOME',
+            payment_method_id=rng.choice(plan.payment_method_ids),
+            subcategory_id=subcategory_id,
+            transaction_date=plan.now - age - timedelta(minutes=1),
+            description=' '.join(rng.sample(DESCRIPTION_WORDS, rng.randint(0, 3))),
+        )
+        if plan.receipts and rng.random() < plan.receipt_ratio:
+            blob_id, file_name, thumbnail_name, original_name = rng.choice(plan.receipts)
+            obj.receipt_blob_id = blob_id
+            obj.receipt_file.name = file_name
+            obj.receipt_thumbnail.name = thumbnail_name or None
+            obj.receipt_original_name = original_name
+        objs.append(obj)
+    return objs
+
+
+def insert_chunk(args):
+    """
+    Bir parçayı bulk_create ile yazar (işçi süreçte de çalışır). Döndürür: (satır, {blob_id: adet}).
+    Rollup/denetim kaydı yazılmaz; seed_ledger sonunda rollup'ları yeniden hesaplar.
+    """
+    plan, chunk_index, count, batch_size = args
+    try:
+        objs = generate(plan, chunk_index, count)
+        Transaction.objects.bulk_create(objs, batch_size=batch_size)
+        refs = {}
+        for obj in objs:
+            if obj.receipt_blob_id:
+                refs[obj.receipt_blob_id] = refs.get(obj.receipt_blob_id, 0) + 1
+        return len(objs), refs
+    finally:
+        connections.close_all()
+
+
+def init_worker():
+    # spawn başlatma yönteminde (macOS/Windows) Django'yu işçide kur
+    import django
+    django.setup()
+
+# Kullanım: python manage.py seed_ledger (bkz. management/commands/seed_ledger.py)
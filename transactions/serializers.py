@@ -3,7 +3,8 @@ from django.urls import reverse
 from django.utils import timezone
 from django.db import transaction as db_transaction
 from .models import PaymentMethod, Subcategory, Transaction
-from .utils import normalize_subcategory_name, validate_image_file
+from .utils import normalize_subcategory_name, ingest_receipt
+from .instrumentation import TimedListSerializer, TimedSerializerMixin, span
 
 class PaymentMethodSerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,7 +17,10 @@ class SubcategorySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'normalized_name', 'is_active', 'created_at', 'updated_at']
         read_only_fields = ['normalized_name', 'created_at', 'updated_at']
 
-class TransactionSerializer(serializers.ModelSerializer):
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=5000)
+
+class TransactionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     owner = serializers.PrimaryKeyRelatedField(read_only=True)
 
     # Görüntüde isim göstermek için (read-only)
@@ -26,6 +30,10 @@ class TransactionSerializer(serializers.ModelSerializer):
 
     receipt_download_url = serializers.SerializerMethodField()
     receipt_thumbnail_url = serializers.SerializerMethodField()
+    # Boyutlu önizleme: <url>?w=160|320|640|1280&fmt=webp|jpeg
+    receipt_rendition_url = serializers.SerializerMethodField()
+    # 'ready' | 'pending' (worker henüz üretmedi) | None (fiş yok)
+    receipt_thumbnail_status = serializers.SerializerMethodField()
     # Transaction oluştururken subcategory'yi isimle de kabul et (yoksa oluştur)
     subcategory_name = serializers.CharField(write_only=True, required=False, allow_blank=False)
 
@@ -37,11 +45,13 @@ class TransactionSerializer(serializers.ModelSerializer):
             'subcategory','subcategory_name','subcategory_label',
             'description','transaction_date',
             'receipt_file','receipt_original_name','receipt_thumbnail',
-            'receipt_download_url','receipt_thumbnail_url',
+            'receipt_download_url','receipt_thumbnail_url','receipt_thumbnail_status','receipt_rendition_url',
             'created_at','updated_at','is_active'
         ]
         read_only_fields = ['owner','receipt_original_name','receipt_thumbnail','created_at','updated_at','is_active',
                             'payment_method_name','subcategory_label']
+        # Liste çıktısı da Server-Timing 'ser' süresine yazılır (bkz. instrumentation.py)
+        list_serializer_class = TimedListSerializer
 
     def validate_transaction_date(self, value):
         if value > timezone.now():
@@ -51,7 +61,9 @@ class TransactionSerializer(serializers.ModelSerializer):
     def validate_receipt_file(self, value):
         if value:
             try:
-                validate_image_file(value)
+                # Sonuç upload nesnesine iliştirilir; Transaction.save aynı sonucu kullanır
+                with span('receipt'):
+                    ingest_receipt(value)
             except ValueError as e:
                 raise serializers.ValidationError(str(e))
         return value
@@ -61,6 +73,11 @@ class TransactionSerializer(serializers.ModelSerializer):
             return reverse('transactions-transaction-receipt', kwargs={'pk': obj.pk})
         return None
 
+    def get_receipt_rendition_url(self, obj):
+        if obj.receipt_file:
+            return reverse('transactions-transaction-rendition', kwargs={'pk': obj.pk})
+        return None
+
     def get_receipt_thumbnail_url(self, obj):
         if obj.receipt_thumbnail:
             request = self.context.get('request')
@@ -68,6 +85,11 @@ class TransactionSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(url) if request else url
         return None
 
+    def get_receipt_thumbnail_status(self, obj):
+        if not obj.receipt_file:
+            return None
+        return 'ready' if obj.receipt_thumbnail else 'pending'
+
     def _resolve_subcategory(self, validated_data):
         # POST sırasında istenen "subcategory_name" varsa bul yoksa oluştur
         name = self.initial_data.get('subcategory_name') or validated_data.get('subcategory_name')
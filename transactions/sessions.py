@@ -0,0 +1,60 @@
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.base import UpdateError
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+logger = logging.getLogger('django.contrib.sessions')
+
+# Oturum verisinde DB satırının son yazıldığı andaki expire_date (epoch saniye)
+PERSISTED_UNTIL_KEY = '_ledger_persisted_until'
+
+
+class SessionStore(CachedDBStore):
+    """
+    Cache öncelikli, az yazan oturum deposu (SESSION_ENGINE = 'transactions.sessions').
+
+    Kayan süre (SESSION_COOKIE_AGE) cache'te tutulur: her istekte cache kaydının süresi
+    touch ile yenilenir, hareketsizlikte kayıt tam süresinde düşer. django_session satırı
+    yalnız veri değiştiğinde (giriş/çıkış, yeni anahtar) ya da satırın kalan ömrü
+    LEDGER_SESSION_REFRESH_THRESHOLD saniyenin altına indiğinde yazılır. Cache kaybolursa
+    oturum DB'den okunur (DB kopyası en fazla eşik kadar erken dolabilir; süre uzamaz).
+    """
+    cache_key_prefix = 'ledger.sessions'
+
+    def _refresh_due(self):
+        persisted_until = self._session.get(PERSISTED_UNTIL_KEY)
+        if persisted_until is None:
+            return True
+        threshold = getattr(settings, 'LEDGER_SESSION_REFRESH_THRESHOLD', 0)
+        return persisted_until - time.time() < threshold
+
+    def save(self, must_create=False):
+        if self.session_key is None or must_create or self.modified or self._refresh_due():
+            self._persist(must_create)
+            return
+        try:
+            if self._cache.touch(self.cache_key, self.get_expiry_age()):
+                return
+            self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+        except Exception:
+            logger.exception('Error touching session cache (%s); writing to the database', self._cache)
+            self._persist(must_create)
+
+    def _persist(self, must_create):
+        if self.session_key is not None:
+            self._session[PERSISTED_UNTIL_KEY] = int(self.get_expiry_date().timestamp())
+        try:
+            super().save(must_create)
+        except UpdateError:
+            # Satır cache'ten önce süresi dolup silinmiş (clearsessions); cache'teki oturum geçerli
+            if must_create or self._session_cache is None:
+                raise
+            super().save(must_create=True)
+
+# Ayarlar (settings/base.py): SESSION_ENGINE, SESSION_CACHE_ALIAS='sessions',
+# LEDGER_SESSION_CACHE=file|locmem|redis://..., LEDGER_SESSION_REFRESH_THRESHOLD.
+# 'sessions' cache'i yalnız oturumlara ayrılmıştır; diğer paylaşılan girdiler 'shared' deposundadır.
+# 'locmem' yalnız tek süreçte doğrudur: başka worker'da çıkış yapılmış oturum kendi
+# belleğinde geçerli kalır. Birden çok worker için 'file' (tek sunucu) ya da Redis kullanın.
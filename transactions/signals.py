@@ -1,11 +1,59 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Group
 from django.contrib.auth.signals import user_logged_in
+from django.db.models.signals import m2m_changed, post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from .models import AuditLog
+from . import audit
+from .models import AuditLog, PaymentMethod, Subcategory, Transaction
+from .refdata import bump_version
+from .authentication import invalidate_token_user
+from .roles import invalidate_roles
+
+User = get_user_model()
 
 @receiver(user_logged_in)
 def log_user_login(sender, user, request, **kwargs):
-    AuditLog.objects.create(actor=user, action=AuditLog.Actions.LOGIN,
-                            object_type='User', object_id=str(user.id))
+    # batched modda istek sonunda diğer kayıtlarla birlikte yazılır (AuditBufferMiddleware)
+    audit.record(user, AuditLog.Actions.LOGIN, 'User', user.id)
+
+# --- Referans verisi önbelleği (payment-methods/subcategories API'si ve sayfalara gömülü veri) ---
+@receiver(post_save, sender=PaymentMethod)
+@receiver(post_delete, sender=PaymentMethod)
+def bump_payment_methods(sender, **kwargs):
+    bump_version('payment-methods')
+
+@receiver(post_save, sender=Subcategory)
+@receiver(post_delete, sender=Subcategory)
+def bump_subcategories(sender, **kwargs):
+    bump_version('subcategories')
+
+# --- Rol önbelleği geçersiz kılma (admin ekranları, bootstrap_roles, shell) ---
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_roles_on_membership_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_roles()
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_roles_on_group_change(sender, **kwargs):
+    invalidate_roles()
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_role_on_user_change(sender, instance, update_fields=None, **kwargs):
+    # Girişte yalnız last_login güncellenir; rolü etkilemez
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_roles(user_id=instance.pk)
+    invalidate_token_user(instance.pk)  # şifre/aktiflik değişikliği token'lara hemen yansısın
+
+# --- Kullanıcı silme: CASCADE SQL ile siler, ReceiptBlob.release çağrılmaz ---
+@receiver(pre_delete, sender=User)
+def hard_delete_user_transactions(sender, instance, **kwargs):
+    # Silme ile aynı transaction'da: blob referansları bırakılır (son referansta dosya silinir), rollup düşülür
+    Transaction.all_objects.filter(owner=instance).hard_delete()
 
 # Bu sinyal, kullanıcı giriş yaptığında AuditLog tablosuna bir giriş ekler.
 # 'actor' alanı giriş yapan kullanıcıyı, 'action' alanı ise yapılan işlemi belirtir.
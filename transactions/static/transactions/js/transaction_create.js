@@ -20,7 +20,10 @@
 
   // Fill selects
   try {
-    const [pms, scs] = await Promise.all([
+    // Sayfaya gömülü referans verisi (LEDGER_INLINE_REFDATA); yoksa API'den
+    const inlineEl = document.getElementById('ledger-refdata');
+    const inline = inlineEl ? JSON.parse(inlineEl.textContent) : null;
+    const [pms, scs] = inline ? [inline.payment_methods, inline.subcategories] : await Promise.all([
       fetchJSON(apiBase + 'payment-methods/'),
       fetchJSON(apiBase + 'subcategories/')
     ]);
@@ -46,7 +46,7 @@
   }
   function qs(id) { return document.getElementById(id); }
 
-  function buildQuery() {
+  function buildQuery(opts = {}) {
     const p = new URLSearchParams();
     const g = id => { const el = qs(id); return el ? el.value : ''; };
     if (g('date_from')) p.set('date_from', new Date(g('date_from')).toISOString());
@@ -57,7 +57,7 @@
     if (g('min_amount')) p.set('min_amount', g('min_amount'));
     if (g('max_amount')) p.set('max_amount', g('max_amount'));
     if (g('search')) p.set('search', g('search'));
-    p.set('page_size', '100000');
+    if (!opts.noPaging) p.set('page_size', '100000');
     if (showDeleted) p.set('only_deleted', '1');
     return p.toString();
   }
@@ -120,15 +120,13 @@
     return el;
   }
 
-  function renderSummaryCards(list) {
+  // Toplamlar sunucuda tek bir GROUP BY sorgusu ile hesaplanır (/transactions/summary/)
+  function renderSummaryCards(summary) {
     const el = ensureSummaryCardsContainer();
-    const totalIncome = list.filter(x => x.type === 'INCOME')
-                            .reduce((s,x) => s + parseFloat(x.amount || 0), 0);
-    const totalExpense = list.filter(x => x.type === 'EXPENSE')
-                             .reduce((s,x) => s + parseFloat(x.amount || 0), 0);
-    const net = totalIncome - totalExpense;
+    const totalIncome = parseFloat(summary.income || 0);
+    const totalExpense = parseFloat(summary.expense || 0);
+    const net = parseFloat(summary.net || 0);
 
-    
     const netClass = net >= 0 ? 'pos' : 'neg';
 
     el.innerHTML = `
@@ -150,16 +148,23 @@
         </div>
         <div class="metric">
           <div class="metric-label">Kayıt Sayısı</div>
-          <div class="metric-value">${list.length}</div>
-          <div class="metric-sub">Tabloda gösterilen</div>
+          <div class="metric-value">${summary.count || 0}</div>
+          <div class="metric-sub">Filtrelere göre</div>
         </div>
       </div>
     `;
   }
 
   // Filters (fill selects) 
+  // Sayfaya gömülü referans verisi (LEDGER_INLINE_REFDATA); yoksa API'den
+  function inlineRefdata() {
+    const el = document.getElementById('ledger-refdata');
+    return el ? JSON.parse(el.textContent) : null;
+  }
+
   async function populateFilters() {
-    const [pms, scs] = await Promise.all([
+    const inline = inlineRefdata();
+    const [pms, scs] = inline ? [inline.payment_methods, inline.subcategories] : await Promise.all([
       fetchJSON(apiBase + 'payment-methods/'),
       fetchJSON(apiBase + 'subcategories/')
     ]);
@@ -195,12 +200,24 @@
       action(e, dt, node, cfg);
     };
   }
+  // Excel/CSV sunucuda akış olarak üretilir (tüm filtreye uyan kayıtlar); AuditLog'u sunucu yazar
+  function serverExport(fileFormat) {
+    return () => {
+      if (window.USER_ROLE === 'Manager') {
+        const now = Date.now();
+        exportCount = exportCount.filter(t => now - t < 60000);
+        if (exportCount.length >= 10) { alert('Son 60 saniyede 10 ihracat sınırına ulaştınız.'); return; }
+        exportCount.push(now);
+      }
+      window.location.href = apiBase + 'transactions/export/?' + buildQuery({ noPaging: true }) + '&file_format=' + fileFormat;
+    };
+  }
   function makeExportButtons() {
     if (!window.CAN_EXPORT) return [];
     const filename = () => `transactions_${dayjs().tz(tz).format('YYYYDDMM_HHmm')}`;
     return [
-      { extend: 'excelHtml5', text: 'Excel', title: 'İşlemler', filename, exportOptions: { columns: [1, 2, 3, 4, 5, 6] }, action: beforeExportWrapper($.fn.dataTable.ext.buttons.excelHtml5.action) },
-      { extend: 'csvHtml5', text: 'CSV', title: 'İşlemler', filename, exportOptions: { columns: [1, 2, 3, 4, 5, 6] }, action: beforeExportWrapper($.fn.dataTable.ext.buttons.csvHtml5.action) },
+      { text: 'Excel', action: serverExport('xlsx') },
+      { text: 'CSV', action: serverExport('csv') },
       { extend: 'pdfHtml5', text: 'PDF', title: 'İşlemler', filename, exportOptions: { columns: [1, 2, 3, 4, 5, 6] }, action: beforeExportWrapper($.fn.dataTable.ext.buttons.pdfHtml5.action) },
     ];
   }
@@ -230,11 +247,12 @@
   // === Table load & paint =====================================================
   async function loadTable() {
     const url = apiBase + 'transactions/?' + buildQuery();
-    const data = await fetchJSON(url);
+    const summaryUrl = apiBase + 'transactions/summary/?' + buildQuery({ noPaging: true });
+    const [data, summary] = await Promise.all([fetchJSON(url), fetchJSON(summaryUrl)]);
     const list = (data.results || data);
 
-    // ÖZET KARTLARI: her yüklemede hesapla/göster
-    renderSummaryCards(list);
+    // ÖZET KARTLARI: her yüklemede sunucudan gelen toplamlarla göster
+    renderSummaryCards(summary);
 
     const rows = list.map(x => ({
       id: x.id,
@@ -245,7 +263,8 @@
       type: x.type === 'INCOME' ? 'Gelir' : 'Gider',
       sc: x.subcategory_label || x.subcategory,
       desc: x.description || '',
-      receipt: x.receipt_thumbnail_url ? `<a href="${x.receipt_download_url}"><img class="thumbnail" src="${x.receipt_thumbnail_url}" alt="thumb"></a>` : '',
+      // Listede küçük önizleme (160px rendition; sunucu önbelleğinden, ETag ile)
+      receipt: x.receipt_rendition_url ? `<a href="${x.receipt_download_url}"><img class="thumbnail" loading="lazy" src="${x.receipt_rendition_url}?w=160" alt="thumb"></a>` : '',
       actions: '', // sonra doldur
       _raw: x
     }));
@@ -408,6 +427,16 @@
     }
   });
 
+  // Toplu işlemler tek istekle: /transactions/bulk-*/ { ids: [...] }
+  async function bulkPost(path, ids) {
+    const r = await fetch(apiBase + `transactions/${path}/`, {
+      method: 'POST', credentials: 'same-origin',
+      headers: { 'X-CSRFToken': getCSRF(), 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ids })
+    });
+    return r.ok ? r.json() : null;
+  }
+
   // Toplu hard delete — delegation (buton sonradan görünse bile çalışır)
   $(document).on('click', '#bulkHardDeleteBtn', async function () {
     if (!isAdmin) { alert('Yalnız Admin kalıcı silebilir.'); return; }
@@ -415,17 +444,9 @@
     if (selectedIds.size === 0) return;
     if (!confirm(`Seçili ${selectedIds.size} kaydı KALICI olarak silmek istiyor musunuz? Bu işlem geri alınamaz.`)) return;
 
-    const ids = Array.from(selectedIds);
-    let ok = 0, fail = 0;
-    for (const id of ids) {
-      const r = await fetch(apiBase + `transactions/${id}/hard-delete/`, {
-        method: 'DELETE',
-        credentials: 'same-origin',
-        headers: { 'X-CSRFToken': getCSRF() }
-      });
-      if (r.status === 204) ok++; else fail++;
-    }
-    if (fail) alert(`${ok} kayıt kalıcı silindi, ${fail} kayıt silinemedi.`);
+    const res = await bulkPost('bulk-hard-delete', Array.from(selectedIds));
+    if (!res) alert('Kalıcı silinemedi.');
+    else if (res.skipped.length) alert(`${res.deleted.length} kayıt kalıcı silindi, ${res.skipped.length} kayıt silinemedi.`);
     await loadTable();
   });
 
@@ -437,27 +458,17 @@
       if (!window.CAN_RESTORE) { alert('Yetkiniz yok.'); return; }
       if (!confirm(`Seçili ${selectedIds.size} kaydı geri yüklemek istiyor musunuz?`)) return;
 
-      let ok = 0, fail = 0;
-      for (const id of Array.from(selectedIds)) {
-        const r = await fetch(apiBase + `transactions/${id}/restore/`, {
-          method: 'POST', credentials: 'same-origin', headers: { 'X-CSRFToken': getCSRF() }
-        });
-        if (r.ok) ok++; else fail++;
-      }
-      if (fail) alert(`${ok} kayıt geri yüklendi, ${fail} kayıt başarısız.`);
+      const res = await bulkPost('bulk-restore', Array.from(selectedIds));
+      if (!res) alert('Geri yüklenemedi.');
+      else if (res.skipped.length) alert(`${res.restored.length} kayıt geri yüklendi, ${res.skipped.length} kayıt başarısız.`);
       await loadTable();
 
     } else {
       if (!confirm(`Seçili ${selectedIds.size} kaydı silmek istiyor musunuz?`)) return;
 
-      let ok = 0, fail = 0;
-      for (const id of Array.from(selectedIds)) {
-        const r = await fetch(apiBase + `transactions/${id}/`, {
-          method: 'DELETE', credentials: 'same-origin', headers: { 'X-CSRFToken': getCSRF() }
-        });
-        if (r.status === 204) ok++; else fail++;
-      }
-      if (fail) alert(`${ok} kayıt silindi, ${fail} kayıt silinemedi.`);
+      const res = await bulkPost('bulk-delete', Array.from(selectedIds));
+      if (!res) alert('Silinemedi.');
+      else if (res.skipped.length) alert(`${res.deleted.length} kayıt silindi, ${res.skipped.length} kayıt silinemedi.`);
       await loadTable();
     }
   });
@@ -1,3 +1,1517 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.models import Group, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection, connections
+from django.db.models import Q, Sum
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+
+from .models import AuditLog, PaymentMethod, Subcategory, Transaction
+from . import audit, dbpool, metrics, refdata, roles
+from .roles import get_role, invalidate_roles, resolve_role
+from .jobs import claim_jobs, process_jobs
+from .models import DailyRollup, ReceiptBlob, ReceiptJob
+from .benchmarks import AUDIT_TAG, LedgerBenchmark
+from .partitions import add_months, convert_to_partitioned, ensure_monthly_partitions, partition_name, period_start
+from .rollups import diff_owner
+from .sessions import PERSISTED_UNTIL_KEY, SessionStore
+from .renditions import RenditionCache, get_rendition
+from .instrumentation import RequestProfile, fingerprint
+from .routers import ReplicaRouter, choose_replica, is_pinned
+from .downloads import _content_disposition, parse_range
+from .exports import column_letter
+from .utils import ingest_receipt, render_rendition, render_thumbnail
+
+User = get_user_model()
+
+
+class LedgerTestCase(TestCase):
+    """Rolleri ve birkaç örnek işlemi hazırlayan ortak test tabanı."""
+
+    @classmethod
+    def setUpTestData(cls):
+        ct = ContentType.objects.get_for_model(Transaction)
+        crud = Permission.objects.filter(content_type=ct, codename__in=[
+            'add_transaction', 'change_transaction', 'delete_transaction', 'view_transaction'])
+        cls.admin_group = Group.objects.create(name='Admin')
+        cls.admin_group.permissions.set(Permission.objects.filter(content_type=ct))
+        cls.manager_group = Group.objects.create(name='Manager')
+        cls.manager_group.permissions.set(list(crud) + [
+            Permission.objects.get(content_type=ct, codename='can_export_transactions')])
+        cls.user_group = Group.objects.create(name='User')
+        cls.user_group.permissions.set(crud)
+
+        cls.alice = User.objects.create_user('alice', 'alice@example.com', 'pw')
+        cls.alice.groups.add(cls.user_group)
+        cls.bob = User.objects.create_user('bob', 'bob@example.com', 'pw')
+        cls.bob.groups.add(cls.user_group)
+        cls.manager = User.objects.create_user('manager', 'manager@example.com', 'pw')
+        cls.manager.groups.add(cls.manager_group)
+        cls.admin = User.objects.create_user('admin', 'admin@example.com', 'pw')
+        cls.admin.groups.add(cls.admin_group)
+
+        cls.cash = PaymentMethod.objects.get(name='Nakit')
+        cls.card = PaymentMethod.objects.get(name='Kredi Kartı')
+        cls.rent = Subcategory.objects.create(name='Kira')
+        cls.salary = Subcategory.objects.create(name='Maaş')
+
+        now = timezone.now()
+        cls.make_tx(cls.alice, '1000.00', 'INCOME', cls.card, cls.salary, now - timedelta(days=3))
+        cls.make_tx(cls.alice, '250.50', 'EXPENSE', cls.cash, cls.rent, now - timedelta(days=2))
+        cls.make_tx(cls.alice, '49.50', 'EXPENSE', cls.card, cls.rent, now - timedelta(days=1))
+        cls.make_tx(cls.bob, '300.00', 'INCOME', cls.cash, cls.salary, now - timedelta(days=1))
+
+    @classmethod
+    def make_tx(cls, owner, amount, type_, pm, sc, when, **extra):
+        return Transaction.objects.create(owner=owner, amount=Decimal(amount), type=type_,
+                                          payment_method=pm, subcategory=sc,
+                                          transaction_date=when, **extra)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+
+class SummaryTests(LedgerTestCase):
+    url = '/api/v1/transactions/summary/'
+
+    def test_owner_only_sees_own_totals(self):
+        r = self.client_for(self.alice).get(self.url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.data['income'], '1000.00')
+        self.assertEqual(r.data['expense'], '300.00')
+        self.assertEqual(r.data['net'], '700.00')
+        self.assertEqual(r.data['count'], 3)
+        rent = next(x for x in r.data['by_subcategory'] if x['id'] == self.rent.id)
+        self.assertEqual((rent['expense'], rent['count']), ('300.00', 2))
+
+    def test_manager_sees_all_and_filters_apply(self):
+        client = self.client_for(self.manager)
+        r = client.get(self.url)
+        self.assertEqual((r.data['income'], r.data['count']), ('1300.00', 4))
+        r = client.get(self.url, {'payment_method': self.cash.id})
+        self.assertEqual(r.data['by_type']['INCOME'], {'total': '300.00', 'count': 1})
+        self.assertEqual(r.data['by_type']['EXPENSE'], {'total': '250.50', 'count': 1})
+
+    def test_single_query(self):
+        client = self.client_for(self.manager)
+        client.get(self.url)  # izin önbelleğini ısıt
+        with self.assertNumQueries(3):  # rol yükleme: grup + izin (2) + tek aggregate
+            client.get(self.url)
+
+
+class KeysetPaginationTests(LedgerTestCase):
+    url = '/api/v1/transactions/'
+
+    def test_walks_all_rows_in_order(self):
+        client = self.client_for(self.manager)
+        r = client.get(self.url, {'pagination': 'cursor', 'page_size': 3})
+        first = [x['id'] for x in r.data['results']]
+        self.assertEqual(len(first), 3)
+        r = client.get(r.data['next'])
+        second = [x['id'] for x in r.data['results']]
+        self.assertIsNone(r.data['next'])
+        expected = list(Transaction.objects.order_by('-transaction_date', '-id').values_list('id', flat=True))
+        self.assertEqual(first + second, expected)
+
+    def test_invalid_cursor(self):
+        r = self.client_for(self.manager).get(self.url, {'cursor': 'bozuk'})
+        self.assertEqual(r.status_code, 404)
+
+    def test_page_number_is_default(self):
+        r = self.client_for(self.manager).get(self.url)
+        self.assertEqual(r.data['count'], 4)
+
+
+class QueryCountTests(LedgerTestCase):
+    """Sorgu sayısı satır sayısından bağımsız kalmalı (N+1 regresyon koruması)."""
+    url = '/api/v1/transactions/'
+
+    def add_rows(self, n=10, **extra):
+        now = timezone.now()
+        for i in range(n):
+            sc = Subcategory.objects.create(name=f'Kategori {i}')
+            pm = PaymentMethod.objects.create(name=f'Yöntem {i}')
+            self.make_tx(self.alice, '10.00', 'EXPENSE', pm, sc, now - timedelta(hours=i + 1), **extra)
+
+    def assertConstantQueries(self, client, url, params, expected, **row_extra):
+        client.get(url, params)  # izin önbelleğini ısıt
+        with self.assertNumQueries(expected):
+            client.get(url, params)
+        self.add_rows(**row_extra)
+        with self.assertNumQueries(expected):
+            r = client.get(url, params)
+        self.assertEqual(r.status_code, 200)
+        return r
+
+    def test_list(self):
+        # rol yükleme: grup + izin (2) + COUNT + SELECT
+        self.assertConstantQueries(self.client_for(self.manager), self.url, {}, 4)
+
+    def test_list_keyset(self):
+        # rol yükleme: grup + izin (2) + SELECT
+        self.assertConstantQueries(self.client_for(self.manager), self.url, {'pagination': 'cursor'}, 3)
+
+    def test_retrieve(self):
+        tx = Transaction.objects.filter(owner=self.alice).first()
+        # rol yükleme (2) + SELECT
+        self.assertConstantQueries(self.client_for(self.manager), f'{self.url}{tx.pk}/', {}, 3)
+
+    def test_summary(self):
+        self.assertConstantQueries(self.client_for(self.manager), f'{self.url}summary/', {}, 3)
+
+    def test_only_deleted(self):
+        Transaction.objects.filter(owner=self.bob).delete(by=self.admin)
+        # rol yükleme: grup + izin (2) + COUNT + SELECT
+        self.assertConstantQueries(self.client_for(self.admin), self.url, {'only_deleted': '1'}, 4,
+                                   is_active=False, deleted_at=timezone.now())
+
+
+class RoleResolutionTests(LedgerTestCase):
+
+    def test_roles(self):
+        self.assertEqual(resolve_role(self.alice).name, 'User')
+        self.assertEqual(resolve_role(self.manager).name, 'Manager')
+        admin = resolve_role(self.admin)
+        self.assertTrue(admin.is_admin and admin.has_perm('transactions.can_restore_transaction'))
+        self.assertFalse(resolve_role(self.manager).has_perm('transactions.can_restore_transaction'))
+
+    def test_loaded_once_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.manager.pk)
+        with self.assertNumQueries(2):
+            role = get_role(request)
+            self.assertIs(get_role(request), role)
+            self.assertTrue(request.user.has_perm('transactions.can_export_transactions'))
+
+    @override_settings(LEDGER_ROLE_CACHE_TIMEOUT=60)
+    def test_cross_request_cache_invalidated_on_group_change(self):
+        caches['shared'].clear()
+        self.assertEqual(resolve_role(self.alice).name, 'User')
+        with self.assertNumQueries(0):
+            resolve_role(self.alice)
+        self.alice.groups.add(self.manager_group)
+        self.assertEqual(resolve_role(self.alice).name, 'Manager')
+
+    @override_settings(LEDGER_ROLE_CACHE_TIMEOUT=60, CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-roles'}})
+    def test_invalidation_reaches_other_cache_clients(self):
+        self.assertEqual(resolve_role(self.manager).name, 'Manager')
+        # Sinyalsiz üyelik silme (ör. başka süreçte ham SQL): önbellek hâlâ eski rolü verir
+        User.groups.through.objects.filter(user=self.manager).delete()
+        self.assertEqual(resolve_role(self.manager).name, 'Manager')
+        other = caches.create_connection('shared')  # başka bir worker'ın istemcisi
+        old_version = other.get(roles.VERSION_KEY)
+        invalidate_roles()
+        self.assertNotEqual(other.get(roles.VERSION_KEY), old_version)
+        self.assertIsNone(other.get(f'{roles.CACHE_PREFIX}:v{other.get(roles.VERSION_KEY)}:{self.manager.pk}'))
+        self.assertEqual(resolve_role(self.manager).name, 'User')
+
+
+class ExportTests(LedgerTestCase):
+    url = '/api/v1/transactions/export/'
+
+    def test_requires_export_permission(self):
+        r = self.client_for(self.alice).get(self.url)
+        self.assertEqual(r.status_code, 403)
+
+    def test_streams_filtered_csv_and_logs(self):
+        r = self.client_for(self.manager).get(self.url, {'type': 'INCOME'})
+        self.assertEqual(r.status_code, 200)
+        body = b''.join(r.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(body), 3)  # başlık + 2 gelir
+        self.assertTrue(all('Gelir' in line for line in body[1:]))
+        log = AuditLog.objects.get(action=AuditLog.Actions.EXPORT)
+        self.assertEqual(log.metadata['rows'], 2)
+        self.assertEqual(log.metadata['params'], {'type': 'INCOME'})
+
+    def test_xlsx_streams_before_reading_rows(self):
+        r = self.client_for(self.manager).get(self.url, {'file_format': 'xlsx', 'type': 'INCOME'})
+        self.assertEqual(r.status_code, 200)
+        content = iter(r.streaming_content)
+        with self.assertNumQueries(0):
+            first = next(content)
+        self.assertTrue(first.startswith(b'PK'))
+        data = first + b''.join(content)
+        try:
+            import openpyxl
+        except ImportError:
+            self.skipTest('openpyxl is not installed')
+        rows = list(openpyxl.load_workbook(BytesIO(data)).active.values)
+        self.assertEqual(rows[0][0], 'İşlem Tarihi')
+        self.assertEqual(len(rows), 3)  # başlık + 2 gelir
+        self.assertEqual(rows[1][3], 'Gelir')
+        self.assertIsInstance(rows[1][0], datetime)
+
+    def test_xlsx_over_sheet_limit_is_rejected(self):
+        client = self.client_for(self.manager)
+        with mock.patch('transactions.exports.XLSX_MAX_ROWS', 3):  # başlık + 2 satır
+            self.assertEqual(client.get(self.url, {'file_format': 'xlsx', 'type': 'INCOME'}).status_code, 200)
+            r = client.get(self.url, {'file_format': 'xlsx'})
+            self.assertEqual(r.status_code, 400)
+            self.assertIn('csv', r.data['detail'])
+            self.assertEqual(client.get(self.url).status_code, 200)
+        self.assertEqual([column_letter(i) for i in (0, 25, 26, 701, 702)], ['A', 'Z', 'AA', 'ZZ', 'AAA'])
+        with self.assertRaises(ValueError):
+            column_letter(16384)
+
+
+def make_png(size=(640, 480), color=(200, 30, 30)):
+    buf = BytesIO()
+    Image.new('RGB', size, color).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+class ReceiptTestMixin:
+    """Her test sınıfı için geçici MEDIA_ROOT ve fişli işlem oluşturma yardımcısı."""
+    url = '/api/v1/transactions/'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls._media = tempfile.mkdtemp()
+        cls._media_override = override_settings(MEDIA_ROOT=cls._media)
+        cls._media_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._media_override.disable()
+        shutil.rmtree(cls._media, ignore_errors=True)
+        super().tearDownClass()
+
+    def post_receipt(self, data):
+        payload = {
+            'amount': '12.50', 'type': 'EXPENSE', 'payment_method': self.cash.id,
+            'subcategory': self.rent.id, 'transaction_date': timezone.now().isoformat(),
+            'receipt_file': SimpleUploadedFile('fis.png', data, content_type='image/png'),
+        }
+        return self.client_for(self.alice).post(self.url, payload, format='multipart')
+
+
+class ReceiptIngestTests(ReceiptTestMixin, LedgerTestCase):
+
+    def test_upload_is_decoded_once(self):
+        data = make_png()
+        with override_settings(LEDGER_ASYNC_THUMBNAILS=False), \
+                mock.patch('transactions.utils.Image.open', wraps=Image.open) as opened:
+            r = self.post_receipt(data)
+        self.assertEqual(r.status_code, 201, r.data)
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(r.data['receipt_thumbnail_status'], 'ready')
+        tx = Transaction.objects.get(pk=r.data['id'])
+        self.assertTrue(tx.receipt_file.name.endswith(hashlib.sha256(data).hexdigest() + '.png'))
+        self.assertTrue(tx.receipt_thumbnail.name.endswith('.webp'))
+        with tx.receipt_file.open('rb') as fh:
+            self.assertEqual(fh.read(), data)
+
+    def test_rejects_non_image(self):
+        r = self.post_receipt(b'not an image at all')
+        self.assertEqual(r.status_code, 400)
+        self.assertIn('receipt_file', r.data)
+
+    def test_ingest_hashes_in_chunks(self):
+        data = make_png((2000, 2000))
+        upload = SimpleUploadedFile('b.png', data)
+        result = ingest_receipt(upload)
+        self.assertEqual(result.sha256, hashlib.sha256(data).hexdigest())
+        self.assertEqual((result.size, result.image_format, result.ext), (len(data), 'PNG', '.png'))
+        self.assertIs(ingest_receipt(upload), result)
+        result.close()
+
+
+@override_settings(LEDGER_ASYNC_THUMBNAILS=True)
+class ThumbnailJobTests(ReceiptTestMixin, LedgerTestCase):
+
+    def create_with_receipt(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            r = self.post_receipt(data)
+        self.assertEqual(r.status_code, 201, r.data)
+        return r
+
+    def test_create_enqueues_and_worker_completes(self):
+        r = self.create_with_receipt(make_png())
+        self.assertEqual(r.data['receipt_thumbnail_status'], 'pending')
+        self.assertEqual(ReceiptJob.objects.get().status, ReceiptJob.Statuses.PENDING)
+
+        process_jobs(claim_jobs(10))
+        tx = Transaction.objects.get(pk=r.data['id'])
+        self.assertTrue(tx.receipt_thumbnail.name.endswith('.webp'))
+        self.assertEqual(ReceiptJob.objects.get().status, ReceiptJob.Statuses.DONE)
+
+    def test_same_content_is_rendered_once(self):
+        data = make_png()
+        first = self.create_with_receipt(data)
+        process_jobs(claim_jobs(10))
+        second = self.create_with_receipt(data)
+        self.assertEqual(ReceiptJob.objects.count(), 1)
+        with mock.patch('transactions.jobs.render_thumbnail') as render:
+            process_jobs(claim_jobs(10))
+        render.assert_not_called()
+        thumbs = set(Transaction.objects.filter(pk__in=[first.data['id'], second.data['id']])
+                     .values_list('receipt_thumbnail', flat=True))
+        self.assertEqual(len(thumbs), 1)
+
+    def test_thumbnail_for_released_blob_is_discarded(self):
+        r = self.create_with_receipt(make_png(color=(8, 8, 8)))
+        storage = Transaction._meta.get_field('receipt_thumbnail').storage
+
+        def release_then_render(data, width):
+            # İş sürerken fiş silinir: blob ve dosyaları bırakılır
+            with self.captureOnCommitCallbacks(execute=True):
+                Transaction.all_objects.filter(pk=r.data['id']).hard_delete()
+            return render_thumbnail(data, width)
+
+        with mock.patch('transactions.jobs.render_thumbnail', side_effect=release_then_render), \
+                self.captureOnCommitCallbacks(execute=True):
+            process_jobs(claim_jobs(10))
+        self.assertFalse(ReceiptBlob.objects.exists())
+        job = ReceiptJob.objects.get()
+        self.assertEqual(job.status, ReceiptJob.Statuses.DONE)
+        self.assertEqual(list(Path(storage.path('receipts')).rglob(f'{job.content_hash}*')), [])
+
+    def test_failures_are_retried_then_marked_failed(self):
+        self.create_with_receipt(make_png(color=(1, 2, 3)))
+        job = ReceiptJob.objects.get()
+        ReceiptJob.objects.filter(pk=job.pk).update(max_attempts=2)
+        with mock.patch('transactions.jobs.render_thumbnail', side_effect=OSError('boom')), \
+                self.assertLogs('transactions.jobs', 'WARNING'):
+            process_jobs(claim_jobs(10))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.attempts), (ReceiptJob.Statuses.PENDING, 1))
+            ReceiptJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            process_jobs(claim_jobs(10))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReceiptJob.Statuses.FAILED)
+        self.assertIn('boom', job.last_error)
+
+
+@override_settings(LEDGER_ASYNC_THUMBNAILS=False)
+class ReceiptBlobTests(ReceiptTestMixin, LedgerTestCase):
+
+    def test_identical_uploads_share_one_blob(self):
+        data = make_png(color=(9, 9, 9))
+        with self.captureOnCommitCallbacks(execute=True):
+            first = Transaction.objects.get(pk=self.post_receipt(data).data['id'])
+            second = Transaction.objects.get(pk=self.post_receipt(data).data['id'])
+        blob = ReceiptBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(first.receipt_file.name, second.receipt_file.name)
+        self.assertEqual(first.receipt_thumbnail.name, second.receipt_thumbnail.name)
+        storage = first.receipt_file.storage
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete(hard=True)
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(storage.exists(blob.file_name))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Transaction.all_objects.filter(pk=second.pk).delete(hard=True)
+        self.assertFalse(ReceiptBlob.objects.exists())
+        self.assertFalse(storage.exists(blob.file_name))
+        self.assertFalse(storage.exists(blob.thumbnail_name))
+
+    def test_deleting_user_releases_receipt_blobs(self):
+        data = make_png(color=(7, 7, 7))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post_receipt(data)
+        blob = ReceiptBlob.objects.get()
+        storage = Transaction._meta.get_field('receipt_file').storage
+        self.assertTrue(storage.exists(blob.file_name))
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.alice.pk).delete()
+        self.assertFalse(Transaction.all_objects.filter(owner_id=self.alice.pk).exists())
+        self.assertFalse(ReceiptBlob.objects.exists())
+        self.assertFalse(storage.exists(blob.file_name))
+
+    @override_settings(LEDGER_ASYNC_THUMBNAILS=False)
+    def test_replacing_receipt_regenerates_thumbnail(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tx_id = self.post_receipt(make_png(color=(1, 2, 3))).data['id']
+        old = ReceiptBlob.objects.get()
+        # Yeni blob thumbnail'siz oluşur; eski thumbnail'in adı satırda kalmamalı
+        with self.captureOnCommitCallbacks(execute=True):
+            upload = SimpleUploadedFile('yeni.png', make_png(color=(3, 2, 1)), content_type='image/png')
+            r = self.client_for(self.alice).patch(f'{self.url}{tx_id}/', {'receipt_file': upload}, format='multipart')
+        self.assertEqual(r.status_code, 200, r.data)
+        tx = Transaction.objects.get(pk=tx_id)
+        storage = tx.receipt_thumbnail.storage
+        self.assertFalse(ReceiptBlob.objects.filter(pk=old.pk).exists())
+        self.assertFalse(storage.exists(old.thumbnail_name))
+        self.assertNotEqual(tx.receipt_thumbnail.name, old.thumbnail_name)
+        self.assertTrue(storage.exists(tx.receipt_thumbnail.name))
+        self.assertEqual(tx.receipt_blob.thumbnail_name, tx.receipt_thumbnail.name)
+
+    def test_failed_blob_write_closes_ingest_spool(self):
+        ingests = []
+
+        def spy(django_file):
+            ingests.append(ingest_receipt(django_file))
+            return ingests[-1]
+
+        tx = self.make_tx(self.alice, '5.00', 'EXPENSE', self.cash, self.rent, timezone.now())
+        tx.receipt_file = SimpleUploadedFile('fis.png', make_png(), content_type='image/png')
+        with mock.patch('transactions.models.ingest_receipt', side_effect=spy), \
+                mock.patch('transactions.models.ReceiptBlob.acquire', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                tx.save()
+        self.assertTrue(ingests[0].content.closed)
+
+    def test_dedupe_command_backfills_legacy_files(self):
+        data = make_png(color=(4, 5, 6))
+        storage = Transaction._meta.get_field('receipt_file').storage
+        legacy = []
+        for month in ('2024/01', '2024/02'):
+            name = storage.save(f'receipts/{month}/{hashlib.sha256(data).hexdigest()}.png', ContentFile(data))
+            tx = self.make_tx(self.alice, '5.00', 'EXPENSE', self.cash, self.rent, timezone.now())
+            Transaction.all_objects.filter(pk=tx.pk).update(receipt_file=name)
+            legacy.append(name)
+
+        call_command('dedupe_receipts', stdout=StringIO())
+        blob = ReceiptBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        self.assertEqual(Transaction.all_objects.filter(receipt_blob=blob).count(), 2)
+        self.assertTrue(storage.exists(blob.file_name))
+        self.assertFalse(any(storage.exists(n) for n in legacy))
+
+
+class BulkActionTests(LedgerTestCase):
+    url = '/api/v1/transactions/'
+
+    def ids_of(self, user):
+        return list(Transaction.all_objects.filter(owner=user).values_list('id', flat=True))
+
+    def test_owner_cannot_touch_others(self):
+        mine, theirs = self.ids_of(self.alice), self.ids_of(self.bob)
+        r = self.client_for(self.alice).post(self.url + 'bulk-delete/', {'ids': mine + theirs}, format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual((r.data['deleted'], r.data['skipped']), (sorted(mine), sorted(theirs)))
+        self.assertFalse(Transaction.objects.filter(owner=self.alice).exists())
+        self.assertEqual(Transaction.objects.filter(owner=self.bob).count(), 1)
+        self.assertEqual(AuditLog.objects.filter(action=AuditLog.Actions.SOFT_DELETE).count(), len(mine))
+
+    def test_delete_restore_hard_delete_in_constant_queries(self):
+        client = self.client_for(self.admin)
+        noon = timezone.localtime(timezone.now() - timedelta(days=5)).replace(hour=12, minute=0)
+        for i in range(20):  # aynı gün/tür/yöntem/kategori: tek rollup anahtarı
+            self.make_tx(self.alice, '1.00', 'EXPENSE', self.cash, self.rent, noon - timedelta(minutes=i))
+        ids = self.ids_of(self.alice)
+        # rol (2) + SELECT id + UPDATE + bulk INSERT + rollup anahtarı başına UPDATE (4);
+        # geri kalanı savepoint (testte iç içe atomic)
+        with self.assertNumQueries(13):
+            r = client.post(self.url + 'bulk-delete/', {'ids': ids}, format='json')
+        self.assertEqual(len(r.data['deleted']), len(ids))
+
+        r = client.post(self.url + 'bulk-restore/', {'ids': ids}, format='json')
+        self.assertEqual(len(r.data['restored']), len(ids))
+        self.assertEqual(Transaction.objects.filter(owner=self.alice).count(), len(ids))
+
+        r = client.post(self.url + 'bulk-hard-delete/', {'ids': ids}, format='json')
+        self.assertEqual(len(r.data['deleted']), len(ids))
+        self.assertFalse(Transaction.all_objects.filter(id__in=ids).exists())
+
+    def test_permissions(self):
+        ids = self.ids_of(self.alice)
+        manager = self.client_for(self.manager)
+        self.assertEqual(manager.post(self.url + 'bulk-restore/', {'ids': ids}, format='json').status_code, 403)
+        self.assertEqual(manager.post(self.url + 'bulk-hard-delete/', {'ids': ids}, format='json').status_code, 403)
+        self.assertEqual(manager.post(self.url + 'bulk-delete/', {'ids': []}, format='json').status_code, 400)
+
+    def test_queryset_delete_uses_single_update(self):
+        with self.assertNumQueries(7):  # SELECT id + UPDATE + rollup anahtarı başına UPDATE (3) + savepoint (2)
+            count, _ = Transaction.objects.filter(owner=self.alice).delete(by=self.admin)
+        self.assertEqual(count, 3)
+        self.assertEqual(set(Transaction.all_objects.filter(owner=self.alice).values_list('deleted_by', flat=True)),
+                         {self.admin.pk})
+
+
+class ImportTests(LedgerTestCase):
+    url = '/api/v1/transactions/import/'
+
+    def test_json_rows_with_errors(self):
+        rows = [
+            {'amount': '10.00', 'type': 'EXPENSE', 'payment_method': 'Nakit',
+             'subcategory_name': 'Market!', 'transaction_date': '2024-01-05T10:00:00'},
+            {'amount': '-1', 'type': 'EXPENSE', 'payment_method': 'Nakit',
+             'subcategory_name': 'Market', 'transaction_date': '2024-01-05'},
+            {'amount': '20', 'type': 'gelir', 'payment_method': str(self.card.id),
+             'subcategory': str(self.salary.id), 'transaction_date': '2024-01-06'},
+        ]
+        r = self.client_for(self.alice).post(self.url, {'rows': rows}, format='json')
+        self.assertEqual(r.status_code, 201, r.data)
+        self.assertEqual((r.data['created'], r.data['failed']), (2, 1))
+        self.assertEqual(r.data['errors'][0]['row'], 2)
+        self.assertIn('amount', r.data['errors'][0]['errors'])
+        self.assertEqual(Subcategory.objects.filter(normalized_name='market').count(), 1)
+        self.assertEqual(Transaction.objects.filter(owner=self.alice).count(), 5)
+
+    def test_csv_upload_in_batches(self):
+        lines = ['amount,type,payment_method,subcategory_name,description,transaction_date']
+        lines += [f'{i}.50,EXPENSE,Nakit,Fatura {i % 3},satır {i},2024-02-{i % 28 + 1:02d}' for i in range(25)]
+        upload = SimpleUploadedFile('ekstre.csv', '\n'.join(lines).encode('utf-8'), content_type='text/csv')
+        # rol (2) + haritalar (2) + eksik kategoriler (2, bir kez) + parti başına INSERT + audit + savepoint (2)
+        # + rollup: SELECT + INSERT + savepoint (2)
+        with self.assertNumQueries(2 + 2 + 2 + 3 * 8):
+            r = self.client_for(self.alice).post(self.url + '?chunk_size=10', {'file': upload}, format='multipart')
+        self.assertEqual((r.data['created'], r.data['batches']), (25, 3), r.data)
+        self.assertEqual(AuditLog.objects.filter(metadata__import=True).count(), 3)
+        self.assertEqual(Subcategory.objects.filter(name__startswith='Fatura').count(), 3)
+
+    def test_command(self):
+        path = Path(tempfile.mkdtemp()) / 'rows.jsonl'
+        path.write_text('\n'.join([
+            '{"amount": "5", "type": "INCOME", "payment_method": "EFT", "subcategory_name": "Kira", '
+            '"transaction_date": "2024-03-01"}',
+            'bozuk satır',
+        ]), encoding='utf-8')
+        out, err = StringIO(), StringIO()
+        call_command('import_transactions', str(path), '--owner', 'bob@example.com', stdout=out, stderr=err)
+        self.assertIn('1/2 rows imported', out.getvalue())
+        self.assertIn('row 2', err.getvalue())
+        self.assertEqual(Transaction.objects.filter(owner=self.bob, subcategory=self.rent).count(), 1)
+
+
+class SearchTests(LedgerTestCase):
+    url = '/api/v1/transactions/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        now = timezone.now()
+        cls.market = Subcategory.objects.create(name='Market')
+        cls.make_tx(cls.alice, '12.00', 'EXPENSE', cls.cash, cls.market, now - timedelta(hours=5),
+                    description='Haftalık alışveriş')
+        cls.make_tx(cls.alice, '8.00', 'EXPENSE', cls.cash, cls.rent, now - timedelta(hours=4),
+                    description='Market poşeti')
+
+    def ids(self, params):
+        r = self.client_for(self.alice).get(self.url, {'page_size': 100, **params})
+        self.assertEqual(r.status_code, 200)
+        return [x['id'] for x in r.data['results']]
+
+    def test_matches_description_or_subcategory(self):
+        expected = set(Transaction.objects.filter(owner=self.alice).filter(
+            Q(description__icontains='market') | Q(subcategory=self.market)).values_list('id', flat=True))
+        self.assertEqual(len(expected), 2)
+        self.assertEqual(set(self.ids({'search': 'market'})), expected)
+
+    def test_terms_are_anded_and_applied_once(self):
+        self.assertEqual(len(self.ids({'search': 'market poşeti'})), 1)
+        self.assertEqual(self.ids({'search': 'market yok'}), [])
+        client = self.client_for(self.alice)
+        client.get(self.url, {'search': 'kira'})
+        with CaptureQueriesContext(connection) as ctx:
+            client.get(self.url, {'search': 'kira'})
+        select = ctx.captured_queries[-1]['sql']
+        # alt kategori eşleşmesi alt sorgu ile; filtre ikinci kez eklenmez
+        self.assertEqual(select.count(' LIKE '), 2)  # description + alt kategori alt sorgusu
+        self.assertNotIn('INNER JOIN "transactions_subcategory" ON', select.split('WHERE', 1)[1])
+
+    def test_relevance_ordering(self):
+        ids = self.ids({'search': 'market', 'ordering': 'relevance'})
+        first = Transaction.objects.get(pk=ids[0])
+        self.assertEqual(first.description, 'Market poşeti')
+        # keyset modunda sıralama sabit kalır
+        r = self.client_for(self.alice).get(self.url, {'search': 'market', 'ordering': 'relevance',
+                                                       'pagination': 'cursor'})
+        self.assertEqual([x['id'] for x in r.data['results']], sorted(ids, reverse=True))
+
+
+class RollupTests(LedgerTestCase):
+    url = '/api/v1/transactions/'
+
+    def assertConsistent(self):
+        for user in (self.alice, self.bob, self.manager, self.admin):
+            self.assertEqual(diff_owner(user.pk), [], user.username)
+
+    def test_populated_by_save(self):
+        self.assertEqual(DailyRollup.objects.filter(owner=self.alice).aggregate(n=Sum('count'))['n'], 3)
+        self.assertConsistent()
+
+    def test_edits_and_soft_delete_toggles(self):
+        tx = Transaction.objects.filter(owner=self.alice, type='EXPENSE').first()
+        tx.amount = Decimal('75.25')
+        tx.save()
+        tx = Transaction.objects.get(pk=tx.pk)
+        tx.type, tx.subcategory, tx.payment_method = 'INCOME', self.salary, self.card
+        tx.transaction_date -= timedelta(days=40)
+        tx.save()
+        self.assertConsistent()
+        tx.delete(by=self.alice)
+        self.assertConsistent()
+        tx.restore()
+        self.assertConsistent()
+        tx.delete(hard=True)
+        self.assertConsistent()
+        # API güncellemesi (serializer yolu)
+        other = Transaction.objects.filter(owner=self.alice).first()
+        r = self.client_for(self.alice).patch(f'{self.url}{other.pk}/', {'amount': '5.00'}, format='json')
+        self.assertEqual(r.status_code, 200, r.data)
+        self.assertConsistent()
+
+    def test_stale_and_repeated_deletes_apply_once(self):
+        tx = Transaction.objects.filter(owner=self.alice).first()
+        stale = Transaction.objects.get(pk=tx.pk)
+        tx.delete(by=self.alice)
+        stale.delete(by=self.alice)  # yüklendiği andaki is_active=True artık geçersiz
+        # Sıfırın altına inen adet diff_owner'da görünmez (satırlar yok sayılır): toplam da karşılaştırılır
+        self.assertEqual(DailyRollup.objects.filter(owner=self.alice).aggregate(n=Sum('count'))['n'],
+                         Transaction.objects.filter(owner=self.alice).count())
+        self.assertConsistent()
+        stale.restore()
+        tx.restore()
+        self.assertConsistent()
+
+        ids = list(Transaction.objects.filter(owner=self.alice).values_list('id', flat=True))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(sorted(Transaction.all_objects.filter(id__in=ids).soft_delete()), sorted(ids))
+        self.assertEqual(Transaction.all_objects.filter(id__in=ids).soft_delete(), [])
+        self.assertConsistent()
+        self.assertEqual(len(Transaction.all_objects.filter(id__in=ids).restore()), len(ids))
+        self.assertEqual(Transaction.all_objects.filter(id__in=ids).restore(), [])
+        self.assertConsistent()
+        if connection.features.has_select_for_update:
+            self.assertIn('FOR UPDATE', next(q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')))
+
+    def test_bulk_paths(self):
+        qs = Transaction.objects.filter(owner=self.alice)
+        qs.soft_delete(by=self.admin)
+        self.assertFalse(DailyRollup.objects.filter(owner=self.alice, count__gt=0).exists())
+        Transaction.all_objects.filter(owner=self.alice).restore()
+        self.assertConsistent()
+        Transaction.all_objects.filter(owner=self.bob).hard_delete()
+        self.assertConsistent()
+        rows = [{'amount': str(i + 1), 'type': 'EXPENSE', 'payment_method': 'Nakit',
+                 'subcategory_name': f'Yeni {i % 6}', 'transaction_date': f'2024-01-{i % 28 + 1:02d}'}
+                for i in range(30)]
+        for _ in range(2):  # ikinci turda anahtarlar mevcut: toplu upsert yolu
+            r = self.client_for(self.alice).post(f'{self.url}import/', {'rows': rows}, format='json')
+            self.assertEqual(r.data['created'], 30)
+            self.assertConsistent()
+
+    def test_report_reads_rollups(self):
+        now = timezone.now()
+        self.make_tx(self.bob, '20.00', 'EXPENSE', self.cash, self.rent, now.replace(month=1, day=15) - timedelta(days=366))
+        r = self.client_for(self.manager).get(f'{self.url}report/', {'period': 'year'})
+        self.assertEqual(r.status_code, 200)
+        by_year = {x['period']: x for x in r.data['results']}
+        this_year = by_year[str(timezone.localdate(now - timedelta(days=1)).year)]
+        self.assertEqual(sum(x['count'] for x in r.data['results']), 5)
+        self.assertEqual(sum(Decimal(x['income']) for x in r.data['results']), Decimal('1300.00'))
+        self.assertIn('net', this_year)
+        # User rolü yalnız kendi satırlarını görür; owner parametresi yok sayılır
+        r = self.client_for(self.alice).get(f'{self.url}report/', {'period': 'month', 'owner': self.bob.pk})
+        self.assertEqual(sum(x['count'] for x in r.data['results']), 3)
+        r = self.client_for(self.alice).get(f'{self.url}report/', {'period': 'week'})
+        self.assertEqual(r.status_code, 400)
+        with self.assertNumQueries(3):  # rol (2) + tek rollup sorgusu
+            self.client_for(self.manager).get(f'{self.url}report/', {'date_from': '2000-01-01'})
+
+    def test_command_check_and_repair(self):
+        DailyRollup.objects.filter(owner=self.alice).update(total=1)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_rollups', '--check', stdout=StringIO(), stderr=StringIO())
+        out = StringIO()
+        call_command('rebuild_rollups', '--repair', stdout=out, stderr=StringIO())
+        self.assertIn('1 owner(s) repaired', out.getvalue())
+        self.assertConsistent()
+        DailyRollup.objects.all().delete()
+        call_command('rebuild_rollups', '--owner', 'bob', stdout=StringIO())
+        self.assertEqual(DailyRollup.objects.values_list('owner_id', flat=True).distinct().get(), self.bob.pk)
+        call_command('rebuild_rollups', stdout=StringIO())
+        self.assertConsistent()
+
+
+class AuditSinkTests(LedgerTestCase):
+    url = '/api/v1/transactions/'
+
+    def test_unit_of_work_writes_once_and_rolls_back_together(self):
+        with self.assertNumQueries(3):  # savepoint (2) + tek bulk INSERT
+            with audit.unit_of_work():
+                for i in range(5):
+                    audit.record(self.alice, AuditLog.Actions.UPDATE, 'Transaction', i)
+        self.assertEqual(AuditLog.objects.filter(action=AuditLog.Actions.UPDATE).count(), 5)
+
+        with self.assertRaises(ValueError):
+            with audit.unit_of_work():
+                Transaction.objects.filter(owner=self.alice).soft_delete(by=self.alice)
+                audit.record(self.alice, AuditLog.Actions.SOFT_DELETE, 'Transaction', '*')
+                raise ValueError
+        self.assertFalse(AuditLog.objects.filter(action=AuditLog.Actions.SOFT_DELETE).exists())
+        self.assertEqual(Transaction.objects.filter(owner=self.alice).count(), 3)
+
+    @override_settings(LEDGER_AUDIT_MODE='direct')
+    def test_direct_mode_inserts_immediately(self):
+        with audit.unit_of_work():
+            audit.record(self.alice, AuditLog.Actions.UPDATE, 'Transaction', 1)
+            self.assertTrue(AuditLog.objects.filter(action=AuditLog.Actions.UPDATE).exists())
+        r = self.client_for(self.alice).post(self.url, {
+            'amount': '5.00', 'type': 'EXPENSE', 'payment_method': self.cash.id,
+            'subcategory': self.rent.id, 'transaction_date': (timezone.now() - timedelta(hours=1)).isoformat()})
+        self.assertEqual(r.status_code, 201, r.data)
+        self.assertTrue(AuditLog.objects.filter(action=AuditLog.Actions.CREATE, object_id=str(r.data['id'])).exists())
+
+    def test_request_buffer_flushes_at_end_of_request(self):
+        client = APIClient()
+        self.assertTrue(client.login(username='alice', password='pw'))
+        self.assertTrue(AuditLog.objects.filter(action=AuditLog.Actions.LOGIN, actor=self.alice).exists())
+        r = client.post('/api/v1/export-log/', {'format': 'pdf'}, format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(AuditLog.objects.filter(action=AuditLog.Actions.EXPORT, actor=self.alice).exists())
+
+    @override_settings(LEDGER_AUDIT_MODE='background')
+    def test_removed_background_mode_falls_back_to_batched(self):
+        self.assertEqual(audit.audit_mode(), 'batched')
+        with self.assertRaises(ValueError):
+            with audit.unit_of_work():
+                audit.record(self.alice, AuditLog.Actions.UPDATE, 'Transaction', 1)
+                raise ValueError
+        self.assertFalse(AuditLog.objects.filter(action=AuditLog.Actions.UPDATE).exists())
+
+
+class AuditLogRetentionTests(LedgerTestCase):
+    def setUp(self):
+        self.out_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.out_dir, ignore_errors=True)
+        old = [audit.entry(self.alice, AuditLog.Actions.UPDATE, 'Transaction', i, {'note': 'eski'}) for i in range(5)]
+        AuditLog.objects.bulk_create(old)
+        AuditLog.objects.filter(id__in=[e.id for e in old]).update(timestamp=timezone.now() - timedelta(days=400))
+        self.recent = AuditLog.objects.create(actor=self.alice, action=AuditLog.Actions.UPDATE,
+                                              object_type='Transaction', object_id='99')
+
+    def test_archive_moves_old_rows_to_gzip_in_batches(self):
+        call_command('archive_auditlog', days=365, output_dir=self.out_dir, batch_size=2, stdout=StringIO())
+        self.assertEqual(list(AuditLog.objects.filter(action=AuditLog.Actions.UPDATE)), [self.recent])
+        files = list(Path(self.out_dir).glob('auditlog-*.jsonl.gz'))
+        self.assertEqual(len(files), 1)
+        with gzip.open(files[0], 'rt', encoding='utf-8') as fh:
+            rows = [json.loads(line) for line in fh]
+        self.assertEqual(sorted(r['object_id'] for r in rows), ['0', '1', '2', '3', '4'])
+        self.assertEqual(rows[0]['metadata'], {'note': 'eski'})
+
+    def test_partitioned_archive_deletes_rows_outside_dropped_partitions(self):
+        old = list(AuditLog.objects.filter(action=AuditLog.Actions.UPDATE).exclude(pk=self.recent.pk).order_by('id'))
+        in_partition = timezone.now() - timedelta(days=500)
+        AuditLog.objects.filter(pk__in=[e.pk for e in old[:2]]).update(timestamp=in_partition)
+        day = in_partition.date()
+        partition = ('transactions_auditlog_p', date(day.year, day.month, 1), add_months(day, 1))
+        module = 'transactions.management.commands.archive_auditlog'
+        with mock.patch(f'{module}.is_partitioned', return_value=True), \
+                mock.patch(f'{module}.partitions_before', return_value=[partition]), \
+                mock.patch(f'{module}.drop_partitions_before', return_value=[partition[0]]) as drop:
+            call_command('archive_auditlog', days=365, output_dir=self.out_dir, batch_size=2, stdout=StringIO())
+        drop.assert_called_once()
+        # Bölümü DROP edilen satırlar tek tek silinmez; DEFAULT bölümdekiler (kalan 3 eski satır) silinir
+        remaining = set(AuditLog.objects.filter(action=AuditLog.Actions.UPDATE).values_list('pk', flat=True))
+        self.assertEqual(remaining, {old[0].pk, old[1].pk, self.recent.pk})
+
+    def test_dry_run_keeps_rows(self):
+        out = StringIO()
+        call_command('archive_auditlog', days=365, output_dir=self.out_dir, dry_run=True, stdout=out)
+        self.assertIn('5 audit log row(s)', out.getvalue())
+        self.assertEqual(AuditLog.objects.filter(action=AuditLog.Actions.UPDATE).count(), 6)
+        self.assertEqual(list(Path(self.out_dir).iterdir()), [])
+
+    def test_admin_search_skips_metadata_unless_prefixed(self):
+        superuser = User.objects.create_superuser('root', 'root@example.com', 'pw')
+        self.client.force_login(superuser)
+        r = self.client.get('/admin/transactions/auditlog/', {'q': 'eski'})
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.context['cl'].result_count, 0)
+        r = self.client.get('/admin/transactions/auditlog/', {'q': 'metadata:eski'})
+        self.assertEqual(r.context['cl'].result_count, 5)
+
+    def test_ensure_partitions_requires_postgres(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest('SQLite/MySQL davranışı')
+        with self.assertRaises(CommandError):
+            call_command('ensure_partitions', stdout=StringIO())
+
+    def test_ensure_partitions_validates_arguments(self):
+        with self.assertRaises(CommandError):
+            call_command('ensure_partitions', 'nope', stdout=StringIO())
+        with self.assertRaisesMessage(CommandError, 'Invalid date'):
+            call_command('ensure_partitions', 'transaction', '--detach-before', '2024-13-01', stdout=StringIO())
+
+    def test_monthly_and_yearly_partition_names(self):
+        self.assertEqual(partition_name('transactions_transaction', date(2024, 3, 1)), 'transactions_transaction_p202403')
+        start = period_start(date(2024, 3, 9), 12)
+        self.assertEqual(start, date(2024, 1, 1))
+        self.assertEqual(partition_name('transactions_transaction', start, 12), 'transactions_transaction_p2024')
+        self.assertEqual(add_months(start, 12), date(2025, 1, 1))
+
+    def test_ensure_partitions_moves_rows_out_of_default(self):
+        # Üretilen SQL sırası izlenir. Mart ve Mayıs'ın satırları DEFAULT'ta, Nisan boş
+        statements = []
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                return False
+
+            def execute(self, sql, params=None):
+                statements.append((sql.split(' WHERE ')[0], list(params or ())))
+
+            def fetchone(self):
+                return (statements[-1][1] in (['2024-03-01', '2024-04-01'], ['2024-05-01', '2024-06-01']),)
+
+        conn = mock.Mock(vendor='postgresql', cursor=Cursor)
+        conn.ops.quote_name = lambda name: f'"{name}"'
+        table = 'transactions_transaction'
+        with mock.patch('transactions.partitions._connection', return_value=conn), \
+                mock.patch('transactions.partitions.list_partitions', return_value=[(f'{table}_default', None, None)]):
+            created = ensure_monthly_partitions(table, date(2024, 3, 1), date(2024, 6, 1))
+        self.assertEqual(created, [f'{table}_p202403', f'{table}_p202404', f'{table}_p202405'])
+        # Satır kontrolü kilitlerden önce; DEFAULT tüm sıkışmış aylar için bir kez ayrılıp bağlanır
+        self.assertEqual([sql.split(' (')[0] for sql, _ in statements], [
+            'SELECT EXISTS', 'SELECT EXISTS', 'SELECT EXISTS',
+            f'CREATE TABLE IF NOT EXISTS "{table}_p202404" PARTITION OF "{table}" FOR VALUES FROM',
+            f'ALTER TABLE "{table}" DETACH PARTITION "{table}_default"',
+            f'CREATE TABLE IF NOT EXISTS "{table}_p202403" PARTITION OF "{table}" FOR VALUES FROM',
+            f'CREATE TABLE IF NOT EXISTS "{table}_p202405" PARTITION OF "{table}" FOR VALUES FROM',
+            f'INSERT INTO "{table}" OVERRIDING SYSTEM VALUE SELECT * FROM "{table}_default"',
+            f'DELETE FROM "{table}_default"',
+            f'ALTER TABLE "{table}" ATTACH PARTITION "{table}_default" DEFAULT',
+        ])
+        self.assertEqual(statements[-2][1], ['2024-03-01', '2024-04-01', '2024-05-01', '2024-06-01'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'PostgreSQL gerekir')
+    def test_ensure_partitions_moves_default_rows_on_postgres(self):
+        table = AuditLog._meta.db_table
+        convert_to_partitioned(AuditLog, 'timestamp', months_ahead=0)
+        future = timezone.now() + timedelta(days=400)
+        month = date(future.year, future.month, 1)
+        AuditLog.objects.filter(pk=self.recent.pk).update(timestamp=future)  # bölüm yok: DEFAULT'a düşer
+        self.assertEqual(ensure_monthly_partitions(table, month, add_months(month, 1)), [partition_name(table, month)])
+        with connection.cursor() as cur:
+            cur.execute(f'SELECT tableoid::regclass::text FROM {table} WHERE id = %s', [self.recent.pk])
+            self.assertEqual(cur.fetchall(), [(partition_name(table, month),)])
+        self.assertEqual(AuditLog.objects.get(pk=self.recent.pk).object_id, '99')
+
+
+class SharedCacheLayoutTests(TestCase):
+    def test_session_cache_is_separate_from_shared_cache(self):
+        # Oturum deposunun temizlenmesi/cull'u sürüm sayaçlarını düşürmemeli
+        caches['shared'].set('layout-probe', 1, None)
+        self.addCleanup(caches['shared'].delete, 'layout-probe')
+        caches['sessions'].clear()
+        self.assertEqual(caches['shared'].get('layout-probe'), 1)
+        self.assertNotEqual(settings.CACHES['sessions'].get('LOCATION'), settings.CACHES['shared'].get('LOCATION'))
+
+
+@override_settings(
+    SESSION_ENGINE='transactions.sessions', LEDGER_SESSION_REFRESH_THRESHOLD=1500,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-sessions'},
+            'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-shared'}})
+class LowWriteSessionTests(LedgerTestCase):
+    url = '/api/v1/transactions/'
+
+    def session_queries(self, n=10):
+        with CaptureQueriesContext(connection) as ctx:
+            for _ in range(n):
+                self.assertEqual(self.client.get(self.url).status_code, 200)
+        return [q['sql'] for q in ctx.captured_queries if 'django_session' in q['sql']]
+
+    def test_requests_do_not_touch_session_table(self):
+        self.assertTrue(self.client.login(username='alice', password='pw'))
+        self.assertEqual(self.session_queries(), [])
+
+    def test_row_refreshed_when_remaining_lifetime_low(self):
+        self.assertTrue(self.client.login(username='alice', password='pw'))
+        store, key = caches['sessions'], SessionStore.cache_key_prefix + self.client.session.session_key
+        # DB satırının kalan ömrü eşiğin altında: yalnız ilk istek yazar
+        data = store.get(key)
+        data[PERSISTED_UNTIL_KEY] = int(time.time()) + 1000
+        store.set(key, data, 1800)
+        writes = self.session_queries(3)
+        self.assertEqual(len([sql for sql in writes if sql.startswith('UPDATE')]), 1)
+        # Kayan süre cache'te: her istek kaydın ömrünü SESSION_COOKIE_AGE'e tamamlar
+        expires = store._expire_info[store.make_and_validate_key(key)]
+        self.assertAlmostEqual(expires - time.time(), 1800, delta=5)
+
+    def test_cache_loss_falls_back_to_db_and_logout_still_works(self):
+        self.assertTrue(self.client.login(username='alice', password='pw'))
+        caches['sessions'].clear()
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.client.logout()
+        self.assertIn(self.client.get(self.url).status_code, (401, 403))
+
+
+class TokenAuthTests(LedgerTestCase):
+    url = '/api/v1/transactions/'
+
+    def setUp(self):
+        caches['shared'].clear()  # token kullanıcı/rol önbelleği testler arası taşınmasın
+
+    def token_for(self, email='alice@example.com', password='pw'):
+        return APIClient().post('/api/v1/auth/token/', {'email': email, 'password': password}, format='json')
+
+    def test_login_is_a_single_user_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(authenticate(None, username='ALICE', password='pw'), self.alice)
+        self.assertEqual(len([q for q in ctx.captured_queries if 'auth_user' in q['sql']]), 1)
+        self.assertEqual(authenticate(None, email='Alice@Example.com', password='pw'), self.alice)
+        self.assertIsNone(authenticate(None, email='alice', password='wrong'))
+
+    @override_settings(LEDGER_ROLE_CACHE_TIMEOUT=60)
+    def test_token_authenticates_without_session_or_db_on_hot_path(self):
+        r = self.token_for()
+        self.assertEqual(r.status_code, 200)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {r.data['token']}")
+        self.assertEqual(client.get(self.url).status_code, 200)
+        with CaptureQueriesContext(connection) as ctx:
+            r2 = client.get(self.url)
+        self.assertEqual(r2.data['count'], 3)
+        sql = ' '.join(q['sql'] for q in ctx.captured_queries)
+        self.assertNotIn('auth_user', sql.split('FROM "transactions_transaction"')[0])
+        self.assertNotIn('django_session', sql)
+        self.assertNotIn('auth_group', sql)
+        self.assertNotIn('sessionid', r2.cookies)
+
+    def test_invalid_and_revoked_tokens_are_rejected(self):
+        self.assertEqual(self.token_for(password='wrong').status_code, 401)
+        token = self.token_for().data['token']
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}x')
+        self.assertEqual(client.get(self.url).status_code, 403)
+        self.alice.set_password('new-pw')
+        self.alice.save()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(client.get(self.url).status_code, 403)
+        with override_settings(LEDGER_API_TOKEN_MAX_AGE=-1):
+            token = self.token_for(password='new-pw').data['token']
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            self.assertEqual(client.get(self.url).status_code, 403)
+
+    def test_revocation_reaches_other_cache_clients(self):
+        token = self.token_for().data['token']
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(client.get(self.url).status_code, 200)
+        other = caches.create_connection('shared')  # başka bir worker'ın istemcisi
+        self.assertIsNotNone(other.get(f'ledger:token-user:{self.alice.pk}'))
+        self.alice.is_active = False
+        self.alice.save()
+        self.assertIsNone(other.get(f'ledger:token-user:{self.alice.pk}'))
+        self.assertEqual(client.get(self.url).status_code, 403)
+
+    def test_cached_token_user_holds_no_secrets_and_follows_password_changes(self):
+        token = self.token_for().data['token']
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(client.get(self.url).status_code, 200)
+        key = f'ledger:token-user:{self.alice.pk}'
+        cached = caches.create_connection('shared').get(key)
+        self.assertEqual(set(cached), {'pk', 'h', 'username', 'is_active', 'is_staff', 'is_superuser'})
+        self.assertNotIn(self.alice.password, repr(cached))
+        self.assertNotIn(self.alice.email, repr(cached))
+        # Yalnız şifre alanı kaydedilse de (update_fields) önbellek düşer
+        self.alice.set_password('new-pw')
+        self.alice.save(update_fields=['password'])
+        self.assertIsNone(caches['shared'].get(key))
+        self.assertEqual(client.get(self.url).status_code, 403)
+
+    def test_role_cache_off_means_fresh_role_per_token_request(self):
+        token = self.token_for(email='manager@example.com').data['token']
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        all_rows = Transaction.objects.count()
+        self.assertEqual(client.get(self.url).data['count'], all_rows)
+        # Sinyalsiz üyelik silme: LEDGER_ROLE_CACHE_TIMEOUT=0 iken bir sonraki istek yeni rolü görür
+        User.groups.through.objects.filter(user=self.manager).delete()
+        self.assertEqual(client.get(self.url).data['count'], 0)
+
+
+class ReceiptDeliveryTests(ReceiptTestMixin, LedgerTestCase):
+
+    def setUp(self):
+        self.data = make_png((300, 200))
+        with override_settings(LEDGER_ASYNC_THUMBNAILS=False):
+            r = self.post_receipt(self.data)
+        self.assertEqual(r.status_code, 201, r.data)
+        self.receipt_url = f"{self.url}{r.data['id']}/receipt/"
+        self.client = self.client_for(self.alice)
+
+    def body(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_etag_and_conditional_get(self):
+        r = self.client.get(self.receipt_url)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r['ETag'], f'"{hashlib.sha256(self.data).hexdigest()}.png"')
+        self.assertIn('immutable', r['Cache-Control'])
+        self.assertEqual(self.body(r), self.data)
+        r2 = self.client.get(self.receipt_url, HTTP_IF_NONE_MATCH=r['ETag'])
+        self.assertEqual(r2.status_code, 304)
+        thumb = self.client.get(self.receipt_url.replace('/receipt/', '/thumbnail/'))
+        self.assertEqual((thumb.status_code, thumb['Content-Type']), (200, 'image/webp'))
+        self.assertNotEqual(thumb['ETag'], r['ETag'])
+        self.assertEqual(self.client_for(self.bob).get(self.receipt_url).status_code, 404)
+
+    def test_range_requests(self):
+        r = self.client.get(self.receipt_url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(r.status_code, 206)
+        self.assertEqual(r['Content-Range'], f'bytes 10-19/{len(self.data)}')
+        self.assertEqual(self.body(r), self.data[10:20])
+        self.assertEqual(self.body(self.client.get(self.receipt_url, HTTP_RANGE='bytes=-5')), self.data[-5:])
+        self.assertEqual(self.client.get(self.receipt_url, HTTP_RANGE=f'bytes={len(self.data)}-').status_code, 416)
+        stale = self.client.get(self.receipt_url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+        self.assertEqual(stale.status_code, 200)
+
+    def test_empty_file_ranges_are_unsatisfiable(self):
+        for header in ('bytes=-5', 'bytes=0-', 'bytes=0-0'):
+            with self.assertRaises(ValueError):
+                parse_range(header, 0)
+        self.assertIsNone(parse_range('', 0))
+
+    def test_content_disposition_quotes_upload_names(self):
+        self.assertEqual(_content_disposition('fis "x".png', True), 'attachment; filename="fis \\"x\\".png"')
+        self.assertEqual(_content_disposition('fiş.png', False), "inline; filename*=utf-8''fi%C5%9F.png")
+        self.assertEqual(_content_disposition(None, False), 'inline')
+
+    @override_settings(LEDGER_FILE_OFFLOAD='accel', LEDGER_FILE_ACCEL_PREFIX='/protected-media/')
+    def test_accel_redirect_offload(self):
+        r = self.client.get(self.receipt_url)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r['X-Accel-Redirect'].startswith('/protected-media/receipts/'))
+        self.assertEqual(r.content, b'')
+        self.assertIn('attachment', r['Content-Disposition'])
+
+
+class ReceiptRenditionTests(ReceiptTestMixin, LedgerTestCase):
+
+    def setUp(self):
+        self.data = make_png((900, 600))
+        r = self.post_receipt(self.data)
+        self.assertEqual(r.status_code, 201, r.data)
+        self.rendition_url = r.data['receipt_rendition_url']
+        self.client = self.client_for(self.alice)
+
+    def fetch(self, **params):
+        return self.client.get(self.rendition_url, params)
+
+    def test_whitelisted_sizes_are_generated_once_and_cached(self):
+        with mock.patch('transactions.renditions.render_rendition', wraps=render_rendition) as render:
+            first = self.fetch(w=160)
+            second = self.fetch(w=160)
+            jpeg = self.fetch(w=640, fmt='jpeg')
+        self.assertEqual((first.status_code, second.status_code, jpeg.status_code), (200, 200, 200))
+        self.assertEqual(render.call_count, 2)
+        img = Image.open(BytesIO(b''.join(first.streaming_content)))
+        self.assertEqual((img.format, img.size), ('WEBP', (160, 107)))
+        self.assertEqual(Image.open(BytesIO(b''.join(jpeg.streaming_content))).format, 'JPEG')
+        self.assertTrue(first['ETag'].endswith('-w160.webp"'))
+        self.assertEqual(self.client.get(self.rendition_url, {'w': 160}, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self.fetch(w=500).status_code, 400)
+        self.assertEqual(self.fetch(fmt='gif').status_code, 400)
+        self.assertEqual(self.client_for(self.bob).get(self.rendition_url, {'w': 160}).status_code, 404)
+
+    def test_lru_eviction_and_single_render_under_concurrency(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        cache = RenditionCache(root, max_bytes=250)
+        calls = []
+
+        def render():
+            calls.append(1)
+            time.sleep(0.05)
+            return b'x' * 100
+
+        threads = [threading.Thread(target=cache.get_or_create, args=('a' * 64, 160, 'webp', render))
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(calls), 1)
+        old = cache.path_for('a' * 64, 160, 'webp')
+        os.utime(old, (1, 1))
+        cache.get_or_create('b' * 64, 160, 'webp', lambda: b'y' * 100)
+        cache.get_or_create('c' * 64, 160, 'webp', lambda: b'z' * 100)
+        self.assertFalse(old.exists())
+        self.assertTrue(cache.path_for('c' * 64, 160, 'webp').exists())
+        # Kilit dosyası kalır: başka bir süreç eski inode'u kilitli tutuyor olabilir
+        self.assertTrue(Path(f'{old}.lock').exists())
+
+    def test_size_limit_counts_other_workers_writes(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        worker_a, worker_b = RenditionCache(root, max_bytes=250), RenditionCache(root, max_bytes=250)
+        worker_a.get_or_create('a' * 64, 160, 'webp', lambda: b'x' * 100)
+        worker_b.get_or_create('b' * 64, 160, 'webp', lambda: b'y' * 100)
+        os.utime(worker_a.path_for('a' * 64, 160, 'webp'), (1, 1))
+        with mock.patch('transactions.renditions.RESCAN_INTERVAL', 0):
+            worker_a.get_or_create('c' * 64, 160, 'webp', lambda: b'z' * 100)
+        self.assertFalse(worker_a.path_for('a' * 64, 160, 'webp').exists())
+        self.assertLessEqual(sum(size for _, size, _ in worker_a._entries()), 250)
+
+    def test_rendition_evicted_before_serving_is_regenerated(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        evicted = []
+
+        def evicting_get_rendition(*args):
+            cached = get_rendition(*args)
+            if not evicted:
+                # Başka worker'ın temizliği: yol döndükten sonra dosya silinir
+                evicted.append(cached.storage.path(cached.name))
+                os.remove(evicted[0])
+            return cached
+
+        with override_settings(LEDGER_RENDITION_CACHE_DIR=root), \
+                mock.patch('transactions.views.get_rendition', side_effect=evicting_get_rendition):
+            r = self.fetch(w=160)
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(Image.open(BytesIO(b''.join(r.streaming_content))).size, (160, 107))
+        self.assertTrue(os.path.exists(evicted[0]))
+
+
+@override_settings(LEDGER_REFDATA_CACHE_ALIAS='default')
+class RefdataCacheTests(LedgerTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client = self.client_for(self.alice)
+
+    def test_list_is_cached_until_a_write_bumps_the_version(self):
+        r1 = self.client.get('/api/v1/subcategories/')
+        self.assertEqual(r1.status_code, 200)
+        with self.assertNumQueries(0):
+            r2 = self.client.get('/api/v1/subcategories/')
+        self.assertEqual((r2.data, r2['ETag']), (r1.data, r1['ETag']))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/v1/subcategories/', HTTP_IF_NONE_MATCH=r1['ETag']).status_code, 304)
+
+        # Yeni işlemle isimden otomatik oluşturulan alt kategori de sürümü artırır
+        r = self.client.post('/api/v1/transactions/', {
+            'amount': '5.00', 'type': 'EXPENSE', 'payment_method': self.cash.id,
+            'subcategory': self.rent.id, 'subcategory_name': 'Market',
+            'transaction_date': (timezone.now() - timedelta(hours=1)).isoformat()}, format='json')
+        self.assertEqual(r.status_code, 201, r.data)
+        r3 = self.client.get('/api/v1/subcategories/', HTTP_IF_NONE_MATCH=r1['ETag'])
+        self.assertEqual(r3.status_code, 200)
+        self.assertIn('Market', [row['name'] for row in r3.data['results']])
+
+    def test_payment_method_admin_edit_invalidates(self):
+        etag = self.client.get('/api/v1/payment-methods/')['ETag']
+        self.cash.name = 'Nakit (TL)'
+        self.cash.save()
+        r = self.client.get('/api/v1/payment-methods/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertIn('Nakit (TL)', [row['name'] for row in r.data['results']])
+
+    def test_lost_version_counter_does_not_revive_old_entries(self):
+        etag = self.client.get('/api/v1/payment-methods/')['ETag']
+        first = refdata.get_version('payment-methods')
+        # Cull/yeniden başlatma: sayaç kaybolur, eski sürümün girdileri cache'te kalır
+        cache.delete(refdata._version_key('payment-methods'))
+        r = self.client.get('/api/v1/payment-methods/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertGreater(refdata.get_version('payment-methods'), first)
+
+        seeded = refdata.get_version('subcategories')
+        cache.delete(refdata._version_key('subcategories'))
+        refdata._bump('subcategories')
+        self.assertGreater(refdata.get_version('subcategories'), seeded)
+
+    def test_pages_inline_reference_data(self):
+        self.client.force_login(self.alice)
+        r = self.client.get('/transactions/new/')
+        self.assertContains(r, 'id="ledger-refdata"')
+        self.assertEqual(r.context['refdata']['subcategories'][0]['name'], 'Kira')
+        with override_settings(LEDGER_INLINE_REFDATA=False):
+            self.assertNotContains(self.client.get('/transactions/'), 'ledger-refdata')
+
+
+class SeedBenchmarkTests(ReceiptTestMixin, LedgerTestCase):
+    def seed(self, **options):
+        options = {'users': 6, 'transactions': 300, 'chunk_size': 120, 'workers': 1, 'receipts': 0.2,
+                   'receipt_variants': 2, 'days': 60, **options}
+        call_command('seed_ledger', stdout=StringIO(), **options)
+        return User.objects.filter(username__startswith='seed-')
+
+    def test_seed_creates_roles_rows_and_consistent_rollups(self):
+        users = self.seed()
+        self.assertEqual(users.count(), 6)
+        self.assertEqual(users.filter(groups__name='Admin').count(), 1)
+        self.assertEqual(users.filter(groups__name='User').count(), 4)
+        txs = Transaction.all_objects.filter(owner__in=users)
+        self.assertEqual(txs.count(), 302)  # + fiş görüntüsü başına bir işlem
+        # Fiş referansları blob sayaçlarıyla tutarlı
+        for blob in ReceiptBlob.objects.all():
+            self.assertEqual(blob.ref_count, txs.filter(receipt_blob=blob).count())
+        self.assertGreater(txs.filter(type='EXPENSE').count(), txs.filter(type='INCOME').count())
+        for user in users:
+            self.assertEqual(diff_owner(user.pk), [])
+
+        self.seed(clear=True, transactions=100, receipts=0)
+        self.assertEqual(Transaction.all_objects.filter(owner__in=users).count(), 100)
+        self.assertEqual(sum(ReceiptBlob.objects.values_list('ref_count', flat=True)), 0)
+
+    def test_bench_writes_json_and_cleans_up(self):
+        owner = self.seed().first()
+        before = Transaction.all_objects.count()
+        path = Path(self._media) / 'bench.json'
+        call_command('bench_ledger', owner=owner.username, iterations=3, warmup=0, memory_iterations=1,
+                     output=str(path), stdout=StringIO())
+        report = json.loads(path.read_text(encoding='utf-8'))
+        self.assertEqual(set(report['results']), {'list', 'filter', 'search', 'create_receipt',
+                                                  'receipt_download', 'bulk'})
+        self.assertEqual(report['results']['create_receipt']['n'], 3)
+        self.assertIn('p99_ms', report['results']['list'])
+        self.assertGreater(report['results']['bulk']['queries_max'], 0)
+        self.assertEqual(report['meta']['vendor'], connection.vendor)
+        self.assertEqual(Transaction.all_objects.count(), before)
+        self.assertFalse(Transaction.all_objects.filter(owner=owner, is_active=False).exists())
+
+        out = StringIO()
+        call_command('bench_ledger', owner=owner.username, iterations=3, warmup=0, memory_iterations=0,
+                     paths='list', compare=str(path), stdout=out)
+        self.assertIn('list              p50_ms', out.getvalue())
+
+    def test_bench_cleanup_keeps_real_audit_rows_and_restores_bulk_ids(self):
+        owner = self.seed().first()
+        bench = LedgerBenchmark(owner, iterations=2, warmup=0, memory_iterations=0)
+        # Ölçüm sürerken aynı kullanıcının gerçek bir isteği
+        real = AuditLog.objects.create(actor=owner, action=AuditLog.Actions.EXPORT, object_type='Transaction')
+        bench.run(['list', 'bulk'])
+        self.assertTrue(AuditLog.objects.filter(pk=real.pk).exists())
+        self.assertFalse(AuditLog.objects.filter(metadata__has_key=AUDIT_TAG).exists())
+
+        # Tur ortasında kesilen bulk: silinenler cleanup'ta geri yüklenir
+        bench.path_bulk()(0)
+        self.assertTrue(Transaction.all_objects.filter(owner=owner, is_active=False).exists())
+        bench.cleanup()
+        self.assertFalse(Transaction.all_objects.filter(owner=owner, is_active=False).exists())
+
+
+class ServerTimingTests(ReceiptTestMixin, LedgerTestCase):
+    def test_disabled_by_default(self):
+        r = self.client_for(self.alice).get(self.url)
+        self.assertEqual(r.status_code, 200)
+        self.assertFalse(r.has_header('Server-Timing'))
+
+    @override_settings(LEDGER_REQUEST_TIMING=True, LEDGER_ASYNC_THUMBNAILS=False)
+    def test_header_reports_sql_and_spans(self):
+        client = self.client_for(self.alice)
+        timing = client.get(self.url)['Server-Timing']
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries"')
+        for name in ('auth', 'perm', 'ser', 'total'):
+            self.assertIn(f'{name};dur=', timing)
+
+        r = self.post_receipt(make_png())
+        self.assertEqual(r.status_code, 201)
+        self.assertIn('receipt;dur=', r['Server-Timing'])
+
+    @override_settings(LEDGER_REQUEST_TIMING=True, LEDGER_SLOW_REQUEST_MS=10 ** 6, LEDGER_SLOW_REQUEST_QUERIES=1)
+    def test_slow_request_log_is_structured(self):
+        with self.assertLogs('ledger.slow_requests', 'WARNING') as logs:
+            self.client_for(self.alice).get(self.url)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['event'], record['path'], record['status']), ('slow_request', self.url, 200))
+        self.assertGreaterEqual(record['queries'], 1)
+        self.assertIn('perm', record['spans'])
+
+    def test_repeated_sql_fingerprints(self):
+        profile = RequestProfile()
+        execute = lambda sql, params, many, context: None
+        for pk in (1, 2, 3):
+            profile.execute_wrapper(execute, f'SELECT * FROM t WHERE id = {pk}', None, False, {})
+        profile.execute_wrapper(execute, 'SELECT * FROM t WHERE id IN (%s, %s)', (1, 2), False, {})
+        self.assertEqual(fingerprint('SELECT  a FROM t WHERE b IN (%s,%s, %s) AND c = \'x\''),
+                         'SELECT a FROM t WHERE b IN (...) AND c = ?')
+        self.assertEqual([(r['sql'], r['count']) for r in profile.repeated()], [('SELECT * FROM t WHERE id = ?', 3)])
+        self.assertEqual(profile.queries, 4)
+
+
+class MetricsTests(ReceiptTestMixin, LedgerTestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        self.addCleanup(metrics.registry.reset)
+        self.staff = User.objects.create_user('ops', 'ops@example.com', 'pw', is_staff=True)
+
+    def scrape(self, **extra):
+        self.client.force_login(self.staff)
+        r = self.client.get('/metrics', **extra)
+        self.assertEqual(r.status_code, 200)
+        self.assertTrue(r['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return r.content.decode()
+
+    def test_http_requests_are_counted_per_action_and_status(self):
+        client = self.client_for(self.alice)
+        client.get(self.url)
+        client.get(self.url)
+        client.get(f'{self.url}999999/')
+        text = self.scrape()
+        self.assertIn('ledger_http_requests_total{action="list",method="GET",status="200",'
+                      'view="transactions-transaction-list"} 2', text)
+        self.assertIn('ledger_http_requests_total{action="retrieve",method="GET",status="404",'
+                      'view="transactions-transaction-detail"} 1', text)
+        self.assertIn('ledger_http_request_duration_seconds_bucket{action="list",method="GET",'
+                      'view="transactions-transaction-list",le="+Inf"} 2', text)
+        self.assertNotIn('view="metrics"', text)
+
+    @override_settings(LEDGER_ASYNC_THUMBNAILS=True)
+    def test_receipt_audit_and_job_metrics(self):
+        data = make_png()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.post_receipt(data).status_code, 201)
+        process_jobs(claim_jobs(10))
+        text = self.scrape()
+        self.assertIn('ledger_receipts_ingested_total{format="PNG"} 1', text)
+        self.assertIn(f'ledger_receipt_bytes_ingested_total {len(data)}', text)
+        # CREATE + staff girişinin LOGIN kaydı
+        self.assertIn('ledger_audit_entries_written_total{mode="batched"} 2', text)
+        self.assertIn('ledger_thumbnail_duration_seconds_count{source="worker"} 1', text)
+        self.assertIn('ledger_job_duration_seconds_count{kind="THUMBNAIL",result="done"} 1', text)
+
+    def test_access_requires_staff_or_token(self):
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.client.logout()
+        with override_settings(LEDGER_METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer s3cret').status_code, 200)
+        with override_settings(LEDGER_METRICS=False):
+            self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    def test_worker_files_are_aggregated(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        other = {'counters': [['ledger_receipt_bytes_ingested_total', [], 100]],
+                 'histograms': [['ledger_thumbnail_duration_seconds', [['source', 'inline']],
+                                 [1] + [0] * 10, 0.004, 1]]}
+        Path(directory, 'metrics-1234-1.json').write_text(json.dumps(other), encoding='utf-8')
+        with override_settings(LEDGER_METRICS_DIR=directory):
+            metrics.inc('ledger_receipt_bytes_ingested_total', 50)
+            metrics.observe('ledger_thumbnail_duration_seconds', 0.2, source='inline')
+            self.assertTrue(metrics.registry.path().exists())  # ilk ölçüm dosyaya yazılır
+            text = self.scrape()
+        self.assertIn('ledger_receipt_bytes_ingested_total 150', text)
+        self.assertIn('ledger_thumbnail_duration_seconds_bucket{source="inline",le="0.005"} 1', text)
+        self.assertIn('ledger_thumbnail_duration_seconds_bucket{source="inline",le="0.25"} 2', text)
+        self.assertIn('ledger_thumbnail_duration_seconds_count{source="inline"} 2', text)
+
+    def test_forked_worker_starts_with_its_own_file_and_counters(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        with override_settings(LEDGER_METRICS_DIR=directory):
+            metrics.inc('ledger_receipt_bytes_ingested_total', 50)
+            parent = metrics.registry.path()
+            # gunicorn --preload: worker ebeveynin registry'sini fork ile devralır
+            with mock.patch('transactions.metrics.os.getpid', return_value=os.getpid() + 1):
+                self.assertEqual(metrics.registry.snapshot()['counters'], [])
+                child = metrics.registry.path()
+                metrics.inc('ledger_receipt_bytes_ingested_total', 7)
+        self.assertNotEqual(child, parent)
+        self.assertIn(f'-{os.getpid() + 1}-', child.name)
+        self.assertEqual(json.loads(child.read_text(encoding='utf-8'))['counters'],
+                         [['ledger_receipt_bytes_ingested_total', [], 7]])
+        self.assertEqual(json.loads(parent.read_text(encoding='utf-8'))['counters'],
+                         [['ledger_receipt_bytes_ingested_total', [], 50]])
+
+
+@override_settings(LEDGER_DATABASE_REPLICAS=['default'], LEDGER_REPLICA_PIN_CACHE_ALIAS='default',
+                   LEDGER_REPLICA_STICKY_SECONDS=30)
+class ReplicaRoutingTests(LedgerTestCase):
+    # Testte tek veritabanı var: 'default' replika gibi yapılandırılır ve yönlendirme kararı izlenir
+    def setUp(self):
+        cache.clear()
+
+    def read_aliases(self, call):
+        seen = []
+        original = ReplicaRouter.db_for_read
+
+        def spy(router, model, **hints):
+            seen.append(original(router, model, **hints))
+            return seen[-1]
+        with mock.patch.object(ReplicaRouter, 'db_for_read', spy):
+            response = call()
+        return response, seen
+
+    def test_safe_reads_use_replica_until_user_writes(self):
+        self.client.force_login(self.alice)
+        r, seen = self.read_aliases(lambda: self.client.get('/api/v1/transactions/'))
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(seen[0], None)  # oturum/kullanıcı/rol okumaları birincilden
+        self.assertIn('default', seen)
+
+        r = self.client.post('/api/v1/transactions/', {
+            'amount': '5.00', 'type': 'EXPENSE', 'payment_method': self.cash.id, 'subcategory': self.rent.id,
+            'transaction_date': (timezone.now() - timedelta(hours=1)).isoformat()}, content_type='application/json')
+        self.assertEqual(r.status_code, 201)
+        self.assertTrue(is_pinned(self.alice))
+        _, seen = self.read_aliases(lambda: self.client.get('/api/v1/transactions/'))
+        self.assertEqual(set(seen), {None})
+        # Diğer kullanıcılar sabitlenmez
+        self.assertFalse(is_pinned(self.bob))
+
+    def test_failed_write_does_not_pin(self):
+        self.client.force_login(self.alice)
+        r = self.client.post('/api/v1/transactions/', {'amount': '-1'}, content_type='application/json')
+        self.assertEqual(r.status_code, 400)
+        self.assertFalse(is_pinned(self.alice))
+
+    def test_router_and_round_robin(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_write(Transaction), 'default')
+        self.assertIsNone(router.db_for_read(Transaction))
+        request = RequestFactory().get('/')
+        request.user = self.bob
+        with override_settings(LEDGER_DATABASE_REPLICAS=['replica1', 'replica2']):
+            picked = {choose_replica(request) for _ in range(4)}
+            self.assertEqual(picked, {'replica1', 'replica2'})
+            request.method = 'POST'
+            self.assertIsNone(choose_replica(request))
+        with override_settings(LEDGER_DATABASE_REPLICAS=[]):
+            request.method = 'GET'
+            self.assertIsNone(choose_replica(request))
+
+
+class DbPoolStatsTests(LedgerTestCase):
+    def test_requires_staff_or_token(self):
+        self.assertEqual(self.client_for(self.alice).get('/metrics/db-pool').status_code, 403)
+        with override_settings(LEDGER_METRICS_TOKEN='s3cret'):
+            r = self.client.get('/metrics/db-pool', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(r.status_code, 200)
+        default = r.json()['default']
+        self.assertFalse(default['pooled'])
+        self.assertTrue(default['health_checks'])
+        self.assertNotIn('stats', default)
+
+    def test_open_pool_stats_are_reported(self):
+        pool = mock.Mock(min_size=2, max_size=10)
+        pool.get_stats.return_value = {'pool_size': 2, 'pool_available': 1, 'requests_waiting': 0}
+        with mock.patch.object(type(connections['default']), '_connection_pools', {'default': pool}, create=True):
+            stats = dbpool.pool_stats()['default']
+        self.assertEqual((stats['min_size'], stats['max_size']), (2, 10))
+        self.assertEqual(stats['stats']['pool_available'], 1)
@@ -2,7 +2,7 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
     PaymentMethodViewSet, SubcategoryViewSet, TransactionViewSet,
-    ExportLogView, api_login
+    ExportLogView, api_login, api_token
 )
 
 router = DefaultRouter()
@@ -13,10 +13,12 @@ router.register(r'subcategories', SubcategoryViewSet, basename='subcategories')
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/login/', api_login, name='api-login'),        # /api/v1/auth/login/
+    path('auth/token/', api_token, name='api-token'),        # /api/v1/auth/token/
     path('export-log/', ExportLogView.as_view(), name='export-log'),
 ]
 # API uç noktaları:
 # - /api/v1/transactions/ : İşlemler için CRUD işlemleri
 # - /api/v1/payment-methods/ : Ödeme yöntemleri için CRUD işlemleri
 # - /api/v1/subcategories/ : Alt kategoriler için CRUD işlemleri
-# - /api/v1/auth/login/ : Kullanıcı girişi
\ No newline at end of file
+# - /api/v1/auth/login/ : Kullanıcı girişi
+# - /api/v1/auth/token/ : Bearer token (Authorization: Bearer <token>)
\ No newline at end of file
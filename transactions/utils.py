@@ -1,14 +1,25 @@
 import hashlib
+import math
 import re
+import tempfile
 import unicodedata
+from dataclasses import dataclass
 from io import BytesIO
 from pathlib import Path
 from PIL import Image, ImageOps
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.base import ContentFile, File
 from django.utils import timezone
 
+from . import metrics
+from .instrumentation import span
+
 ALLOWED_IMAGE_FORMATS = {'JPEG', 'PNG', 'WEBP'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
+THUMBNAIL_WIDTH = 320
+# Bu boyuta kadar upload bellekte tutulur, üstü geçici dosyaya taşar
+INGEST_SPOOL_MAX_SIZE = 1024 * 1024
+_DEFAULT = object()
 
 def normalize_subcategory_name(name: str) -> str:
     s = (name or '').casefold()
@@ -58,24 +69,164 @@ def hashed_receipt_path(django_file, dt=None) -> str:
     return f"receipts/{dt:%Y/%m}/{file_hash}{ext}"
 
 def validate_image_file(django_file):
+    """Geriye dönük uyumluluk: tek geçişli ingest_receipt ile doğrular."""
+    ingest_receipt(django_file)
+
+def _thumbnail_from_image(img, width=THUMBNAIL_WIDTH, image_format='WEBP') -> ContentFile:
+    img = ImageOps.exif_transpose(img)
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'A' in img.mode or 'transparency' in img.info else 'RGB')
+    if image_format == 'JPEG' and img.mode != 'RGB':
+        img = img.convert('RGB')  # JPEG saydamlık desteklemez
+    img.thumbnail((width, width * 1000))
+    out = BytesIO()
+    img.save(out, format=image_format, quality=85)
+    return ContentFile(out.getvalue())
+
+def thumbnail_rel_name(receipt_name) -> str:
+    """
+    Fişin thumbnail adı (upload_to='receipts/thumbnails/' altına göreli).
+    Fiş adı içerik hash'i olduğundan aynı içerik her zaman aynı thumbnail'e düşer.
+    """
+    base = Path(receipt_name or '').stem
+    return f"{base[:2]}/{base}.webp"
+
+def render_thumbnail(data: bytes, width=THUMBNAIL_WIDTH) -> bytes:
+    """Ham görüntü byte'larından WEBP thumbnail byte'ları (worker süreçleri için, Django'dan bağımsız)."""
+    return _thumbnail_from_image(Image.open(BytesIO(data)), width).read()
+
+def render_rendition(fh, width, image_format='WEBP') -> bytes:
+    """
+    Açık dosyadaki görüntüden en fazla `width` genişlikte (büyütmeden) kopya üretir.
+    JPEG'de draft ile decode sırasında ölçeklenir (büyük fotoğraflarda belirgin hızlı).
+    """
+    img = Image.open(fh)
+    if img.format == 'JPEG':
+        # EXIF 5-8: görüntü 90° döndürülecek; hedef genişlik kaynağın yüksekliğine denk gelir
+        rotated = img.getexif().get(0x0112) in (5, 6, 7, 8)
+        scale = width / (img.height if rotated else img.width)
+        if scale < 1:
+            img.draft('RGB', (math.ceil(img.width * scale), math.ceil(img.height * scale)))
+    return _thumbnail_from_image(img, width, image_format).read()
+
+def make_thumbnail(django_file, width=THUMBNAIL_WIDTH) -> ContentFile:
+    with span('thumbnail'), metrics.timer('ledger_thumbnail_duration_seconds', source='inline'):
+        data = get_file_bytes(django_file)
+        img = Image.open(BytesIO(data))
+        return _thumbnail_from_image(img, width)
+
+
+@dataclass
+class ReceiptIngest:
+    """
+    Bir fiş upload'ının tek geçişte çıkarılan bilgileri.
+    content: upload'ın kopyası (bellekte ya da diskte, boyuta göre); storage'a bu yazılır.
+    thumbnail: aynı decode'dan üretilen WEBP küçük resim.
+    """
+    sha256: str
+    size: int
+    ext: str
+    image_format: str
+    width: int
+    height: int
+    content: File
+    thumbnail: ContentFile = None
+
+    def close(self):
+        try:
+            self.content.close()
+        except Exception:
+            pass
+
+
+def _iter_chunks(django_file):
+    try:
+        django_file.seek(0)
+    except Exception:
+        # Kapalı FieldFile olabilir
+        django_file.open('rb')
+    if hasattr(django_file, 'chunks'):
+        yield from django_file.chunks()
+    else:
+        while True:
+            chunk = django_file.read(File.DEFAULT_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _default_thumbnail_width():
+    # Async modda thumbnail worker'da üretilir; ingest yalnız doğrular
+    return None if getattr(settings, 'LEDGER_ASYNC_THUMBNAILS', False) else THUMBNAIL_WIDTH
+
+def ingest_receipt(django_file, thumbnail_width=_DEFAULT) -> ReceiptIngest:
+    """
+    Upload'ı bir kez okur: parça parça SHA-256 hesaplar ve (büyükse diske taşan)
+    geçici bir kopyaya yazar; görüntüyü bir kez decode edip formatı doğrular ve
+    küçük resmi üretir. Sonuç dosya nesnesine iliştirilir; aynı upload için
+    serializer, Transaction.clean ve Transaction.save tekrar okuma/decode yapmaz.
+    LEDGER_ASYNC_THUMBNAILS açıksa varsayılan olarak thumbnail üretilmez (worker üretir).
+    Hatalarda ValueError yükseltir.
+    """
+    cached = getattr(django_file, '_receipt_ingest', None)
+    if cached is not None:
+        return cached
+    if thumbnail_width is _DEFAULT:
+        thumbnail_width = _default_thumbnail_width()
+
     size = getattr(django_file, 'size', None)
     if size and size > MAX_FILE_SIZE:
         raise ValueError("File too large (max 10MB).")
-    data = get_file_bytes(django_file)  # kapalı/pozisyonu yanlış olsa da güvenli okur
+
+    digest = hashlib.sha256()
+    spool = tempfile.SpooledTemporaryFile(max_size=INGEST_SPOOL_MAX_SIZE)
+    total = 0
     try:
-        img = Image.open(BytesIO(data))
-        img.verify()  # bozuk dosyayı yakalar
-        fmt = Image.open(BytesIO(data)).format
+        for chunk in _iter_chunks(django_file):
+            total += len(chunk)
+            if total > MAX_FILE_SIZE:
+                raise ValueError("File too large (max 10MB).")
+            digest.update(chunk)
+            spool.write(chunk)
+        if not total:
+            raise ValueError("Invalid or empty file.")
+
+        spool.seek(0)
+        try:
+            img = Image.open(spool)
+            fmt = img.format
+            if thumbnail_width:
+                img.load()  # tam decode: bozuk/eksik dosyayı yakalar, thumbnail aynı decode'u kullanır
+            else:
+                img.verify()  # thumbnail yoksa piksel verisini açmadan bütünlük kontrolü
+        except Exception:
+            raise ValueError("Invalid image file.")
+        if fmt not in ALLOWED_IMAGE_FORMATS:
+            raise ValueError("Only jpg/png/webp images are allowed.")
+        thumbnail = None
+        if thumbnail_width:
+            with metrics.timer('ledger_thumbnail_duration_seconds', source='inline'):
+                thumbnail = _thumbnail_from_image(img, thumbnail_width)
     except Exception:
-        raise ValueError("Invalid image file.")
-    if fmt not in ALLOWED_IMAGE_FORMATS:
-        raise ValueError("Only jpg/png/webp images are allowed.")
+        spool.close()
+        raise
 
-def make_thumbnail(django_file, width=320) -> ContentFile:
-    data = get_file_bytes(django_file)
-    img = Image.open(BytesIO(data))
-    img = ImageOps.exif_transpose(img)
-    img.thumbnail((width, width * 1000))
-    out = BytesIO()
-    img.save(out, format='WEBP', quality=85)
-    return ContentFile(out.getvalue())
+    spool.seek(0)
+    metrics.inc('ledger_receipts_ingested_total', format=fmt)
+    metrics.inc('ledger_receipt_bytes_ingested_total', total)
+    name = getattr(django_file, 'name', '') or ''
+    result = ReceiptIngest(
+        sha256=digest.hexdigest(),
+        size=total,
+        ext=Path(name).suffix.lower() or '.bin',
+        image_format=fmt,
+        width=img.width,
+        height=img.height,
+        content=File(spool, name=Path(name).name),
+        thumbnail=thumbnail,
+    )
+    try:
+        django_file._receipt_ingest = result
+    except Exception:
+        pass
+    return result
@@ -1,18 +1,42 @@
+import hmac
+from decimal import Decimal
+
+from django.conf import settings
 from django.contrib.auth import authenticate, login
 from django.contrib.auth.decorators import login_required
-from django.http import FileResponse
+from django.db.models import Sum, Count, F
+from django.db.models.functions import TruncMonth, TruncYear
+from django.http import Http404, HttpResponse, JsonResponse
 from django.shortcuts import render, redirect
+from django.utils.dateparse import parse_date
 
 from rest_framework import viewsets, mixins, status
-from rest_framework.decorators import action, api_view, permission_classes
+from rest_framework.decorators import action, api_view, authentication_classes, permission_classes
 from rest_framework.permissions import IsAuthenticated, DjangoModelPermissions, AllowAny
 from rest_framework.response import Response
 from rest_framework.exceptions import PermissionDenied, NotFound
+from rest_framework.filters import OrderingFilter
+from django_filters.rest_framework import DjangoFilterBackend
 
-from .models import PaymentMethod, Subcategory, Transaction, AuditLog
-from .serializers import PaymentMethodSerializer, SubcategorySerializer, TransactionSerializer
+from .models import PaymentMethod, Subcategory, Transaction, AuditLog, DailyRollup
+from .serializers import PaymentMethodSerializer, SubcategorySerializer, TransactionSerializer, BulkIdsSerializer
 from .permissions import IsOwnerOrManager
 from .filters import TransactionFilter
+from .search import TransactionSearchFilter
+from .pagination import KeysetPagination, wants_keyset
+from .roles import get_role
+from .authentication import issue_token, token_max_age
+from . import audit, dbpool, metrics
+from .exports import available_formats, export_response, xlsx_too_large
+from .downloads import serve_file
+from .refdata import VersionedCacheMixin, inline_refdata
+from .instrumentation import TimedViewMixin
+from .routers import ReplicaReadMixin
+from .renditions import (
+    DEFAULT_FORMAT, DEFAULT_WIDTH, RENDITION_FORMATS, RENDITION_SERVE_ATTEMPTS, RENDITION_WIDTHS, get_rendition,
+    receipt_key,
+)
+from .importers import TransactionImporter, iter_rows, DEFAULT_CHUNK_SIZE
 
 # --- mevcut template görünümü ---
 def home_redirect(request):
@@ -35,21 +59,43 @@ def login_view(request):
 
 @login_required
 def transactions_page(request):
-    is_admin_group = request.user.groups.filter(name='Admin').exists() or request.user.is_superuser
-    is_manager = request.user.groups.filter(name='Manager').exists()
-    can_export = request.user.has_perm('transactions.can_export_transactions')
-    can_restore = request.user.has_perm('transactions.can_restore_transaction')  #
+    role = get_role(request)
+    can_export = role.has_perm('transactions.can_export_transactions')
+    can_restore = role.has_perm('transactions.can_restore_transaction')  #
     ctx = {
-        'user_role': 'Admin' if is_admin_group else ('Manager' if is_manager else 'User'),
+        'user_role': role.name,
         'can_export': can_export,
         'can_restore': can_restore, # 
+        'refdata': inline_refdata(),
     }
     return render(request, 'transactions/list.html', ctx)
 
 @login_required
 def transaction_create_page(request):
-    # Basit bir sayfa; JS API'den pm & subcategory listesini çekecek
-    return render(request, 'transactions/create.html')
+    # Basit bir sayfa; pm & subcategory listesi gömülü (LEDGER_INLINE_REFDATA) ya da JS API'den çeker
+    return render(request, 'transactions/create.html', {'refdata': inline_refdata()})
+
+# --- Operasyon: Prometheus metrikleri (LEDGER_METRICS_TOKEN ile bearer ya da staff oturumu) ---
+def _ops_allowed(request):
+    # Operatör uçları: staff oturumu ya da 'Authorization: Bearer <LEDGER_METRICS_TOKEN>'
+    token = getattr(settings, 'LEDGER_METRICS_TOKEN', '')
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())) or request.user.is_staff
+
+
+def metrics_view(request):
+    if not metrics.enabled():
+        raise Http404
+    if not _ops_allowed(request):
+        return HttpResponse('Forbidden.', status=403, content_type='text/plain')
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def db_pool_view(request):
+    # Alias başına bağlantı ayarları ve açık psycopg3 havuzlarının istatistikleri (bkz. dbpool.py)
+    if not _ops_allowed(request):
+        return HttpResponse('Forbidden.', status=403, content_type='text/plain')
+    return JsonResponse(dbpool.pool_stats())
 
 # --- API: Session login (CSRF korumalı) ---
 @api_view(['POST'])
@@ -63,45 +109,93 @@ def api_login(request):
     login(request, user)
     return Response({'detail': 'ok'})
 
+# --- API: Bearer token (oturumsuz, betikler/entegrasyonlar için) ---
+@api_view(['POST'])
+@authentication_classes([])
+@permission_classes([AllowAny])
+def api_token(request):
+    identifier = request.data.get('email') or request.data.get('username')
+    user = authenticate(request, email=identifier, password=request.data.get('password'))
+    if not user:
+        return Response({'detail': 'Invalid credentials'}, status=401)
+    audit.record(user, AuditLog.Actions.LOGIN, 'User', user.id, {'token': True})
+    return Response({'token': issue_token(user), 'token_type': 'Bearer', 'expires_in': token_max_age()})
+
 # --- API: PaymentMethod (sadece list/retrieve) ---
-class PaymentMethodViewSet(mixins.ListModelMixin,
+class PaymentMethodViewSet(ReplicaReadMixin, VersionedCacheMixin,
+                           mixins.ListModelMixin,
                            mixins.RetrieveModelMixin,
                            viewsets.GenericViewSet):
+    refdata_name = 'payment-methods'
     queryset = PaymentMethod.objects.filter(is_active=True).order_by('name')
     serializer_class = PaymentMethodSerializer
     permission_classes = [IsAuthenticated]
 
 # --- API: Subcategory (admin/permissions ile create/update) ---
-class SubcategoryViewSet(viewsets.ModelViewSet):
+class SubcategoryViewSet(ReplicaReadMixin, VersionedCacheMixin, viewsets.ModelViewSet):
+    refdata_name = 'subcategories'
     queryset = Subcategory.objects.filter(is_active=True).order_by('name')
     serializer_class = SubcategorySerializer
     permission_classes = [IsAuthenticated, DjangoModelPermissions]
 
 # --- API: Transaction ---
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(ReplicaReadMixin, TimedViewMixin, viewsets.ModelViewSet):
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated, DjangoModelPermissions, IsOwnerOrManager]
     filterset_class = TransactionFilter
+    filter_backends = [DjangoFilterBackend, TransactionSearchFilter, OrderingFilter]
     search_fields = ['description', 'subcategory__name']
     ordering_fields = ['transaction_date', 'amount']
 
+    @property
+    def paginator(self):
+        # Sayfalama modu istek bazında seçilir: varsayılan sayfa numarası, ?pagination=cursor ile keyset
+        if not hasattr(self, '_paginator'):
+            if self.pagination_class is None:
+                self._paginator = None
+            elif wants_keyset(self.request):
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_queryset(self):
-        user = self.request.user
+        role = get_role(self.request)
         only_deleted = self.request.query_params.get('only_deleted') in ('1', 'true', 'True')
 
         # Yalnız Admin (restore izni) silinmişleri görebilir
-        if only_deleted and not user.has_perm('transactions.can_restore_transaction'):
+        if only_deleted and not role.has_perm('transactions.can_restore_transaction'):
             raise PermissionDenied('Only Admin can view deleted transactions.')
 
         base = Transaction.all_objects.all() if only_deleted else Transaction.objects.all()
-
-        if user.is_superuser or user.groups.filter(name__in=['Admin', 'Manager']).exists():
-            qs = base
-        else:
-            qs = base.filter(owner=user)
+        qs = self._scope(base)
 
         if only_deleted:
             qs = qs.filter(is_active=False)
+        return self._shape_queryset(qs)
+
+    def _scope(self, qs):
+        """Rol kapsamı: Admin/Manager tüm kayıtlar, diğerleri yalnız kendi kayıtları."""
+        if get_role(self.request).can_see_all:
+            return qs
+        return qs.filter(owner=self.request.user)
+
+    # Liste/detay yanıtında gösterilmeyen kolonlar (serializer alanlarıyla uyumlu tutulmalı)
+    LIST_DEFERRED_FIELDS = ('deleted_at', 'deleted_by', 'created_by', 'updated_by')
+
+    def _shape_queryset(self, qs):
+        """
+        Aksiyona göre sorguyu şekillendirir:
+        - summary/export/report: values() kullanır; join/kolon seçimi gereksiz.
+        - list/retrieve: FK etiketleri için select_related, gösterilmeyen kolonlar defer.
+        - diğerleri (create/update/...): yanıt serializer'ı için yalnız select_related.
+        """
+        if self.action in ('summary', 'export', 'report'):
+            return qs
+        qs = qs.select_related('payment_method', 'subcategory')
+        if self.action in ('list', 'retrieve'):
+            fields = [f.name for f in Transaction._meta.concrete_fields if f.name not in self.LIST_DEFERRED_FIELDS]
+            qs = qs.only(*fields, 'payment_method__name', 'subcategory__name')
         return qs
     
     def _get_object_any(self, pk):
@@ -114,27 +208,240 @@ class TransactionViewSet(viewsets.ModelViewSet):
         except Transaction.DoesNotExist:
             raise NotFound('Transaction not found.')
 
+    # Değişiklik ve denetim kaydı tek transaction'da (audit.unit_of_work); kayıt commit'ten önce yazılır
     def perform_create(self, serializer):
-        obj = serializer.save()
-        AuditLog.objects.create(actor=self.request.user, action=AuditLog.Actions.CREATE,
-                                object_type='Transaction', object_id=str(obj.id),
-                                metadata={'id': obj.id})
+        with audit.unit_of_work():
+            obj = serializer.save()
+            audit.record(self.request.user, AuditLog.Actions.CREATE, 'Transaction', obj.id, {'id': obj.id})
 
     def perform_update(self, serializer):
-        obj = serializer.save()
-        AuditLog.objects.create(actor=self.request.user, action=AuditLog.Actions.UPDATE,
-                                object_type='Transaction', object_id=str(obj.id),
-                                metadata={'id': obj.id})
+        with audit.unit_of_work():
+            obj = serializer.save()
+            audit.record(self.request.user, AuditLog.Actions.UPDATE, 'Transaction', obj.id, {'id': obj.id})
 
     def perform_destroy(self, instance):
-        instance.delete(by=self.request.user)
-        AuditLog.objects.create(actor=self.request.user, action=AuditLog.Actions.SOFT_DELETE,
-                                object_type='Transaction', object_id=str(instance.id))
+        with audit.unit_of_work():
+            instance.delete(by=self.request.user)
+            audit.record(self.request.user, AuditLog.Actions.SOFT_DELETE, 'Transaction', instance.id)
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """
+        Filtrelere uyan kayıtların toplamları; tek bir GROUP BY sorgusu ile hesaplanır.
+        Kırılımlar (tür / ödeme yöntemi / alt kategori) aynı satırlardan Python'da toplanır.
+        """
+        qs = self.filter_queryset(self.get_queryset())
+        groups = (qs.order_by()
+                    .values('type', 'payment_method_id', 'payment_method__name',
+                            'subcategory_id', 'subcategory__name')
+                    .annotate(total=Sum('amount'), count=Count('id')))
+
+        zero = Decimal('0.00')
+        by_type = {t: {'total': zero, 'count': 0} for t in Transaction.Types.values}
+        by_pm, by_sc = {}, {}
+        for g in groups:
+            total, count = g['total'] or zero, g['count']
+            bucket = by_type.setdefault(g['type'], {'total': zero, 'count': 0})
+            bucket['total'] += total
+            bucket['count'] += count
+            pm = by_pm.setdefault(g['payment_method_id'], {
+                'id': g['payment_method_id'], 'name': g['payment_method__name'],
+                'income': zero, 'expense': zero, 'count': 0})
+            sc = by_sc.setdefault(g['subcategory_id'], {
+                'id': g['subcategory_id'], 'name': g['subcategory__name'],
+                'income': zero, 'expense': zero, 'count': 0})
+            key = 'income' if g['type'] == Transaction.Types.INCOME else 'expense'
+            for row in (pm, sc):
+                row[key] += total
+                row['count'] += count
+
+        income = by_type[Transaction.Types.INCOME]['total']
+        expense = by_type[Transaction.Types.EXPENSE]['total']
+
+        def _money(value):
+            return str(value.quantize(Decimal('0.01')))
+
+        def _fmt(row):
+            return {k: (_money(v) if isinstance(v, Decimal) else v) for k, v in row.items()}
+
+        return Response({
+            'income': _money(income),
+            'expense': _money(expense),
+            'net': _money(income - expense),
+            'count': sum(b['count'] for b in by_type.values()),
+            'by_type': {t: _fmt(b) for t, b in by_type.items()},
+            'by_payment_method': [_fmt(r) for r in sorted(by_pm.values(), key=lambda r: r['name'] or '')],
+            'by_subcategory': [_fmt(r) for r in sorted(by_sc.values(), key=lambda r: r['name'] or '')],
+        })
+
+    REPORT_PERIODS = {'day': None, 'month': TruncMonth, 'year': TruncYear}
+
+    @action(detail=False, methods=['get'])
+    def report(self, request):
+        """
+        Dönemsel (gün/ay/yıl) gelir-gider raporu; ham işlemler yerine DailyRollup satırlarından okunur.
+        Parametreler: period=month|year|day, date_from/date_to (YYYY-MM-DD), type, payment_method,
+        subcategory, owner (yalnız tüm kayıtları görebilen roller).
+        """
+        role = get_role(request)
+        params = request.query_params
+        period = params.get('period', 'month')
+        if period not in self.REPORT_PERIODS:
+            return Response({'detail': 'period must be one of: day, month, year.'}, status=400)
+        for param in ('payment_method', 'subcategory', 'owner'):
+            if params.get(param) and not params[param].isdigit():
+                return Response({param: 'A valid integer is required.'}, status=400)
+
+        qs = DailyRollup.objects.filter(count__gt=0)
+        if not role.can_see_all:
+            qs = qs.filter(owner=request.user)
+        elif params.get('owner'):
+            qs = qs.filter(owner_id=params['owner'])
+        for param, lookup in (('date_from', 'day__gte'), ('date_to', 'day__lte')):
+            if params.get(param):
+                try:
+                    value = parse_date(params[param][:10])
+                except ValueError:
+                    value = None
+                if value is None:
+                    return Response({param: 'Use YYYY-MM-DD.'}, status=400)
+                qs = qs.filter(**{lookup: value})
+        if params.get('type'):
+            qs = qs.filter(type__iexact=params['type'])
+        if params.get('payment_method'):
+            qs = qs.filter(payment_method_id=params['payment_method'])
+        if params.get('subcategory'):
+            qs = qs.filter(subcategory_id=params['subcategory'])
+
+        trunc = self.REPORT_PERIODS[period]
+        bucket = trunc('day') if trunc else F('day')
+        rows = (qs.order_by().annotate(period=bucket).values('period', 'type')
+                  .annotate(total=Sum('total'), count=Sum('count')).order_by('period'))
+
+        zero = Decimal('0.00')
+        periods = {}
+        for r in rows:
+            p = periods.setdefault(r['period'], {'income': zero, 'expense': zero, 'count': 0})
+            p['income' if r['type'] == Transaction.Types.INCOME else 'expense'] += r['total'] or zero
+            p['count'] += r['count']
+
+        def _label(value):
+            return {'day': value.isoformat(), 'month': value.strftime('%Y-%m'), 'year': str(value.year)}[period]
+
+        def _money(value):
+            return str(value.quantize(Decimal('0.01')))
+
+        return Response({'period': period, 'results': [
+            {'period': _label(k), 'income': _money(v['income']), 'expense': _money(v['expense']),
+             'net': _money(v['income'] - v['expense']), 'count': v['count']}
+            for k, v in periods.items()
+        ]})
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Filtrelenmiş işlemleri CSV/XLSX olarak akıtır (?file_format=csv|xlsx).
+        Satırlar parça parça okunur; EXPORT AuditLog kaydı satır sayısıyla akış sonunda yazılır.
+        """
+        if not get_role(request).has_perm('transactions.can_export_transactions'):
+            raise PermissionDenied('Permission denied.')
+        file_format = request.query_params.get('file_format', 'csv').lower()
+        if file_format not in available_formats():
+            return Response({'detail': f'Unsupported format. Use one of: {", ".join(available_formats())}.'},
+                            status=400)
+
+        qs = self.filter_queryset(self.get_queryset())
+        if file_format == 'xlsx' and xlsx_too_large(qs):
+            return Response({'detail': 'Too many rows for an XLSX sheet; use file_format=csv or narrow the filters.'},
+                            status=400)
+        actor = request.user
+        params = {k: v for k, v in request.query_params.items() if k != 'file_format'}
+
+        def _log(row_count):
+            audit.record(actor, AuditLog.Actions.EXPORT, 'Transaction', '*',
+                         {'params': params, 'format': file_format, 'rows': row_count})
+
+        return export_response(qs, file_format, on_finish=_log)
+
+    def _bulk_ids(self, request):
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return set(serializer.validated_data['ids'])
+
+    def _bulk_response(self, key, requested, done):
+        return Response({key: sorted(done), 'skipped': sorted(requested - set(done))}, status=200)
+
+    @action(detail=False, methods=['post'], url_path='bulk-delete', permission_classes=[IsAuthenticated])
+    def bulk_delete(self, request):
+        """
+        {"ids": [...]} → tek UPDATE ile soft delete. Yetki küme bazında uygulanır:
+        kapsam dışı / zaten silinmiş id'ler 'skipped' olarak döner.
+        """
+        if not get_role(request).has_perm('transactions.delete_transaction'):
+            raise PermissionDenied('Permission denied.')
+        requested = self._bulk_ids(request)
+        with audit.unit_of_work():
+            ids = self._scope(Transaction.objects.filter(id__in=requested)).soft_delete(by=request.user)
+            AuditLog.record_bulk(request.user, AuditLog.Actions.SOFT_DELETE, ids, metadata={'bulk': True})
+        return self._bulk_response('deleted', requested, ids)
+
+    @action(detail=False, methods=['post'], url_path='bulk-restore', permission_classes=[IsAuthenticated])
+    def bulk_restore(self, request):
+        if not get_role(request).has_perm('transactions.can_restore_transaction'):
+            raise PermissionDenied('Permission denied.')
+        requested = self._bulk_ids(request)
+        with audit.unit_of_work():
+            ids = self._scope(Transaction.all_objects.filter(id__in=requested)).restore(by=request.user)
+            AuditLog.record_bulk(request.user, AuditLog.Actions.RESTORE, ids, metadata={'bulk': True})
+        return self._bulk_response('restored', requested, ids)
+
+    @action(detail=False, methods=['post'], url_path='bulk-hard-delete', permission_classes=[IsAuthenticated])
+    def bulk_hard_delete(self, request):
+        if not get_role(request).is_admin:
+            raise PermissionDenied('Only Admin can hard delete.')
+        requested = self._bulk_ids(request)
+        with audit.unit_of_work():
+            ids = self._scope(Transaction.all_objects.filter(id__in=requested)).hard_delete()
+            AuditLog.record_bulk(request.user, AuditLog.Actions.HARD_DELETE, ids, metadata={'bulk': True})
+        return self._bulk_response('deleted', requested, ids)
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_rows(self, request):
+        """
+        Toplu içe aktarma (işlemler isteği yapan kullanıcıya yazılır):
+        - multipart 'file': CSV (başlıklı) ya da JSON lines (.jsonl/.ndjson veya file_format=jsonl)
+        - JSON gövde: {"rows": [{...}, ...]}
+        ?chunk_size=N parti boyutu, ?dry_run=1 yalnız doğrulama. Satır hataları yanıtta döner.
+        """
+        params = request.query_params
+        try:
+            chunk_size = min(max(int(params.get('chunk_size', DEFAULT_CHUNK_SIZE)), 1), 10000)
+        except ValueError:
+            return Response({'detail': 'chunk_size must be an integer.'}, status=400)
+        importer = TransactionImporter(request.user, chunk_size=chunk_size,
+                                       dry_run=params.get('dry_run') in ('1', 'true', 'True'))
+
+        upload = request.FILES.get('file')
+        if upload is not None:
+            file_format = (request.data.get('file_format') or params.get('file_format') or '').lower()
+            if not file_format:
+                file_format = 'jsonl' if upload.name.lower().endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+            if file_format not in ('csv', 'jsonl'):
+                return Response({'detail': 'file_format must be csv or jsonl.'}, status=400)
+            rows = iter_rows(upload.file, file_format)
+        else:
+            data = request.data.get('rows') if hasattr(request.data, 'get') else request.data
+            if not isinstance(data, list):
+                return Response({'detail': 'Send a CSV/JSONL file or {"rows": [...]}.'}, status=400)
+            rows = enumerate(data, start=1)
+
+        result = importer.run(rows)
+        return Response(result.as_dict(), status=201 if result.created and not importer.dry_run else 200)
 
     @action(detail=True, methods=['post'])
     def restore(self, request, pk=None):
         # Sadece can_restore izni olan (Admin)
-        if not request.user.has_perm('transactions.can_restore_transaction'):
+        if not get_role(request).has_perm('transactions.can_restore_transaction'):
             raise PermissionDenied('Permission denied.')
 
         obj = self._get_object_any(pk)
@@ -144,44 +451,75 @@ class TransactionViewSet(viewsets.ModelViewSet):
         if obj.is_active:
             return Response({'status': 'already_active'}, status=200)
 
-        obj.restore(by=request.user)
-        AuditLog.objects.create(actor=request.user, action=AuditLog.Actions.RESTORE,
-                                object_type='Transaction', object_id=str(obj.id))
+        with audit.unit_of_work():
+            obj.restore(by=request.user)
+            audit.record(request.user, AuditLog.Actions.RESTORE, 'Transaction', obj.id)
         return Response({'status': 'restored'}, status=200)
 
     @action(detail=True, methods=['delete'], url_path='hard-delete')
     def hard_delete(self, request, pk=None):
-        if not (request.user.is_superuser or request.user.groups.filter(name='Admin').exists()):
+        if not get_role(request).is_admin:
             raise PermissionDenied('Only Admin can hard delete.')
 
         obj = self._get_object_any(pk)
         self.check_object_permissions(request, obj)
 
-        obj.delete(by=request.user, hard=True)
-        AuditLog.objects.create(actor=request.user, action=AuditLog.Actions.HARD_DELETE,
-                                object_type='Transaction', object_id=str(pk))
+        with audit.unit_of_work():
+            obj.delete(by=request.user, hard=True)
+            audit.record(request.user, AuditLog.Actions.HARD_DELETE, 'Transaction', pk)
         return Response(status=204)
 
     @action(detail=True, methods=['get'], url_path='receipt')
     def receipt(self, request, pk=None):
         obj = self.get_object()
         # obje-seviyesi erişim
-        u = request.user
-        if not (u.is_superuser or u.groups.filter(name__in=['Admin', 'Manager']).exists() or obj.owner_id == u.id):
+        if not get_role(request).can_access(obj):
             return Response({'detail': 'Forbidden.'}, status=403)
         if not obj.receipt_file:
             return Response({'detail': 'No receipt.'}, status=404)
-        return FileResponse(obj.receipt_file.open('rb'), as_attachment=True,
-                            filename=(obj.receipt_original_name or 'receipt'))
-                            
+        return serve_file(request, obj.receipt_file, as_attachment=True,
+                          filename=(obj.receipt_original_name or 'receipt'))
+
+    @action(detail=True, methods=['get'], url_path='thumbnail')
+    def thumbnail(self, request, pk=None):
+        obj = self.get_object()
+        if not get_role(request).can_access(obj):
+            return Response({'detail': 'Forbidden.'}, status=403)
+        if not obj.receipt_thumbnail:
+            return Response({'detail': 'No thumbnail.'}, status=404)
+        return serve_file(request, obj.receipt_thumbnail)
+
+    @action(detail=True, methods=['get'], url_path='rendition')
+    def rendition(self, request, pk=None):
+        """?w=160|320|640|1280&fmt=webp|jpeg — ilk istekte üretilir, disk önbelleğinden sunulur."""
+        try:
+            width = int(request.query_params.get('w', DEFAULT_WIDTH))
+        except ValueError:
+            width = None
+        fmt = request.query_params.get('fmt', DEFAULT_FORMAT)
+        if width not in RENDITION_WIDTHS or fmt not in RENDITION_FORMATS:
+            return Response({'detail': f"w must be one of {list(RENDITION_WIDTHS)}, "
+                                       f"fmt one of {sorted(RENDITION_FORMATS)}."}, status=400)
+        obj = self.get_object()
+        if not get_role(request).can_access(obj):
+            return Response({'detail': 'Forbidden.'}, status=403)
+        if not obj.receipt_file:
+            return Response({'detail': 'No receipt.'}, status=404)
+        key = receipt_key(obj.receipt_file.name)
+        for attempt in range(RENDITION_SERVE_ATTEMPTS):
+            try:
+                return serve_file(request, get_rendition(obj.receipt_file, key, width, fmt))
+            except FileNotFoundError:
+                # Başka worker'ın temizliği dosyayı açılmadan sildi: yeniden üretilir
+                if attempt == RENDITION_SERVE_ATTEMPTS - 1:
+                    raise
+
 # --- API: Export log (ayrıntısız) ---
 from rest_framework.views import APIView
 class ExportLogView(APIView):
     permission_classes = [IsAuthenticated]
     def post(self, request):
-        AuditLog.objects.create(actor=request.user, action=AuditLog.Actions.EXPORT,
-                                object_type='Transaction', object_id='*',
-                                metadata={'params': request.data})
+        audit.record(request.user, AuditLog.Actions.EXPORT, 'Transaction', '*', {'params': request.data})
         return Response({'status': 'ok'})
 
 # Bu görünüm seti, ödeme yöntemleri, alt kategoriler ve işlemler için API uç noktaları sağlar.